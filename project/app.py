@@ -1,106 +1,415 @@
-import streamlit as st
-import PyPDF2
-import requests
+import asyncio
 import json
-import io
 import base64
 import re
 import random
 import hashlib
 import os
-from typing import Optional, Dict, Any
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import tempfile
+import shutil
+import time
+import uuid
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, Tuple, Callable, Union
+from flask import Flask, Blueprint, request, jsonify, Response, send_file, g
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeoutError
 from dotenv import load_dotenv
+from result_cache import ResultCache, Uncached, cached_stage, content_hash, stream_hash
+from pdf_extraction import open_pdf_stream, iter_pdf_pages
+from gemini_client import GeminiClient, GeminiError, LatencyTracker, RateLimiter
+from document_store import DocumentStore
+from chunking import split_into_chunks
+from prompt_budget import PromptBudget
+from local_summary import LocalSummarizer
+from key_terms import KeyTermExtractor, load_vocabulary
+from bm25_index import BM25Index
+from revisions import RevisionTracker
+from structured_output import (parse_json_response, parse_mermaid_response, validate_articles,
+                               validate_novelty, validate_novelty_reasons, strategy_stats)
+from batch import BatchRunner, expire_batch_outputs
+import metrics
+from metrics import timed, bind, log_event, FALLBACKS, HTTP_SECONDS, UPLOAD_REJECTED
+from uploads import SpooledUploadRequest, detach_upload, open_stream, open_upload
+from job_queue import JobQueue, ThreadPoolJobBackend, RUNNING, COMPLETED, FAILED
 
 # Load environment variables
 load_dotenv()
 
-# API Configuration - Only Gemini API needed now
+# API Configuration - Only Gemini API needed now. Validated in create_app so that
+# importing this module (for tests or tooling) does not require a key
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment variables. Please check your .env file.")
 
-# API URLs - Updated for Gemini 2.0 Flash
-GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+# API URLs - Updated for Gemini 2.0 Flash. Overridable to point at a proxy or at the
+# offline stand-in in fake_gemini.py for load tests
+GEMINI_API_URL = os.getenv(
+    "GEMINI_API_URL",
+    "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent"
+)
+
+# Gemini client configuration: connection pool size, concurrent in-flight calls,
+# and retries on 429/5xx (exponential backoff with jitter)
+GEMINI_POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", "10"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+# Global cap on Gemini request starts per minute across all threads (0 = unlimited)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+
+# Per-call timeouts in seconds, overridable with e.g. GEMINI_TIMEOUT_SUMMARY=45
+GEMINI_TIMEOUTS = {
+    stage: float(os.getenv(f"GEMINI_TIMEOUT_{stage.upper()}", default))
+    for stage, default in {
+        'summary': 60,
+        'mindmap': 60,
+        'related_articles': 90,
+        'related_articles_retry': 60,
+        'novelty': 60,
+        'summary_chunk': 60,
+        'combined': 90
+    }.items()
+}
+
+# Adaptive timeouts: once a stage has GEMINI_LATENCY_MIN_SAMPLES of its last GEMINI_LATENCY_WINDOW calls,
+# its timeout becomes GEMINI_TIMEOUT_MULTIPLIER x their p99 latency (scaled up for larger than usual
+# prompts), never below GEMINI_MIN_TIMEOUT nor above the GEMINI_TIMEOUTS value
+GEMINI_ADAPTIVE_TIMEOUTS = os.getenv("GEMINI_ADAPTIVE_TIMEOUTS", "true").lower() == "true"
+GEMINI_TIMEOUT_MULTIPLIER = float(os.getenv("GEMINI_TIMEOUT_MULTIPLIER", "3"))
+GEMINI_MIN_TIMEOUT = float(os.getenv("GEMINI_MIN_TIMEOUT", "10"))
+GEMINI_LATENCY_WINDOW = int(os.getenv("GEMINI_LATENCY_WINDOW", "200"))
+GEMINI_LATENCY_MIN_SAMPLES = int(os.getenv("GEMINI_LATENCY_MIN_SAMPLES", "20"))
+
+# Hedged requests: a call still unanswered after GEMINI_HEDGE_QUANTILE of its stage's latency sends
+# one duplicate and takes the first answer. Duplicates are capped at GEMINI_HEDGE_BUDGET of all calls
+GEMINI_HEDGE_ENABLED = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true"
+GEMINI_HEDGE_QUANTILE = float(os.getenv("GEMINI_HEDGE_QUANTILE", "0.95"))
+GEMINI_HEDGE_BUDGET = float(os.getenv("GEMINI_HEDGE_BUDGET", "0.05"))
+
+# Token budget for the paper or summary text placed in each prompt, overridable with e.g.
+# PROMPT_TOKENS_SUMMARY=4000. Longer text is cut down to its most informative sentences
+# ('ranked', a TextRank pass over the whole text) or to its leading text ('truncate')
+PROMPT_TOKEN_BUDGETS = {
+    slot: int(os.getenv(f"PROMPT_TOKENS_{slot.upper()}", default))
+    for slot, default in {
+        'summary': 2500,
+        'mindmap': 2500,
+        'combined': 2500,
+        'novelty_summary': 500,
+        'novelty_text': 750,
+        'related_articles_retry': 125
+    }.items()
+}
+PROMPT_EXCERPT_MODE = os.getenv("PROMPT_EXCERPT_MODE", "ranked")
+
+# Sampling settings for the related-articles prompts and the combined structured-JSON call
+RELATED_ARTICLES_GENERATION_CONFIG = {"temperature": 0.7, "topK": 40, "topP": 0.95, "maxOutputTokens": 2048}
+RELATED_ARTICLES_RETRY_GENERATION_CONFIG = {"temperature": 0.3, "maxOutputTokens": 1500}
+COMBINED_GENERATION_CONFIG = {"responseMimeType": "application/json"}
+
+# PDF extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages are
+# decoded across PDF_EXTRACT_WORKERS processes (1 disables the process pool)
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+
+# Server-side document store for extracted texts
+DOCUMENT_STORE_MAX_DOCUMENTS = int(os.getenv("DOCUMENT_STORE_MAX_DOCUMENTS", "200"))
+DOCUMENT_STORE_TTL_SECONDS = int(os.getenv("DOCUMENT_STORE_TTL_SECONDS", "3600"))
+
+# Background analysis jobs: bounded worker pool and how long finished jobs are kept
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))
+
+# asyncio server (asgi.py): threads for PDF decoding, index lookups and the routes
+# still served through Flask; Gemini calls are awaited and need no thread
+ASYNC_EXECUTOR_WORKERS = int(os.getenv("ASYNC_EXECUTOR_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+
+# Batch analysis (/api/batch): where uploads and JSON Lines results are kept,
+# papers analyzed concurrently, and extraction processes
+BATCH_OUTPUT_DIR = os.getenv("BATCH_OUTPUT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "batches"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+BATCH_EXTRACT_WORKERS = int(os.getenv("BATCH_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# Batch uploads are deleted once their batch finishes; result files are deleted
+# BATCH_RESULTS_TTL_SECONDS after their last write
+BATCH_RESULTS_TTL_SECONDS = int(os.getenv("BATCH_RESULTS_TTL_SECONDS", "86400"))
+
+# Stages reported for background jobs, matching the steps shown in AnalysisProgress
+ANALYSIS_STAGES = ['extract', 'summary', 'mindmap', 'articles', 'novelty']
+
+# Summarization mode: 'truncate' sends one excerpt within PROMPT_TOKEN_BUDGETS['summary'],
+# 'map_reduce' summarizes section-aware chunks of the full text concurrently and combines them,
+# 'local' ranks and extracts sentences in-process without calling Gemini
+SUMMARY_MODE = os.getenv("SUMMARY_MODE", "truncate")
+MAP_REDUCE_CHUNK_CHARS = int(os.getenv("MAP_REDUCE_CHUNK_CHARS", "8000"))
+MAP_REDUCE_WORKERS = int(os.getenv("MAP_REDUCE_WORKERS", "4"))
+
+# Local extractive summary: its length, and whether it stands in for a Gemini summary that
+# fails or has not arrived within LOCAL_SUMMARY_DEADLINE_SECONDS (0 = wait for the Gemini timeout)
+LOCAL_SUMMARY_WORDS = int(os.getenv("LOCAL_SUMMARY_WORDS", "400"))
+LOCAL_SUMMARY_FALLBACK = os.getenv("LOCAL_SUMMARY_FALLBACK", "true").lower() == "true"
+LOCAL_SUMMARY_DEADLINE_SECONDS = float(os.getenv("LOCAL_SUMMARY_DEADLINE_SECONDS", "30"))
+
+# Combined analysis asks for summary, novelty and mind map in one structured-JSON
+# request, falling back to separate calls if the response does not validate
+COMBINED_ANALYSIS = os.getenv("COMBINED_ANALYSIS", "false").lower() == "true"
+
+# Optional domain vocabulary for key-term extraction: a text file with one term
+# per line, added to the built-in research terms
+KEY_TERMS_VOCABULARY_PATH = os.getenv("KEY_TERMS_VOCABULARY_PATH")
+
+# Related articles come first from a local BM25 index of previously analyzed papers;
+# Gemini suggestions only fill the remaining slots when enrichment is enabled
+RELATED_INDEX_ENABLED = os.getenv("RELATED_INDEX_ENABLED", "true").lower() == "true"
+RELATED_INDEX_PATH = os.getenv("RELATED_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "related_index.sqlite3"))
+RELATED_ARTICLES_LIMIT = int(os.getenv("RELATED_ARTICLES_LIMIT", "5"))
+RELATED_ARTICLES_USE_GEMINI = os.getenv("RELATED_ARTICLES_USE_GEMINI", "true").lower() == "true"
+
+# Embedding store for "papers like this one": summary vectors appended to a memory-mapped
+# matrix and searched by cosine similarity. EMBEDDING_MODEL is 'hashing' (offline, no model
+# download) or 'module:factory' for a local embedding model. Hits with cosine similarity at
+# or below EMBEDDING_MIN_SCORE are not reported as similar papers
+EMBEDDING_STORE_ENABLED = os.getenv("EMBEDDING_STORE_ENABLED", "true").lower() == "true"
+EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "embeddings"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hashing")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "384"))
+EMBEDDING_QUANTIZE = os.getenv("EMBEDDING_QUANTIZE", "false").lower() == "true"
+EMBEDDING_SEARCH_BLOCK_ROWS = int(os.getenv("EMBEDDING_SEARCH_BLOCK_ROWS", "65536"))
+EMBEDDING_MIN_SCORE = float(os.getenv("EMBEDDING_MIN_SCORE", "0.0"))
+
+# Novelty is scored locally against the analyzed corpus ('local') once it holds
+# NOVELTY_MIN_CORPUS papers, and by Gemini before that or when set to 'gemini'.
+# NOVELTY_EXPLAIN additionally asks Gemini to word the reasons for the local scores
+NOVELTY_MODE = os.getenv("NOVELTY_MODE", "local")
+NOVELTY_MIN_CORPUS = int(os.getenv("NOVELTY_MIN_CORPUS", "5"))
+NOVELTY_NEIGHBOURS = int(os.getenv("NOVELTY_NEIGHBOURS", "10"))
+NOVELTY_EXPLAIN = os.getenv("NOVELTY_EXPLAIN", "false").lower() == "true"
+
+# Revision tracking links new uploads of a paper to earlier ones by title and page
+# fingerprints. Revisions of a paper summarized with map-reduce reuse the cached chunk
+# summaries of unchanged pages and re-summarize only edited pages. A revision of a paper
+# summarized in truncate mode, with at most REVISION_MAX_CHANGED_FRACTION of its pages
+# changed, gets the earlier summary updated from just those pages (0 = always start over)
+REVISION_TRACKING_ENABLED = os.getenv("REVISION_TRACKING_ENABLED", "true").lower() == "true"
+REVISION_TRACKER_PATH = os.getenv("REVISION_TRACKER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "revisions.sqlite3"))
+REVISION_MAX_CHANGED_FRACTION = float(os.getenv("REVISION_MAX_CHANGED_FRACTION", "0.3"))
+
+# Bump a stage's version whenever its prompt template or post-processing changes,
+# so cached results produced by the old prompt are no longer served
+PROMPT_VERSIONS = {
+    'extract_text': 1,
+    'summary': 2,
+    'mindmap': 3,
+    'related_articles': 3,
+    'novelty': 3,
+    'novelty_explanation': 2,
+    'summary_chunk': 1,
+    'summary_reduce': 1,
+    'combined': 3
+}
+
+# Uploads are parsed from the request stream into memory, spilling to an anonymous temporary
+# file above UPLOAD_SPOOL_BYTES. Requests larger than MAX_UPLOAD_BYTES are refused with a 413
+# as soon as that many bytes have been read (0 = no limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+
+# One JSON log line per request, stage and Gemini call, tagged with the request ID
+JSON_LOGS = os.getenv("JSON_LOGS", "true").lower() == "true"
+
+# Result cache configuration
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "results.sqlite3"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+def validate_combined_analysis(data: Any) -> dict:
+    """Check a combined-analysis response against its schema, normalizing score types"""
+    if not isinstance(data, dict):
+        raise ValueError("Combined analysis is not a JSON object")
+    
+    for field in ('summary', 'mindmap'):
+        if not isinstance(data.get(field), str) or not data[field].strip():
+            raise ValueError(f"Combined analysis is missing '{field}'")
+    if 'mindmap' not in data['mindmap']:
+        raise ValueError("Combined analysis mind map is not Mermaid mindmap code")
+    
+    if not isinstance(data.get('novelty'), dict):
+        raise ValueError("Combined analysis is missing 'novelty'")
+    
+    return {
+        'summary': data['summary'].strip(),
+        'mindmap': data['mindmap'],
+        'novelty': validate_novelty(data['novelty'])
+    }
 
 class PDFAnalyzer:
-    def __init__(self):
+    def __init__(self, cache: Optional[ResultCache] = None, gemini: Optional[GeminiClient] = None,
+                 key_terms: Optional[KeyTermExtractor] = None, related_index: Optional[BM25Index] = None,
+                 embeddings=None, novelty_engine=None, revisions: Optional[RevisionTracker] = None,
+                 prompt_budget: Optional[PromptBudget] = None):
         self.gemini_api_key = GEMINI_API_KEY
+        self.cache = cache
+        self.revisions = revisions
+        self.related_index = related_index
+        self.embeddings = embeddings
+        self.novelty_engine = novelty_engine
+        # Built once: compiling a large vocabulary is the expensive part
+        self.key_terms = key_terms or KeyTermExtractor(load_vocabulary(KEY_TERMS_VOCABULARY_PATH))
+        self.prompt_budget = prompt_budget or PromptBudget(PROMPT_TOKEN_BUDGETS, mode=PROMPT_EXCERPT_MODE)
+        # Shares the ranker, so a paper ranked for its prompts is not ranked again for a fallback
+        self.local_summarizer = LocalSummarizer(self.prompt_budget.ranker, max_words=LOCAL_SUMMARY_WORDS)
+        # Gemini summaries that miss the fallback deadline finish here and still reach the cache
+        self._summary_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY)
+        self._background_tasks = set()
+        self.gemini = gemini or GeminiClient(
+            GEMINI_API_KEY,
+            GEMINI_API_URL,
+            pool_size=GEMINI_POOL_SIZE,
+            max_concurrency=GEMINI_MAX_CONCURRENCY,
+            max_retries=GEMINI_MAX_RETRIES,
+            rate_limiter=RateLimiter(GEMINI_REQUESTS_PER_MINUTE) if GEMINI_REQUESTS_PER_MINUTE > 0 else None,
+            adaptive_timeouts=GEMINI_ADAPTIVE_TIMEOUTS,
+            timeout_multiplier=GEMINI_TIMEOUT_MULTIPLIER,
+            min_timeout=GEMINI_MIN_TIMEOUT,
+            hedge_quantile=GEMINI_HEDGE_QUANTILE if GEMINI_HEDGE_ENABLED else None,
+            hedge_budget=GEMINI_HEDGE_BUDGET,
+            latency=LatencyTracker(GEMINI_LATENCY_WINDOW, GEMINI_LATENCY_MIN_SAMPLES)
+        )
+    
+    def iter_pdf_pages(self, pdf_file) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) as pages are decoded, using worker processes for long documents"""
+        return iter_pdf_pages(pdf_file, workers=PDF_EXTRACT_WORKERS, min_pages_for_parallel=PDF_PARALLEL_MIN_PAGES)
     
     def extract_pdf_text(self, pdf_file) -> str:
         """Extract text from uploaded PDF file"""
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text += page.extract_text() + "\n"
-            
-            if not text.strip():
-                raise Exception("No text could be extracted from the PDF")
-            
-            return text
+            with open_pdf_stream(pdf_file) as stream:
+                digest = stream_hash(stream)
+                cached_text = self.cached_pdf_text(digest)
+                if cached_text is not None:
+                    return cached_text
+                
+                with timed('extract'):
+                    pages = [page_text for _, page_text in self.iter_pdf_pages(stream)]
+            return self.remember_pdf_text(digest, pages)
         except Exception as e:
             raise Exception(f"Error extracting PDF text: {str(e)}")
     
-    def generate_summary_with_algorithm(self, text: str) -> str:
-        """Generate summary using advanced text analysis algorithms"""
-        try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            prompt = f"""
+    def cached_pdf_text(self, digest: str) -> Optional[str]:
+        """Text extracted earlier from the PDF with this content hash, or None to extract it again"""
+        if self.cache is None:
+            return None
+        cached_text = self.cache.get('extract_text', PROMPT_VERSIONS['extract_text'], digest)
+        # The cache keeps only the text; a paper extracted before revision tracking
+        # saw it is decoded once more for its page fingerprints
+        if cached_text is not None and (self.revisions is None or self.revisions.is_registered(cached_text)):
+            return cached_text
+        return None
+    
+    def remember_pdf_text(self, digest: str, pages: list) -> str:
+        """Join extracted pages into the paper's text, fingerprint them for revision detection and cache the text"""
+        text = "".join(page_text + "\n" for page_text in pages)
+        if not text.strip():
+            raise Exception("No text could be extracted from the PDF")
+        
+        if self.revisions is not None:
+            try:
+                self.revisions.register(text, pages)
+            except Exception as e:
+                log_event('revision_register_failed', error=str(e))
+        
+        if self.cache is not None:
+            self.cache.set('extract_text', PROMPT_VERSIONS['extract_text'], digest, text)
+        return text
+    
+    def _build_summary_prompt(self, text: str) -> str:
+        return f"""
             Please provide a comprehensive summary of the following research paper. 
             Focus on the main objectives, methodology, key findings, and conclusions.
             Keep it detailed but concise (300-500 words).
             
             Research Paper Text:
-            {text[:10000]}
+            {self.prompt_budget.excerpt(text, 'summary')}
             """
+    
+    def _build_revision_summary_prompt(self, previous_summary: str, changes: dict) -> str:
+        changed = "\n\n".join(f"Page {number}:\n{page}" for number, page in changes['pages'].items())
+        removed = f", {changes['removed_pages']} removed" if changes['removed_pages'] else ""
+        return f"""
+            Below is the summary of an earlier version of a research paper, followed by the pages
+            that differ in its new version ({len(changes['pages'])} of {changes['total_pages']} pages changed or added{removed}).
+            Revise the summary so it describes the new version: keep what still holds and update
+            what the changed pages alter. Keep it detailed but concise (300-500 words).
             
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
+            Earlier summary:
+            {previous_summary}
             
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    return result['candidates'][0]['content']['parts'][0]['text']
-                else:
-                    raise Exception("No response generated from processing engine")
-            else:
-                raise Exception(f"Processing engine error: {response.status_code} - {response.text}")
-                
+            Changed pages:
+            {self.prompt_budget.excerpt(changed, 'summary')}
+            """
+    
+    def _summary_revision(self, text: str) -> Optional[Tuple[str, dict]]:
+        """The previous revision's cached summary and this revision's changed pages, for a minor revision"""
+        if self.revisions is None or self.cache is None or REVISION_MAX_CHANGED_FRACTION <= 0:
+            return None
+        changes = self.revisions.changed_pages(text)
+        if changes is None or not changes['pages']:
+            return None
+        if len(changes['pages']) + changes['removed_pages'] > REVISION_MAX_CHANGED_FRACTION * changes['total_pages']:
+            return None
+        previous_summary = self.cache.get('summary', PROMPT_VERSIONS['summary'], changes['revision_of'])
+        if previous_summary is None:
+            return None
+        return previous_summary, changes
+    
+    def _summary_prompt(self, text: str) -> Tuple[str, str]:
+        """The truncate-mode summary prompt and its stage: an update of the previous revision's
+        summary for a minor revision, otherwise an excerpt of the whole paper"""
+        revision = self._summary_revision(text)
+        if revision is None:
+            return self._build_summary_prompt(text), 'summary'
+        previous_summary, changes = revision
+        log_event('summary_revision', revision_of=changes['revision_of'], changed_pages=list(changes['pages']),
+                  removed_pages=changes['removed_pages'])
+        return self._build_revision_summary_prompt(previous_summary, changes), 'summary_revision'
+    
+    @cached_stage('summary', PROMPT_VERSIONS['summary'])
+    def generate_summary_with_algorithm(self, text: str) -> str:
+        """Generate summary using advanced text analysis algorithms"""
+        try:
+            prompt, stage = self._summary_prompt(text)
+            return self.gemini.generate(prompt, timeout=GEMINI_TIMEOUTS['summary'], stage=stage)
+
         except Exception as e:
             raise Exception(f"Error generating summary: {str(e)}")
     
-    def generate_mermaid_mindmap(self, text: str) -> str:
-        """Generate Mermaid mind map code using document structure analysis"""
+    def stream_summary(self, text: str) -> Iterator[str]:
+        """Yield summary text fragments as they are generated, caching the complete summary"""
+        digest = content_hash(text)
+        if self.cache is not None:
+            cached_summary = self.cache.get('summary', PROMPT_VERSIONS['summary'], digest)
+            if cached_summary is not None:
+                yield cached_summary
+                return
+        
+        fragments = []
         try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            prompt = f"""
+            prompt, stage = self._summary_prompt(text)
+            stream = self.gemini.stream_generate(prompt, timeout=GEMINI_TIMEOUTS['summary'], stage=stage)
+            for fragment in stream:
+                fragments.append(fragment)
+                yield fragment
+        except Exception as e:
+            # Once fragments have been sent the client has part of a Gemini summary; do not mix in another
+            if fragments or not LOCAL_SUMMARY_FALLBACK:
+                raise Exception(f"Error generating summary: {str(e)}")
+            FALLBACKS.inc(kind='summary_local')
+            log_event('fallback', kind='summary_local', error=str(e))
+            yield self.generate_local_summary(text)
+            return
+        
+        if self.cache is not None and fragments:
+            self.cache.set('summary', PROMPT_VERSIONS['summary'], digest, "".join(fragments))
+    
+    def _build_mindmap_prompt(self, text: str) -> str:
+        return f"""
             Based on the following research paper, create a detailed Mermaid mind map code.
             The mind map should include:
             - Main research topic as the central node
@@ -112,7 +421,7 @@ class PDFAnalyzer:
             Do not include any markdown code blocks or explanations, just the raw mermaid code.
             
             Research Paper Text:
-            {text[:10000]}
+            {self.prompt_budget.excerpt(text, 'mindmap')}
             
             Example format:
             mindmap
@@ -130,65 +439,99 @@ class PDFAnalyzer:
                   Implications
                   Future Work
             """
-            
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    mermaid_code = result['candidates'][0]['content']['parts'][0]['text']
-                    
-                    # Clean up the response to extract just the mermaid code
-                    lines = mermaid_code.split('\n')
-                    mermaid_lines = []
-                    in_mermaid = False
-                    
-                    for line in lines:
-                        if line.strip().startswith('mindmap'):
-                            in_mermaid = True
-                        if in_mermaid:
-                            if line.strip().startswith('```'):
-                                continue
-                            mermaid_lines.append(line)
-                        if line.strip() == '```' and in_mermaid and len(mermaid_lines) > 1:
-                            break
-                    
-                    cleaned_code = '\n'.join(mermaid_lines).strip()
-                    return cleaned_code if cleaned_code else mermaid_code.replace('```', '').replace('mermaid', '').strip()
-                else:
-                    raise Exception("No response generated from processing engine")
-            else:
-                raise Exception(f"Processing engine error: {response.status_code} - {response.text}")
-                
+    
+    @cached_stage('mindmap', PROMPT_VERSIONS['mindmap'])
+    def generate_mermaid_mindmap(self, text: str) -> str:
+        """Generate Mermaid mind map code using document structure analysis"""
+        try:
+            prompt = self._build_mindmap_prompt(text)
+            mermaid_code = self.gemini.generate(prompt, timeout=GEMINI_TIMEOUTS['mindmap'], stage='mindmap')
+            return self._clean_mermaid_code(mermaid_code)
+
         except Exception as e:
             raise Exception(f"Error generating mind map: {str(e)}")
     
+    def _clean_mermaid_code(self, mermaid_code: str) -> str:
+        """Clean up the response to extract just the mermaid code"""
+        return parse_mermaid_response(mermaid_code).value
+    
+    def index_paper(self, text: str, summary: str):
+        """Add an analyzed paper to the local related-articles index and embedding store"""
+        doc_id = content_hash(text)
+        title = self._guess_title(text, summary)
+        for index in (self.related_index, self.embeddings):
+            if index is None:
+                continue
+            try:
+                index.add(doc_id, title, summary)
+            except Exception as e:
+                # The indexes are accelerators; failing to update one must not fail the analysis
+                log_event('index_paper_failed', error=str(e))
+    
+    def _guess_title(self, text: str, summary: str) -> str:
+        """First line near the top of the paper that looks like a title"""
+        for line in text.strip().split('\n')[:20]:
+            line = line.strip()
+            if 10 <= len(line) <= 200 and len(line.split()) >= 3 and not line.lower().startswith(('arxiv', 'doi', 'http')):
+                return line
+        return summary.strip()[:80] or 'Untitled paper'
+    
+    def _as_related_article(self, hit: dict, source: str) -> dict:
+        """Shape an index hit like the article dicts the frontend renders"""
+        description = hit['summary'].strip()
+        if len(description) > 400:
+            description = description[:400].rsplit(' ', 1)[0] + '...'
+        return {
+            'title': hit['title'],
+            'description': description,
+            'journal': 'Previously analyzed paper',
+            'date': time.strftime('%Y-%m-%d', time.localtime(hit['added_at'])),
+            'score': hit['score'],
+            'document_hash': hit['doc_id'],
+            'source': source
+        }
+    
+    def find_local_related_articles(self, summary: str, limit: int = RELATED_ARTICLES_LIMIT) -> list:
+        """Most similar previously analyzed papers from the local index, as related-article dicts"""
+        if self.related_index is None:
+            return []
+        
+        # One extra hit in case the paper being analyzed is itself already indexed
+        return [
+            self._as_related_article(hit, 'local')
+            for hit in self.related_index.search(summary, limit=limit + 1)
+            if hit['summary'].strip() != summary.strip()
+        ][:limit]
+    
+    def find_similar_papers(self, summary: str, limit: int = 10, text: Optional[str] = None) -> list:
+        """Nearest papers in the embedding store, excluding the paper itself when its text is known"""
+        if self.embeddings is None:
+            return []
+        
+        exclude = [content_hash(text)] if text else []
+        return [
+            self._as_related_article(hit, 'embedding')
+            for hit in self.embeddings.search(summary, limit=limit + 1, exclude=exclude)
+            if hit['summary'].strip() != summary.strip()
+        ][:limit]
+    
     def find_related_articles(self, summary: str) -> list:
-        """Find related articles using Gemini API with improved formatting - Always use real API results"""
+        """Related papers from the local index, topped up with Gemini suggestions when enabled"""
+        articles = []
         try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            # Enhanced prompt to ensure better results from Gemini
-            prompt = f"""
+            articles = self.find_local_related_articles(summary)
+        except Exception as e:
+            log_event('related_index_search_failed', error=str(e))
+        
+        if len(articles) >= RELATED_ARTICLES_LIMIT or not RELATED_ARTICLES_USE_GEMINI:
+            return articles
+        
+        suggestions = self._find_related_articles_gemini(summary)
+        return articles + suggestions[:RELATED_ARTICLES_LIMIT - len(articles)]
+    
+    def _build_related_articles_prompt(self, summary: str) -> str:
+        # Enhanced prompt to ensure better results from Gemini
+        return f"""
             You are a research assistant. Based on the following research summary, find 5 REAL related academic research papers that actually exist or could realistically exist.
             
             Search for papers that are:
@@ -229,120 +572,29 @@ class PDFAnalyzer:
             - Make the relationships between papers clear and meaningful
             - Include proper academic URLs for all papers
             """
-            
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.7,
-                    "topK": 40,
-                    "topP": 0.95,
-                    "maxOutputTokens": 2048,
-                }
-            }
-            
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=90  # Increased timeout for better results
+    
+    @cached_stage('related_articles', PROMPT_VERSIONS['related_articles'])
+    def _find_related_articles_gemini(self, summary: str) -> list:
+        """Find related articles using Gemini API with improved formatting - Always use real API results"""
+        try:
+            articles_text = self.gemini.generate(
+                self._build_related_articles_prompt(summary),
+                generation_config=RELATED_ARTICLES_GENERATION_CONFIG,
+                timeout=GEMINI_TIMEOUTS['related_articles'],
+                stage='related_articles'
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    articles_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
-                    
-                    # Multiple attempts to parse the JSON response
-                    try:
-                        # Method 1: Direct JSON parsing
-                        articles_json = json.loads(articles_text)
-                        if isinstance(articles_json, list) and len(articles_json) > 0:
-                            # Validate that each article has required fields and add URLs
-                            key_terms = self._extract_key_terms(summary)
-                            valid_articles = []
-                            for article in articles_json:
-                                if (isinstance(article, dict) and 
-                                    'title' in article and 
-                                    'description' in article and 
-                                    article['title'].strip() and 
-                                    article['description'].strip()):
-                                    
-                                    # Ensure URL is properly set
-                                    if 'url' not in article or not article['url'] or article['url'] == '#':
-                                        article['url'] = self._generate_realistic_url(
-                                            article.get('title', 'Research Paper'), 
-                                            article.get('authors', []), 
-                                            article.get('date', '2023'), 
-                                            key_terms
-                                        )
-                                    valid_articles.append(article)
-                            
-                            if len(valid_articles) > 0:
-                                return valid_articles[:5]
-                                
-                    except json.JSONDecodeError:
-                        pass
-                    
-                    # Method 2: Extract JSON from code blocks
-                    json_patterns = [
-                        r'```json\s*(.*?)\s*```',
-                        r'```\s*(.*?)\s*```',
-                        r'\[\s*{.*?}\s*\]'
-                    ]
-                    
-                    for pattern in json_patterns:
-                        json_match = re.search(pattern, articles_text, re.DOTALL)
-                        if json_match:
-                            try:
-                                articles_json = json.loads(json_match.group(1))
-                                if isinstance(articles_json, list) and len(articles_json) > 0:
-                                    valid_articles = []
-                                    for article in articles_json:
-                                        if (isinstance(article, dict) and 
-                                            'title' in article and 
-                                            'description' in article):
-                                            valid_articles.append(article)
-                                    
-                                    if len(valid_articles) > 0:
-                                        return valid_articles[:5]
-                            except json.JSONDecodeError:
-                                continue
-                    
-                    # Method 3: Try to parse manually with improved fallback
-                    return self._parse_articles_from_gemini_response(articles_text, summary)
-                    
-                else:
-                    raise Exception("No response generated from Gemini API")
-            else:
-                error_msg = f"Gemini API error: {response.status_code}"
-                if response.text:
-                    error_msg += f" - {response.text[:200]}"
-                raise Exception(error_msg)
-                
+            return self._parse_related_articles(articles_text, summary, 'related_articles')
+
         except Exception as e:
-            print(f"Error in find_related_articles: {str(e)}")
+            FALLBACKS.inc(kind='related_articles_retry')
+            log_event('fallback', kind='related_articles_retry', error=str(e))
             # Try one more time with a simpler prompt
             return self._retry_gemini_articles(summary)
     
-    def _retry_gemini_articles(self, summary: str) -> list:
-        """Retry with a simpler prompt if the first attempt fails"""
-        try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            # Extract key terms from summary for better targeting
-            key_terms = self._extract_key_terms(summary)
-            
-            simple_prompt = f"""
+    def _build_related_articles_retry_prompt(self, summary: str) -> str:
+        # Extract key terms from summary for better targeting
+        key_terms = self._extract_key_terms(summary)
+        return f"""
             Find 5 academic research papers related to: {', '.join(key_terms[:3])}
             
             Return as JSON array:
@@ -358,95 +610,67 @@ class PDFAnalyzer:
               }}
             ]
             
-            Research context: {summary[:500]}
+            Research context: {self.prompt_budget.excerpt(summary, 'related_articles_retry')}
             """
-            
-            payload = {
-                "contents": [{"parts": [{"text": simple_prompt}]}],
-                "generationConfig": {"temperature": 0.3, "maxOutputTokens": 1500}
-            }
-            
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=60
+    
+    def _retry_gemini_articles(self, summary: str) -> list:
+        """Retry with a simpler prompt if the first attempt fails"""
+        try:
+            articles_text = self.gemini.generate(
+                self._build_related_articles_retry_prompt(summary),
+                generation_config=RELATED_ARTICLES_RETRY_GENERATION_CONFIG,
+                timeout=GEMINI_TIMEOUTS['related_articles_retry'],
+                stage='related_articles_retry'
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    articles_text = result['candidates'][0]['content']['parts'][0]['text']
-                    
-                    # Try to parse the simpler response
-                    try:
-                        # Look for JSON array pattern
-                        json_match = re.search(r'\[.*\]', articles_text, re.DOTALL)
-                        if json_match:
-                            articles_json = json.loads(json_match.group(0))
-                            if isinstance(articles_json, list) and len(articles_json) > 0:
-                                # Generate realistic URLs for any articles that don't have them
-                                for article in articles_json:
-                                    if 'url' not in article or article['url'] == '#' or not article['url']:
-                                        article['url'] = self._generate_realistic_url(
-                                            article.get('title', 'Research Paper'), 
-                                            article.get('authors', []), 
-                                            article.get('date', '2023'), 
-                                            key_terms
-                                        )
-                                return articles_json[:5]
-                    except:
-                        pass
-                    
-                    # Parse manually as last resort
-                    return self._parse_articles_from_gemini_response(articles_text, summary)
-            
-            # Only if both API calls fail, use intelligent fallbacks
-            return self._create_intelligent_fallbacks(summary, key_terms)
+            return self._parse_related_articles(articles_text, summary, 'related_articles_retry')
             
         except Exception as e:
-            print(f"Retry also failed: {str(e)}")
-            key_terms = self._extract_key_terms(summary)
-            return self._create_intelligent_fallbacks(summary, key_terms)
+            return self._related_articles_fallback(summary, e)
+    
+    def _related_articles_fallback(self, summary: str, error: Exception) -> Uncached:
+        """Only if both API calls fail, use intelligent fallbacks, kept out of the result cache"""
+        FALLBACKS.inc(kind='related_articles_synthetic')
+        log_event('fallback', kind='related_articles_synthetic', error=str(error))
+        key_terms = self._extract_key_terms(summary)
+        # Not cached, so the next request asks Gemini again instead of serving these for the cache TTL
+        return Uncached(self._create_intelligent_fallbacks(summary, key_terms))
+    
+    def _parse_related_articles(self, articles_text: str, summary: str, stage: str) -> list:
+        """Validated articles from a Gemini response, with URLs filled in"""
+        # Falls back to reading titles and descriptions line by line
+        articles = parse_json_response(
+            articles_text.strip(),
+            stage,
+            validate=validate_articles,
+            fallback=lambda response: self._parse_articles_from_gemini_response(response, summary)
+        ).value
+        if not articles:
+            raise GeminiError("No articles found in the response")
+        return self._fill_article_urls(articles, summary)[:5]
+    
+    def _fill_article_urls(self, articles: list, summary: str) -> list:
+        """Give every article without a usable URL a generated one"""
+        key_terms = self._extract_key_terms(summary)
+        for article in articles:
+            if not article.get('url') or article['url'] == '#':
+                article['url'] = self._generate_realistic_url(
+                    article.get('title', 'Research Paper'), 
+                    article.get('authors', []), 
+                    str(article.get('date', '2023')), 
+                    key_terms
+                )
+        return articles
     
     def _extract_key_terms(self, summary: str) -> list:
         """Extract key research terms from the summary"""
-        # Common research keywords to look for
-        research_terms = [
-            'machine learning', 'artificial intelligence', 'deep learning', 'neural networks',
-            'data analysis', 'algorithm', 'methodology', 'framework', 'model', 'system',
-            'optimization', 'classification', 'prediction', 'analysis', 'detection',
-            'recognition', 'processing', 'mining', 'extraction', 'clustering',
-            'regression', 'validation', 'evaluation', 'performance', 'accuracy',
-            'healthcare', 'medical', 'clinical', 'diagnosis', 'treatment',
-            'image processing', 'natural language', 'computer vision', 'robotics',
-            'database', 'security', 'network', 'software', 'hardware'
-        ]
-        
-        found_terms = []
-        summary_lower = summary.lower()
-        
-        for term in research_terms:
-            if term in summary_lower:
-                found_terms.append(term.title())
-        
-        # Also extract potential domain-specific terms (nouns that appear frequently)
-        words = re.findall(r'\b[A-Z][a-z]+\b', summary)
-        word_freq = {}
-        for word in words:
-            if len(word) > 3:  # Skip short words
-                word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # Add high-frequency domain terms
-        frequent_terms = [word for word, freq in word_freq.items() if freq >= 2]
-        found_terms.extend(frequent_terms[:3])
-        
-        return found_terms[:8] if found_terms else ['Research', 'Analysis', 'Study']
+        # Single pass over the summary, memoized per summary text
+        return list(self.key_terms.extract(summary))
     
     def _parse_articles_from_gemini_response(self, articles_text: str, summary: str) -> list:
         """Enhanced parsing of Gemini response when JSON parsing fails"""
         articles = []
         lines = articles_text.split('\n')
+        key_terms = self._extract_key_terms(summary)
         current_article = {}
         
         for line in lines:
@@ -470,7 +694,6 @@ class PDFAnalyzer:
                             articles.append(current_article)
                     
                     # Start new article with enhanced defaults
-                    key_terms = self._extract_key_terms(summary)
                     current_article = {
                         'title': title_match.group(1).strip(),
                         'description': '',
@@ -499,7 +722,6 @@ class PDFAnalyzer:
         # If we got some articles, enhance them
         if articles:
             enhanced_articles = []
-            key_terms = self._extract_key_terms(summary)
             
             for i, article in enumerate(articles):
                 # Enhance description if too short
@@ -523,8 +745,8 @@ class PDFAnalyzer:
             
             return enhanced_articles[:5]
         
-        # If no articles parsed, create intelligent ones based on the response content
-        return self._create_intelligent_fallbacks(summary, self._extract_key_terms(summary))
+        # Nothing usable; the caller retries and only then falls back to generated articles
+        return []
     
     def _create_intelligent_fallbacks(self, summary: str, key_terms: list) -> list:
         """Create intelligent fallback articles based on summary analysis"""
@@ -582,14 +804,55 @@ class PDFAnalyzer:
         
         return intelligent_articles
     
-    def calculate_novelty_score(self, text: str, summary: str) -> dict:
-        """Calculate novelty score based on content analysis"""
-        try:
-            headers = {
-                "Content-Type": "application/json"
-            }
+    def local_novelty_score(self, text: str, summary: str, explain: Optional[bool] = None) -> Optional[dict]:
+        """Corpus-relative novelty scores, or None when local scoring is off or the corpus is too small"""
+        if NOVELTY_MODE != 'local' or self.novelty_engine is None:
+            return None
+        scores = self.novelty_engine.score(summary, exclude_doc_id=content_hash(text))
+        if scores is None:
+            return None
+        
+        if explain is None:
+            explain = NOVELTY_EXPLAIN
+        if explain:
+            try:
+                scores.update(self._explain_novelty_scores(summary, json.dumps(scores)))
+            except Exception as e:
+                # The computed reasons are still accurate, just less readable
+                log_event('novelty_explanation_failed', error=str(e))
+        return scores
+    
+    def calculate_novelty_score(self, text: str, summary: str, explain: Optional[bool] = None) -> dict:
+        """Score novelty against the analyzed corpus, falling back to Gemini while the corpus is small"""
+        scores = self.local_novelty_score(text, summary, explain)
+        if scores is not None:
+            return scores
+        return self._calculate_novelty_score_gemini(text, summary)
+    
+    def _build_novelty_explanation_prompt(self, summary: str, scores_json: str) -> str:
+        return f"""
+            The following novelty scores (1-100) were computed for a research paper by comparing it
+            with a corpus of previously analyzed papers. Do not change the scores. Write a brief
+            explanation (1-2 sentences) for each, grounded in the summary and the measurements given.
+            Format the response as a JSON object with these fields: methodological_reason,
+            conceptual_reason, impact_reason, overall_assessment.
             
-            prompt = f"""
+            Scores and measurements:
+            {scores_json}
+            
+            Research Summary:
+            {self.prompt_budget.excerpt(summary, 'novelty_summary')}
+            """
+    
+    @cached_stage('novelty_explanation', PROMPT_VERSIONS['novelty_explanation'])
+    def _explain_novelty_scores(self, summary: str, scores_json: str) -> dict:
+        """Ask Gemini to explain locally computed novelty scores, without changing them"""
+        explanation_text = self.gemini.generate(self._build_novelty_explanation_prompt(summary, scores_json),
+                                                 timeout=GEMINI_TIMEOUTS['novelty'], stage='novelty_explanation')
+        return parse_json_response(explanation_text, 'novelty_explanation', validate=validate_novelty_reasons).value
+    
+    def _build_novelty_prompt(self, text: str, summary: str) -> str:
+        return f"""
             Analyze the following research paper and calculate a novelty score from 1-100.
             Evaluate originality, innovation, and potential impact.
             
@@ -605,105 +868,604 @@ class PDFAnalyzer:
             conceptual_reason, impact_reason, overall_assessment.
             
             Research Summary:
-            {summary[:2000]}
+            {self.prompt_budget.excerpt(summary, 'novelty_summary')}
             
-            First few paragraphs:
-            {text[:3000]}
+            Key passages from the paper:
+            {self.prompt_budget.excerpt(text, 'novelty_text')}
             """
+    
+    @cached_stage('novelty', PROMPT_VERSIONS['novelty'])
+    def _calculate_novelty_score_gemini(self, text: str, summary: str) -> dict:
+        """Calculate novelty score based on content analysis"""
+        try:
+            score_text = self.gemini.generate(self._build_novelty_prompt(text, summary),
+                                              timeout=GEMINI_TIMEOUTS['novelty'], stage='novelty')
+            return self._novelty_or_default(self._parse_novelty_response(score_text))
+
+        except Exception as e:
+            raise Exception(f"Error calculating novelty score: {str(e)}")
+    
+    def _parse_novelty_response(self, score_text: str) -> dict:
+        return parse_json_response(
+            score_text,
+            'novelty',
+            validate=validate_novelty,
+            fallback=self._parse_novelty_lines
+        ).value
+    
+    def _parse_novelty_lines(self, score_text: str) -> dict:
+        """Read 'Category: score reason' lines when the response has no usable JSON"""
+        scores = {
+            "methodological_score": 0,
+            "conceptual_score": 0,
+            "impact_score": 0,
+            "overall_score": 0,
+            "methodological_reason": "",
+            "conceptual_reason": "",
+            "impact_reason": "",
+            "overall_assessment": ""
+        }
+        
+        for line in score_text.split('\n'):
+            if ":" not in line:
+                continue
+            lowered = line.lower()
+            for keyword, score_field, reason_field in (
+                ("methodological", "methodological_score", "methodological_reason"),
+                ("conceptual", "conceptual_score", "conceptual_reason"),
+                ("impact", "impact_score", "impact_reason"),
+                ("overall", "overall_score", "overall_assessment")
+            ):
+                if keyword in lowered:
+                    value = line.split(":", 1)[1]
+                    number = re.search(r'\d+', value)
+                    if number:
+                        scores[score_field] = int(number.group())
+                        scores[reason_field] = value.strip()
+                    break
+        
+        return scores
+    
+    def _novelty_or_default(self, scores: dict) -> Union[dict, Uncached]:
+        """Parsed scores, or default ones kept out of the result cache when none were found"""
+        if scores.get("overall_score"):
+            return scores
+        FALLBACKS.inc(kind='novelty_default_score')
+        scores["overall_score"] = 70
+        scores["overall_assessment"] = "Default assessment as parsing failed."
+        return Uncached(scores)
+    
+    def _build_combined_prompt(self, text: str) -> str:
+        return f"""
+            Analyze the following research paper and respond with a single JSON object
+            with exactly these keys:
             
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ]
-            }
+            "summary": a comprehensive summary of the paper (300-500 words) covering the
+              main objectives, methodology, key findings, and conclusions.
+            "novelty": an object with methodological_score, conceptual_score, impact_score
+              and overall_score (integers from 1-100), and methodological_reason,
+              conceptual_reason, impact_reason and overall_assessment (1-2 sentences each).
+            "mindmap": Mermaid mind map code as a single string, starting with 'mindmap',
+              with the main research topic as the root node and the key sections
+              (Introduction, Methodology, Results, Conclusion) with their important
+              concepts and findings as indented children.
             
-            response = requests.post(
-                f"{GEMINI_API_URL}?key={self.gemini_api_key}",
-                headers=headers,
-                json=payload,
-                timeout=60
-            )
+            Respond with ONLY the JSON object.
             
-            if response.status_code == 200:
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    score_text = result['candidates'][0]['content']['parts'][0]['text']
-                    
-                    # Try to parse the JSON response
-                    try:
-                        # First attempt: Try to extract JSON directly
-                        json_match = re.search(r'```json\s*(.*?)\s*```', score_text, re.DOTALL)
-                        if json_match:
-                            score_json = json.loads(json_match.group(1))
-                        else:
-                            # Second attempt: Assume the whole response is JSON
-                            score_json = json.loads(score_text)
-                        
-                        return score_json
-                    except json.JSONDecodeError:
-                        # Fallback: Create structured response from text
-                        lines = score_text.split('\n')
-                        scores = {
-                            "methodological_score": 0,
-                            "conceptual_score": 0,
-                            "impact_score": 0,
-                            "overall_score": 0,
-                            "methodological_reason": "",
-                            "conceptual_reason": "",
-                            "impact_reason": "",
-                            "overall_assessment": ""
-                        }
-                        
-                        for line in lines:
-                            if "methodological" in line.lower() and ":" in line:
-                                parts = line.split(":", 1)
-                                try:
-                                    scores["methodological_score"] = int(re.search(r'\d+', parts[1]).group())
-                                    scores["methodological_reason"] = parts[1].strip()
-                                except:
-                                    pass
-                            elif "conceptual" in line.lower() and ":" in line:
-                                parts = line.split(":", 1)
-                                try:
-                                    scores["conceptual_score"] = int(re.search(r'\d+', parts[1]).group())
-                                    scores["conceptual_reason"] = parts[1].strip()
-                                except:
-                                    pass
-                            elif "impact" in line.lower() and ":" in line:
-                                parts = line.split(":", 1)
-                                try:
-                                    scores["impact_score"] = int(re.search(r'\d+', parts[1]).group())
-                                    scores["impact_reason"] = parts[1].strip()
-                                except:
-                                    pass
-                            elif "overall" in line.lower() and ":" in line:
-                                parts = line.split(":", 1)
-                                try:
-                                    scores["overall_score"] = int(re.search(r'\d+', parts[1]).group())
-                                    scores["overall_assessment"] = parts[1].strip()
-                                except:
-                                    pass
-                        
-                        # If we didn't find scores, provide defaults
-                        if scores["overall_score"] == 0:
-                            scores["overall_score"] = 70
-                            scores["overall_assessment"] = "Default assessment as parsing failed."
-                        
-                        return scores
-                else:
-                    raise Exception("No response generated from processing engine")
+            Research Paper Text:
+            {self.prompt_budget.excerpt(text, 'combined')}
+            """
+    
+    @cached_stage('combined', PROMPT_VERSIONS['combined'])
+    def generate_combined_analysis(self, text: str) -> dict:
+        """Generate summary, novelty scores and mind map in one structured-JSON request"""
+        response_text = self.gemini.generate(
+            self._build_combined_prompt(text),
+            generation_config=COMBINED_GENERATION_CONFIG,
+            timeout=GEMINI_TIMEOUTS['combined'],
+            stage='combined'
+        )
+        return self._parse_combined_analysis(response_text)
+    
+    def _parse_combined_analysis(self, response_text: str) -> dict:
+        # The model occasionally wraps the object in a ```json fence despite the mime type
+        analysis = parse_json_response(response_text, 'combined', validate=validate_combined_analysis).value
+        analysis['mindmap'] = self._clean_mermaid_code(analysis['mindmap'])
+        return analysis
+    
+    def _use_map_reduce(self, text: str, mode: Optional[str]) -> bool:
+        # Papers that fit in one prompt gain nothing from map-reduce
+        if len(text) <= MAP_REDUCE_CHUNK_CHARS or self._use_local_summary(mode):
+            return False
+        # A new revision of a paper summarized with map-reduce only re-summarizes the pages that
+        # changed; without a stored chunk layout there is nothing to reuse
+        if mode is None and self.revisions is not None:
+            previous = self.revisions.previous_revision(text)
+            if previous is not None and previous['chunk_layout']:
+                return True
+        return (mode or SUMMARY_MODE) == 'map_reduce'
+    
+    def _build_chunk_prompt(self, chunk: str) -> str:
+        return f"""
+            The following is one part of a longer research paper.
+            Summarize this part in 100-200 words, keeping its objectives, methods,
+            findings and any numbers that matter. Do not speculate about other parts.
+            
+            Paper excerpt:
+            {chunk}
+            """
+    
+    @cached_stage('summary_chunk', PROMPT_VERSIONS['summary_chunk'])
+    def _summarize_chunk(self, chunk: str) -> str:
+        """Summarize one section-aware chunk of a paper (map step)"""
+        return self.gemini.generate(self._build_chunk_prompt(chunk), timeout=GEMINI_TIMEOUTS['summary_chunk'],
+                                    stage='summary_chunk')
+    
+    def _plan_chunks(self, text: str) -> Optional[dict]:
+        """Page-aligned chunk plan for an extracted paper, None when its pages are unknown"""
+        if self.revisions is None:
+            return None
+        return self.revisions.plan_chunks(text, MAP_REDUCE_CHUNK_CHARS)
+    
+    def summarize_chunks(self, text: str) -> list:
+        """Summarize every chunk of the full text concurrently, reusing cached chunk summaries"""
+        # Extracted papers are chunked along page groups so a later revision keeps
+        # the groups whose pages did not change, and with them their cached summaries
+        plan = self._plan_chunks(text)
+        chunks = plan['chunks'] if plan else split_into_chunks(text, MAP_REDUCE_CHUNK_CHARS)
+        with ThreadPoolExecutor(max_workers=MAP_REDUCE_WORKERS) as executor:
+            chunk_summaries = list(executor.map(bind(self._summarize_chunk), chunks))
+        if plan:
+            self.revisions.save_layout(plan['doc_id'], plan['layout'])
+        return chunk_summaries
+    
+    def revision_report(self, text: str) -> Optional[dict]:
+        """What changed since the previous revision of this paper, None if it has none"""
+        plan = self._plan_chunks(text)
+        if not plan or 'revision_of' not in plan:
+            return None
+        return {
+            'revision_of': plan['revision_of'],
+            'changed_pages': plan['changed_pages'],
+            'removed_pages': plan['removed_pages'],
+            'unchanged_pages': plan['unchanged_pages'],
+            'reused_chunk_groups': plan['reused_groups'],
+            'total_chunk_groups': plan['total_groups']
+        }
+    
+    def _join_chunk_summaries(self, chunk_summaries: list) -> str:
+        return "\n\n".join(
+            f"Part {index} of {len(chunk_summaries)}:\n{chunk_summary}"
+            for index, chunk_summary in enumerate(chunk_summaries, 1)
+        )
+    
+    def _build_reduce_prompt(self, condensed: str) -> str:
+        return f"""
+            Below are summaries of consecutive parts of one research paper.
+            Combine them into a single comprehensive summary of the whole paper.
+            Focus on the main objectives, methodology, key findings, and conclusions.
+            Keep it detailed but concise (300-500 words).
+            
+            Part summaries:
+            {condensed}
+            """
+    
+    @cached_stage('summary_reduce', PROMPT_VERSIONS['summary_reduce'])
+    def _reduce_chunk_summaries(self, condensed: str) -> str:
+        """Combine per-chunk summaries into the final paper summary (reduce step)"""
+        return self.gemini.generate(self._build_reduce_prompt(condensed), timeout=GEMINI_TIMEOUTS['summary'],
+                                    stage='summary_reduce')
+    
+    def generate_summary_map_reduce(self, text: str) -> str:
+        """Summarize the full paper by summarizing chunks concurrently and then combining them"""
+        try:
+            return self._reduce_chunk_summaries(self._join_chunk_summaries(self.summarize_chunks(text)))
+        except Exception as e:
+            raise Exception(f"Error generating summary: {str(e)}")
+    
+    def _use_local_summary(self, mode: Optional[str]) -> bool:
+        return (mode or SUMMARY_MODE) == 'local'
+    
+    def generate_local_summary(self, text: str) -> str:
+        """Extractive summary ranked in-process, without calling Gemini"""
+        with timed('summary_local'):
+            return self.local_summarizer.summarize(text)
+    
+    def _summary_or_local(self, text: str, generate: Callable[[], str]) -> str:
+        """Run a Gemini summary, answering with the local summary if it fails or misses the deadline"""
+        if not LOCAL_SUMMARY_FALLBACK:
+            return generate()
+        try:
+            if LOCAL_SUMMARY_DEADLINE_SECONDS > 0:
+                return self._summary_executor.submit(bind(generate)).result(timeout=LOCAL_SUMMARY_DEADLINE_SECONDS)
+            return generate()
+        except FutureTimeoutError:
+            FALLBACKS.inc(kind='summary_local_slow')
+            log_event('fallback', kind='summary_local_slow', deadline_seconds=LOCAL_SUMMARY_DEADLINE_SECONDS)
+        except Exception as e:
+            FALLBACKS.inc(kind='summary_local')
+            log_event('fallback', kind='summary_local', error=str(e))
+        return self.generate_local_summary(text)
+    
+    def summarize(self, text: str, mode: Optional[str] = None) -> str:
+        """Summarize with the requested mode ('truncate', 'map_reduce' or 'local'), defaulting to SUMMARY_MODE"""
+        if self._use_local_summary(mode):
+            return self.generate_local_summary(text)
+        if self._use_map_reduce(text, mode):
+            return self._summary_or_local(text, lambda: self.generate_summary_map_reduce(text))
+        return self._summary_or_local(text, lambda: self.generate_summary_with_algorithm(text))
+    
+    def generate_mindmap(self, text: str, mode: Optional[str] = None) -> str:
+        """Generate the mind map, from chunk summaries covering the whole paper in map_reduce mode"""
+        if self._use_map_reduce(text, mode):
+            return self.generate_mermaid_mindmap(self._join_chunk_summaries(self.summarize_chunks(text)))
+        return self.generate_mermaid_mindmap(text)
+    
+    def analyze_paper(self, text: str, report_stage: Optional[Callable[[str, str], None]] = None,
+                      mode: Optional[str] = None, combined: Optional[bool] = None) -> dict:
+        """Run summary, mind map, related articles and novelty with independent calls overlapped"""
+        def run_stage(stage: str, method, *args):
+            if report_stage:
+                report_stage(stage, RUNNING)
+            with timed(stage):
+                result = method(*args)
+            if report_stage:
+                report_stage(stage, COMPLETED)
+            return result
+        
+        if combined is None:
+            combined = COMBINED_ANALYSIS
+        if combined:
+            for stage in ('summary', 'mindmap', 'novelty'):
+                if report_stage:
+                    report_stage(stage, RUNNING)
+            try:
+                with timed('combined'):
+                    analysis = self.generate_combined_analysis(text)
+            except Exception as e:
+                # Malformed or incomplete JSON: fall back to the separate calls below
+                FALLBACKS.inc(kind='combined_to_separate')
+                log_event('fallback', kind='combined_to_separate', error=str(e))
             else:
-                raise Exception(f"Processing engine error: {response.status_code} - {response.text}")
-                
+                for stage in ('summary', 'mindmap', 'novelty'):
+                    if report_stage:
+                        report_stage(stage, COMPLETED)
+                articles = run_stage('articles', self.find_related_articles, analysis['summary'])
+                # Corpus-relative scores replace the model's estimate whenever they are available
+                novelty = self.local_novelty_score(text, analysis['summary']) or analysis['novelty']
+                self.index_paper(text, analysis['summary'])
+                return {
+                    'summary': analysis['summary'],
+                    'mindmap': analysis['mindmap'],
+                    'articles': articles,
+                    'novelty': novelty
+                }
+        
+        summarize = lambda: self._summary_or_local(text, lambda: self.generate_summary_with_algorithm(text))
+        mindmap_source = text
+        if self._use_local_summary(mode):
+            summarize = lambda: self.generate_local_summary(text)
+        elif self._use_map_reduce(text, mode):
+            # Map step first: the reduced summary and the mind map are both built from the chunk summaries
+            if report_stage:
+                report_stage('summary', RUNNING)
+            try:
+                with timed('summary_map'):
+                    condensed = self._join_chunk_summaries(self.summarize_chunks(text))
+            except Exception as e:
+                if not LOCAL_SUMMARY_FALLBACK:
+                    raise
+                FALLBACKS.inc(kind='summary_local')
+                log_event('fallback', kind='summary_local', stage='summary_map', error=str(e))
+                summarize = lambda: self.generate_local_summary(text)
+            else:
+                # Reduce the chunk summaries already in hand rather than running the map step again
+                summarize = lambda: self._summary_or_local(text, lambda: self._reduce_chunk_summaries(condensed))
+                mindmap_source = condensed
+        
+        # The mind map only needs the text, so it runs alongside the summary.
+        # Related articles and novelty both depend on the summary and fan out once it exists.
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            # bind() carries the request ID into the worker threads' logs
+            mindmap_future = executor.submit(bind(run_stage), 'mindmap', self.generate_mermaid_mindmap, mindmap_source)
+            summary = run_stage('summary', summarize)
+            articles_future = executor.submit(bind(run_stage), 'articles', self.find_related_articles, summary)
+            novelty_future = executor.submit(bind(run_stage), 'novelty', self.calculate_novelty_score, text, summary)
+            
+            results = {
+                'summary': summary,
+                'mindmap': mindmap_future.result(),
+                'articles': articles_future.result(),
+                'novelty': novelty_future.result()
+            }
+        
+        revision = self.revision_report(text) if self.revisions is not None else None
+        if revision:
+            results['revision'] = revision
+        
+        # Indexed after the lookup so a paper is never reported as related to itself
+        self.index_paper(text, summary)
+        return results
+    
+    # asyncio serving mode (asgi.py): the same stages, prompts and cache entries, with Gemini
+    # awaited instead of holding a thread, and PDF decoding, prompt excerpt ranking, index
+    # lookups and other local CPU/SQLite work handed to the default executor
+    
+    async def extract_pdf_text_async(self, pdf_file) -> str:
+        """Extract text on the executor so PDF decoding never blocks the event loop"""
+        return await asyncio.to_thread(self.extract_pdf_text, pdf_file)
+    
+    async def index_paper_async(self, text: str, summary: str):
+        await asyncio.to_thread(self.index_paper, text, summary)
+    
+    @cached_stage('summary', PROMPT_VERSIONS['summary'])
+    async def generate_summary_async(self, text: str) -> str:
+        """Single-call summary of the paper's excerpt within the summary token budget"""
+        try:
+            prompt, stage = await asyncio.to_thread(self._summary_prompt, text)
+            return await self.gemini.agenerate(prompt, timeout=GEMINI_TIMEOUTS['summary'], stage=stage)
+        except Exception as e:
+            raise Exception(f"Error generating summary: {str(e)}")
+    
+    async def stream_summary_async(self, text: str) -> AsyncIterator[str]:
+        """Yield summary text fragments as they are generated, caching the complete summary"""
+        digest = content_hash(text)
+        if self.cache is not None:
+            # Same as cached_stage: SQLite calls stay off the event loop
+            cached_summary = await asyncio.to_thread(self.cache.get, 'summary', PROMPT_VERSIONS['summary'], digest)
+            if cached_summary is not None:
+                yield cached_summary
+                return
+        
+        fragments = []
+        try:
+            prompt, stage = await asyncio.to_thread(self._summary_prompt, text)
+            stream = self.gemini.astream_generate(prompt, timeout=GEMINI_TIMEOUTS['summary'], stage=stage)
+            async for fragment in stream:
+                fragments.append(fragment)
+                yield fragment
+        except Exception as e:
+            if fragments or not LOCAL_SUMMARY_FALLBACK:
+                raise Exception(f"Error generating summary: {str(e)}")
+            FALLBACKS.inc(kind='summary_local')
+            log_event('fallback', kind='summary_local', error=str(e))
+            yield await asyncio.to_thread(self.generate_local_summary, text)
+            return
+        
+        if self.cache is not None and fragments:
+            await asyncio.to_thread(self.cache.set, 'summary', PROMPT_VERSIONS['summary'], digest, "".join(fragments))
+    
+    @cached_stage('mindmap', PROMPT_VERSIONS['mindmap'])
+    async def generate_mermaid_mindmap_async(self, text: str) -> str:
+        """Mermaid mind map code for the paper"""
+        try:
+            prompt = await asyncio.to_thread(self._build_mindmap_prompt, text)
+            mermaid_code = await self.gemini.agenerate(prompt, timeout=GEMINI_TIMEOUTS['mindmap'], stage='mindmap')
+            return self._clean_mermaid_code(mermaid_code)
+        except Exception as e:
+            raise Exception(f"Error generating mind map: {str(e)}")
+    
+    async def find_related_articles_async(self, summary: str) -> list:
+        """Related papers from the local index, topped up with Gemini suggestions when enabled"""
+        articles = []
+        try:
+            articles = await asyncio.to_thread(self.find_local_related_articles, summary)
+        except Exception as e:
+            log_event('related_index_search_failed', error=str(e))
+        
+        if len(articles) >= RELATED_ARTICLES_LIMIT or not RELATED_ARTICLES_USE_GEMINI:
+            return articles
+        
+        suggestions = await self._find_related_articles_gemini_async(summary)
+        return articles + suggestions[:RELATED_ARTICLES_LIMIT - len(articles)]
+    
+    @cached_stage('related_articles', PROMPT_VERSIONS['related_articles'])
+    async def _find_related_articles_gemini_async(self, summary: str) -> list:
+        try:
+            articles_text = await self.gemini.agenerate(
+                self._build_related_articles_prompt(summary),
+                generation_config=RELATED_ARTICLES_GENERATION_CONFIG,
+                timeout=GEMINI_TIMEOUTS['related_articles'],
+                stage='related_articles'
+            )
+            return self._parse_related_articles(articles_text, summary, 'related_articles')
+        except Exception as e:
+            FALLBACKS.inc(kind='related_articles_retry')
+            log_event('fallback', kind='related_articles_retry', error=str(e))
+            return await self._retry_gemini_articles_async(summary)
+    
+    async def _retry_gemini_articles_async(self, summary: str) -> list:
+        try:
+            articles_text = await self.gemini.agenerate(
+                self._build_related_articles_retry_prompt(summary),
+                generation_config=RELATED_ARTICLES_RETRY_GENERATION_CONFIG,
+                timeout=GEMINI_TIMEOUTS['related_articles_retry'],
+                stage='related_articles_retry'
+            )
+            return self._parse_related_articles(articles_text, summary, 'related_articles_retry')
+        except Exception as e:
+            return self._related_articles_fallback(summary, e)
+    
+    async def local_novelty_score_async(self, text: str, summary: str, explain: Optional[bool] = None) -> Optional[dict]:
+        """Corpus-relative novelty scores, or None when local scoring is off or the corpus is too small"""
+        if NOVELTY_MODE != 'local' or self.novelty_engine is None:
+            return None
+        scores = await asyncio.to_thread(self.novelty_engine.score, summary, exclude_doc_id=content_hash(text))
+        if scores is None:
+            return None
+        
+        if explain is None:
+            explain = NOVELTY_EXPLAIN
+        if explain:
+            try:
+                scores.update(await self._explain_novelty_scores_async(summary, json.dumps(scores)))
+            except Exception as e:
+                log_event('novelty_explanation_failed', error=str(e))
+        return scores
+    
+    async def calculate_novelty_score_async(self, text: str, summary: str, explain: Optional[bool] = None) -> dict:
+        """Score novelty against the analyzed corpus, falling back to Gemini while the corpus is small"""
+        scores = await self.local_novelty_score_async(text, summary, explain)
+        if scores is not None:
+            return scores
+        return await self._calculate_novelty_score_gemini_async(text, summary)
+    
+    @cached_stage('novelty_explanation', PROMPT_VERSIONS['novelty_explanation'])
+    async def _explain_novelty_scores_async(self, summary: str, scores_json: str) -> dict:
+        explanation_text = await self.gemini.agenerate(self._build_novelty_explanation_prompt(summary, scores_json),
+                                                        timeout=GEMINI_TIMEOUTS['novelty'], stage='novelty_explanation')
+        return parse_json_response(explanation_text, 'novelty_explanation', validate=validate_novelty_reasons).value
+    
+    @cached_stage('novelty', PROMPT_VERSIONS['novelty'])
+    async def _calculate_novelty_score_gemini_async(self, text: str, summary: str) -> dict:
+        try:
+            prompt = await asyncio.to_thread(self._build_novelty_prompt, text, summary)
+            score_text = await self.gemini.agenerate(prompt, timeout=GEMINI_TIMEOUTS['novelty'], stage='novelty')
+            return self._novelty_or_default(self._parse_novelty_response(score_text))
         except Exception as e:
             raise Exception(f"Error calculating novelty score: {str(e)}")
     
+    @cached_stage('combined', PROMPT_VERSIONS['combined'])
+    async def generate_combined_analysis_async(self, text: str) -> dict:
+        response_text = await self.gemini.agenerate(
+            await asyncio.to_thread(self._build_combined_prompt, text),
+            generation_config=COMBINED_GENERATION_CONFIG,
+            timeout=GEMINI_TIMEOUTS['combined'],
+            stage='combined'
+        )
+        return self._parse_combined_analysis(response_text)
+    
+    @cached_stage('summary_chunk', PROMPT_VERSIONS['summary_chunk'])
+    async def _summarize_chunk_async(self, chunk: str) -> str:
+        return await self.gemini.agenerate(self._build_chunk_prompt(chunk), timeout=GEMINI_TIMEOUTS['summary_chunk'],
+                                           stage='summary_chunk')
+    
+    async def summarize_chunks_async(self, text: str) -> list:
+        """Summarize every chunk concurrently; the Gemini client's limit bounds how many are in flight"""
+        plan = await asyncio.to_thread(self._plan_chunks, text)
+        chunks = plan['chunks'] if plan else split_into_chunks(text, MAP_REDUCE_CHUNK_CHARS)
+        chunk_summaries = await asyncio.gather(*(self._summarize_chunk_async(chunk) for chunk in chunks))
+        if plan:
+            await asyncio.to_thread(self.revisions.save_layout, plan['doc_id'], plan['layout'])
+        return list(chunk_summaries)
+    
+    @cached_stage('summary_reduce', PROMPT_VERSIONS['summary_reduce'])
+    async def _reduce_chunk_summaries_async(self, condensed: str) -> str:
+        return await self.gemini.agenerate(self._build_reduce_prompt(condensed), timeout=GEMINI_TIMEOUTS['summary'],
+                                           stage='summary_reduce')
+    
+    async def generate_summary_map_reduce_async(self, text: str) -> str:
+        try:
+            return await self._reduce_chunk_summaries_async(
+                self._join_chunk_summaries(await self.summarize_chunks_async(text)))
+        except Exception as e:
+            raise Exception(f"Error generating summary: {str(e)}")
+    
+    async def _summary_or_local_async(self, text: str, coroutine) -> str:
+        if not LOCAL_SUMMARY_FALLBACK:
+            return await coroutine
+        task = asyncio.ensure_future(coroutine)
+        try:
+            if LOCAL_SUMMARY_DEADLINE_SECONDS > 0:
+                # Shielded: a call that misses the deadline keeps running and caches its summary
+                return await asyncio.wait_for(asyncio.shield(task), LOCAL_SUMMARY_DEADLINE_SECONDS)
+            return await task
+        except asyncio.TimeoutError:
+            self._background_tasks.add(task)
+            task.add_done_callback(self._finish_background_task)
+            FALLBACKS.inc(kind='summary_local_slow')
+            log_event('fallback', kind='summary_local_slow', deadline_seconds=LOCAL_SUMMARY_DEADLINE_SECONDS)
+        except Exception as e:
+            FALLBACKS.inc(kind='summary_local')
+            log_event('fallback', kind='summary_local', error=str(e))
+        return await asyncio.to_thread(self.generate_local_summary, text)
+    
+    def _finish_background_task(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log_event('background_summary_failed', error=str(task.exception()))
+    
+    async def summarize_async(self, text: str, mode: Optional[str] = None) -> str:
+        if self._use_local_summary(mode):
+            return await asyncio.to_thread(self.generate_local_summary, text)
+        if await asyncio.to_thread(self._use_map_reduce, text, mode):
+            return await self._summary_or_local_async(text, self.generate_summary_map_reduce_async(text))
+        return await self._summary_or_local_async(text, self.generate_summary_async(text))
+    
+    async def generate_mindmap_async(self, text: str, mode: Optional[str] = None) -> str:
+        if await asyncio.to_thread(self._use_map_reduce, text, mode):
+            chunk_summaries = await self.summarize_chunks_async(text)
+            return await self.generate_mermaid_mindmap_async(self._join_chunk_summaries(chunk_summaries))
+        return await self.generate_mermaid_mindmap_async(text)
+    
+    async def analyze_paper_async(self, text: str, mode: Optional[str] = None,
+                                  combined: Optional[bool] = None) -> dict:
+        """analyze_paper() as coroutines, so one process keeps many analyses in flight without a thread each"""
+        async def run_stage(stage: str, coroutine):
+            with timed(stage):
+                return await coroutine
+        
+        if combined is None:
+            combined = COMBINED_ANALYSIS
+        if combined:
+            try:
+                with timed('combined'):
+                    analysis = await self.generate_combined_analysis_async(text)
+            except Exception as e:
+                FALLBACKS.inc(kind='combined_to_separate')
+                log_event('fallback', kind='combined_to_separate', error=str(e))
+            else:
+                articles = await run_stage('articles', self.find_related_articles_async(analysis['summary']))
+                novelty = await self.local_novelty_score_async(text, analysis['summary']) or analysis['novelty']
+                await self.index_paper_async(text, analysis['summary'])
+                return {
+                    'summary': analysis['summary'],
+                    'mindmap': analysis['mindmap'],
+                    'articles': articles,
+                    'novelty': novelty
+                }
+        
+        mindmap_source = text
+        if self._use_local_summary(mode):
+            summarize = asyncio.to_thread(self.generate_local_summary, text)
+        elif await asyncio.to_thread(self._use_map_reduce, text, mode):
+            try:
+                with timed('summary_map'):
+                    condensed = self._join_chunk_summaries(await self.summarize_chunks_async(text))
+            except Exception as e:
+                if not LOCAL_SUMMARY_FALLBACK:
+                    raise
+                FALLBACKS.inc(kind='summary_local')
+                log_event('fallback', kind='summary_local', stage='summary_map', error=str(e))
+                summarize = asyncio.to_thread(self.generate_local_summary, text)
+            else:
+                summarize = self._summary_or_local_async(text, self._reduce_chunk_summaries_async(condensed))
+                mindmap_source = condensed
+        else:
+            summarize = self._summary_or_local_async(text, self.generate_summary_async(text))
+        
+        # Same dependency graph as analyze_paper: the mind map overlaps the summary,
+        # related articles and novelty fan out once the summary exists
+        mindmap_task = asyncio.create_task(run_stage('mindmap', self.generate_mermaid_mindmap_async(mindmap_source)))
+        try:
+            summary = await run_stage('summary', summarize)
+            articles, novelty, mindmap = await asyncio.gather(
+                run_stage('articles', self.find_related_articles_async(summary)),
+                run_stage('novelty', self.calculate_novelty_score_async(text, summary)),
+                mindmap_task
+            )
+        except Exception:
+            mindmap_task.cancel()
+            raise
+        
+        results = {'summary': summary, 'mindmap': mindmap, 'articles': articles, 'novelty': novelty}
+        revision = await asyncio.to_thread(self.revision_report, text) if self.revisions is not None else None
+        if revision:
+            results['revision'] = revision
+        
+        await self.index_paper_async(text, summary)
+        return results
+    
     def _generate_realistic_url(self, title: str, authors: list, year: str, key_terms: list) -> str:
         """Generate realistic academic paper URLs based on paper details"""
         # Create a deterministic hash from title for consistent URLs
@@ -803,15 +1565,73 @@ class PDFAnalyzer:
         import urllib.parse
         return urllib.parse.quote(title[:100])
 
-# Initialize Flask app
-app = Flask(__name__)
-# Enable CORS for all routes to allow requests from React frontend
-CORS(app)
+# All /api routes live on this blueprint; create_app registers it and
+# initializes the services the routes use
+api = Blueprint('api', __name__)
+
+result_cache: Optional[ResultCache] = None
+analyzer: Optional[PDFAnalyzer] = None
+document_store: Optional[DocumentStore] = None
+# Batches still running, whose uploads and results must survive expiry
+active_batches = set()
+job_queue: Optional[JobQueue] = None
+
+@api.before_app_request
+def start_request():
+    g.request_started = time.perf_counter()
+    g.request_id = metrics.new_request_id(request.headers.get('X-Request-ID'))
+
+@api.after_app_request
+def finish_request(response):
+    seconds = time.perf_counter() - g.get('request_started', time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_SECONDS.observe(seconds, endpoint=endpoint, method=request.method, status=response.status_code)
+    log_event('http_request', method=request.method, endpoint=endpoint, status=response.status_code,
+              seconds=round(seconds, 4))
+    response.headers['X-Request-ID'] = g.get('request_id', '')
+    return response
+
+@api.app_errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    UPLOAD_REJECTED.inc()
+    return jsonify({'error': f'Upload exceeds the {MAX_UPLOAD_BYTES} byte limit'}), 413
+
+@api.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def parse_flag(value) -> Optional[bool]:
+    """Read an optional boolean request option, None when it was not given"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('true', '1', 'yes')
+
+def lookup_document(store, data, field: str = 'text'):
+    """Resolve a request field inline or from the stored document, returning (value, (error_body, status))"""
+    if data and data.get('document_id'):
+        document = store.get(data['document_id'])
+        if document is None:
+            return None, ({'error': 'Unknown or expired document_id'}, 404)
+        if data.get(field):
+            return data[field], None
+        if document.get(field):
+            return document[field], None
+        return None, ({'error': f'No {field} available for this document'}, 400)
+    
+    if data and field in data:
+        return data[field], None
+    return None, ({'error': f'No {field} provided'}, 400)
 
-# Initialize PDF analyzer
-analyzer = PDFAnalyzer()
+def resolve_document(data, field: str = 'text'):
+    """Resolve a request field inline or from the stored document, returning (value, error_response)"""
+    value, error = lookup_document(document_store, data, field)
+    if error:
+        return None, (jsonify(error[0]), error[1])
+    return value, None
 
-@app.route('/api/extract-text', methods=['POST'])
+@api.route('/api/extract-text', methods=['POST'])
 def extract_text():
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
@@ -821,27 +1641,34 @@ def extract_text():
         return jsonify({'error': 'No file selected'}), 400
         
     try:
-        # Save uploaded file to temp file
-        with tempfile.NamedTemporaryFile(delete=False) as temp:
-            file.save(temp.name)
-            text = analyzer.extract_pdf_text(temp.name)
+        with open_upload(file) as pdf_stream:
+            text = analyzer.extract_pdf_text(pdf_stream)
         
-        return jsonify({
+        document_id = document_store.add(text)
+        response = {
             'success': True,
-            'text': text,
+            'document_id': document_id,
             'character_count': len(text)
-        })
+        }
+        # Clients that only need the ID can skip downloading the full text
+        if request.args.get('include_text', 'true').lower() != 'false':
+            response['text'] = text
+        return jsonify(response)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/generate-summary', methods=['POST'])
+@api.route('/api/generate-summary', methods=['POST'])
 def generate_summary():
     data = request.json
-    if not data or 'text' not in data:
-        return jsonify({'error': 'No text provided'}), 400
+    text, error = resolve_document(data)
+    if error:
+        return error
     
     try:
-        summary = analyzer.generate_summary_with_algorithm(data['text'])
+        summary = analyzer.summarize(text, data.get('mode'))
+        if data.get('document_id'):
+            document_store.update(data['document_id'], summary=summary)
+        analyzer.index_paper(text, summary)
         return jsonify({
             'success': True,
             'summary': summary
@@ -849,14 +1676,15 @@ def generate_summary():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/generate-mindmap', methods=['POST'])
+@api.route('/api/generate-mindmap', methods=['POST'])
 def generate_mindmap():
     data = request.json
-    if not data or 'text' not in data:
-        return jsonify({'error': 'No text provided'}), 400
+    text, error = resolve_document(data)
+    if error:
+        return error
     
     try:
-        mindmap = analyzer.generate_mermaid_mindmap(data['text'])
+        mindmap = analyzer.generate_mindmap(text, data.get('mode'))
         return jsonify({
             'success': True,
             'mindmap': mindmap
@@ -864,20 +1692,20 @@ def generate_mindmap():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/find-related-articles', methods=['POST'])
+@api.route('/api/find-related-articles', methods=['POST'])
 def find_related_articles():
     data = request.json
-    if not data or 'summary' not in data:
-        return jsonify({'error': 'No summary provided'}), 400
+    summary, error = resolve_document(data, 'summary')
+    if error:
+        return error
     
     try:
-        articles = analyzer.find_related_articles(data['summary'])
+        articles = analyzer.find_related_articles(summary)
         
-        # Debug: Log the articles to console
-        print(f"Returning {len(articles)} articles:")
-        for i, article in enumerate(articles):
-            print(f"  Article {i+1}: {article.get('title', 'No title')[:50]}...")
-            print(f"    URL: {article.get('url', 'No URL')}")
+        log_event('related_articles', count=len(articles), articles=[
+            {'title': article.get('title', '')[:80], 'url': article.get('url'), 'source': article.get('source', 'gemini')}
+            for article in articles
+        ])
         
         return jsonify({
             'success': True,
@@ -886,14 +1714,46 @@ def find_related_articles():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/calculate-novelty', methods=['POST'])
+@api.route('/api/find-similar-papers', methods=['POST'])
+def find_similar_papers():
+    data = request.json
+    if analyzer.embeddings is None:
+        return jsonify({'error': 'Embedding store is disabled'}), 400
+    summary, error = resolve_document(data, 'summary')
+    if error:
+        return error
+    
+    try:
+        limit = int(data.get('limit', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if not 1 <= limit <= 100:
+        return jsonify({'error': 'limit must be between 1 and 100'}), 400
+    
+    try:
+        text = None
+        if data.get('document_id'):
+            text = (document_store.get(data['document_id']) or {}).get('text')
+        papers = analyzer.find_similar_papers(summary, limit=limit, text=text)
+        return jsonify({
+            'success': True,
+            'papers': papers
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/calculate-novelty', methods=['POST'])
 def calculate_novelty():
     data = request.json
-    if not data or 'text' not in data or 'summary' not in data:
-        return jsonify({'error': 'No text or summary provided'}), 400
+    text, error = resolve_document(data)
+    if error:
+        return error
+    summary, error = resolve_document(data, 'summary')
+    if error:
+        return error
     
     try:
-        novelty_data = analyzer.calculate_novelty_score(data['text'], data['summary'])
+        novelty_data = analyzer.calculate_novelty_score(text, summary, parse_flag(data.get('explain')))
         return jsonify({
             'success': True,
             'novelty': novelty_data
@@ -901,5 +1761,373 @@ def calculate_novelty():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/analyze', methods=['POST'])
+def analyze():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    try:
+        with open_upload(file) as pdf_stream:
+            text = analyzer.extract_pdf_text(pdf_stream)
+        
+        results = analyzer.analyze_paper(text, mode=request.form.get('mode'), combined=parse_flag(request.form.get('combined')))
+        document_id = document_store.add(text, summary=results['summary'])
+        return jsonify({
+            'success': True,
+            'document_id': document_id,
+            'text': text,
+            'character_count': len(text),
+            **results
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/jobs', methods=['POST'])
+def submit_job():
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'error': 'No file selected'}), 400
+        # The upload closes with the request, so hand its buffer to the worker
+        pdf_stream = detach_upload(file)
+        document_id = None
+        mode = request.form.get('mode')
+        combined = parse_flag(request.form.get('combined'))
+    else:
+        data = request.get_json(silent=True)
+        if not data or not data.get('document_id'):
+            return jsonify({'error': 'No file or document_id provided'}), 400
+        if document_store.get(data['document_id']) is None:
+            return jsonify({'error': 'Unknown or expired document_id'}), 404
+        pdf_stream = None
+        document_id = data['document_id']
+        mode = data.get('mode')
+        combined = parse_flag(data.get('combined'))
+    
+    def work(report_stage):
+        report_stage('extract', RUNNING)
+        if pdf_stream is not None:
+            with open_stream(pdf_stream) as reader:
+                text = analyzer.extract_pdf_text(reader)
+            job_document_id = document_store.add(text)
+        else:
+            document = document_store.get(document_id)
+            if document is None:
+                raise Exception("Document expired before the job started")
+            text = document['text']
+            job_document_id = document_id
+        report_stage('extract', COMPLETED)
+        
+        results = analyzer.analyze_paper(text, report_stage, mode, combined)
+        document_store.update(job_document_id, summary=results['summary'])
+        return {
+            'document_id': job_document_id,
+            'character_count': len(text),
+            **results
+        }
+    
+    job = job_queue.submit(bind(work), ANALYSIS_STAGES)
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status_url': f'/api/jobs/{job.id}'
+    }), 202
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job_id'}), 404
+    
+    return jsonify({
+        'success': True,
+        **job.to_dict()
+    })
+
+@api.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job_id'}), 404
+    if job.status == FAILED:
+        return jsonify({'error': job.error}), 500
+    if job.status != COMPLETED:
+        return jsonify({'error': 'Job has not finished', 'status': job.status}), 409
+    
+    return jsonify({
+        'success': True,
+        **job.result
+    })
+
+@api.route('/api/batch', methods=['POST'])
+def submit_batch():
+    files = [file for file in request.files.getlist('files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    expire_batch_outputs(BATCH_OUTPUT_DIR, BATCH_RESULTS_TTL_SECONDS, active_batches)
+    
+    # Uploads are written to disk so extraction worker processes can open them by path
+    batch_id = uuid.uuid4().hex
+    active_batches.add(batch_id)
+    upload_dir = os.path.join(BATCH_OUTPUT_DIR, batch_id)
+    os.makedirs(upload_dir, exist_ok=True)
+    pdf_paths = []
+    for index, file in enumerate(files):
+        path = os.path.join(upload_dir, f"{index:05d}_{secure_filename(file.filename) or 'upload.pdf'}")
+        file.save(path)
+        pdf_paths.append(path)
+    
+    runner = BatchRunner(
+        analyzer,
+        os.path.join(BATCH_OUTPUT_DIR, f"{batch_id}.jsonl"),
+        workers=BATCH_WORKERS,
+        extract_workers=BATCH_EXTRACT_WORKERS,
+        mode=request.form.get('mode')
+    )
+    
+    def work(report_stage):
+        report_stage('analyze', RUNNING)
+        try:
+            summary = runner.run(pdf_paths)
+        finally:
+            # The results file keeps everything the batch produced; the uploads are not needed again
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            active_batches.discard(batch_id)
+        report_stage('analyze', COMPLETED)
+        summary['output'] = f'/api/batch/{batch_id}/results'
+        return summary
+    
+    job = job_queue.submit(bind(work), ['analyze'])
+    return jsonify({
+        'success': True,
+        'job_id': job.id,
+        'batch_id': batch_id,
+        'file_count': len(pdf_paths),
+        'status_url': f'/api/jobs/{job.id}',
+        'results_url': f'/api/batch/{batch_id}/results'
+    }), 202
+
+@api.route('/api/batch/<batch_id>/results', methods=['GET'])
+def batch_results(batch_id):
+    expire_batch_outputs(BATCH_OUTPUT_DIR, BATCH_RESULTS_TTL_SECONDS, active_batches)
+    
+    # Results are read incrementally, so this also works while the batch is still running
+    path = os.path.join(BATCH_OUTPUT_DIR, f"{batch_id}.jsonl")
+    if not re.fullmatch(r'[0-9a-f]{32}', batch_id) or not os.path.exists(path):
+        return jsonify({'error': 'Unknown batch_id'}), 404
+    
+    return send_file(path, mimetype='application/x-ndjson')
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events) -> Response:
+    return Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Stop reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+@api.route('/api/generate-summary/stream', methods=['POST'])
+def stream_summary():
+    data = request.json
+    text, error = resolve_document(data)
+    if error:
+        return error
+    document_id = data.get('document_id')
+    
+    def events():
+        try:
+            fragments = []
+            for fragment in analyzer.stream_summary(text):
+                fragments.append(fragment)
+                yield sse_event('summary_delta', {'text': fragment})
+            
+            summary = "".join(fragments)
+            if document_id:
+                document_store.update(document_id, summary=summary)
+            analyzer.index_paper(text, summary)
+            yield sse_event('stage_complete', {'stage': 'summary', 'summary': summary})
+            yield sse_event('done', {'success': True})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+    
+    return sse_response(events())
+
+@api.route('/api/analyze/stream', methods=['POST'])
+def stream_analysis():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    # The generator runs after the request handler returns, so keep the upload's buffer
+    pdf_stream = detach_upload(file)
+    
+    def events():
+        try:
+            with open_stream(pdf_stream) as reader:
+                text = analyzer.extract_pdf_text(reader)
+            document_id = document_store.add(text)
+            yield sse_event('stage_complete', {
+                'stage': 'extract',
+                'document_id': document_id,
+                'character_count': len(text)
+            })
+            
+            with ThreadPoolExecutor(max_workers=3) as executor:
+                # Same dependency graph as analyze_paper, but summary text is forwarded as it arrives
+                futures = {executor.submit(bind(analyzer.generate_mermaid_mindmap), text): 'mindmap'}
+                
+                fragments = []
+                for fragment in analyzer.stream_summary(text):
+                    fragments.append(fragment)
+                    yield sse_event('summary_delta', {'text': fragment})
+                summary = "".join(fragments)
+                document_store.update(document_id, summary=summary)
+                yield sse_event('stage_complete', {'stage': 'summary', 'summary': summary})
+                
+                futures[executor.submit(bind(analyzer.find_related_articles), summary)] = 'articles'
+                futures[executor.submit(bind(analyzer.calculate_novelty_score), text, summary)] = 'novelty'
+                
+                for future in as_completed(futures):
+                    stage = futures[future]
+                    yield sse_event('stage_complete', {'stage': stage, stage: future.result()})
+            
+            analyzer.index_paper(text, summary)
+            yield sse_event('done', {'success': True, 'document_id': document_id})
+        except Exception as e:
+            yield sse_event('error', {'error': str(e)})
+    
+    return sse_response(events())
+
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    if result_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': result_cache.stats()
+    })
+
+@api.route('/api/gemini/stats', methods=['GET'])
+def gemini_stats():
+    return jsonify({
+        'success': True,
+        'stats': analyzer.gemini.stats()
+    })
+
+@api.route('/api/parser/stats', methods=['GET'])
+def parser_stats():
+    return jsonify({
+        'success': True,
+        'strategies': strategy_stats()
+    })
+
+@api.route('/api/related-index/stats', methods=['GET'])
+def related_index_stats():
+    if analyzer.related_index is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': analyzer.related_index.stats()
+    })
+
+@api.route('/api/embeddings/stats', methods=['GET'])
+def embedding_stats():
+    if analyzer.embeddings is None:
+        return jsonify({'success': True, 'enabled': False})
+    
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': analyzer.embeddings.stats()
+    })
+
+def create_analyzer() -> PDFAnalyzer:
+    """Validate configuration and build the analyzer with its persistent result cache"""
+    global GEMINI_API_KEY
+    
+    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+    if not GEMINI_API_KEY:
+        raise ValueError("GEMINI_API_KEY not found in environment variables. Please check your .env file.")
+    
+    cache = None
+    if RESULT_CACHE_ENABLED:
+        cache = ResultCache(
+            RESULT_CACHE_PATH,
+            max_entries=RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=RESULT_CACHE_TTL_SECONDS
+        )
+    related_index = BM25Index(RELATED_INDEX_PATH) if RELATED_INDEX_ENABLED else None
+    
+    embeddings = None
+    novelty_engine = None
+    if EMBEDDING_STORE_ENABLED:
+        # NumPy is only imported once the store is actually wanted
+        from embedding_store import EmbeddingStore, load_embedder
+        embeddings = EmbeddingStore(
+            EMBEDDING_STORE_DIR,
+            load_embedder(EMBEDDING_MODEL, EMBEDDING_DIM),
+            quantize=EMBEDDING_QUANTIZE,
+            block_rows=EMBEDDING_SEARCH_BLOCK_ROWS,
+            min_score=EMBEDDING_MIN_SCORE
+        )
+        if related_index is not None:
+            from novelty import NoveltyEngine
+            novelty_engine = NoveltyEngine(
+                related_index,
+                embeddings,
+                neighbours=NOVELTY_NEIGHBOURS,
+                min_corpus=NOVELTY_MIN_CORPUS
+            )
+    revisions = RevisionTracker(REVISION_TRACKER_PATH) if REVISION_TRACKING_ENABLED else None
+    return PDFAnalyzer(cache=cache, related_index=related_index, embeddings=embeddings,
+                       novelty_engine=novelty_engine, revisions=revisions)
+
+def create_app() -> Flask:
+    """Validate configuration, initialize services and build the Flask app"""
+    global result_cache, analyzer, document_store, job_queue
+    
+    analyzer = create_analyzer()
+    result_cache = analyzer.cache
+    metrics.json_logs_enabled = JSON_LOGS
+    
+    # Only needed once a server is actually being built
+    from flask_cors import CORS
+    
+    app = Flask(__name__)
+    app.request_class = SpooledUploadRequest
+    SpooledUploadRequest.spool_threshold = UPLOAD_SPOOL_BYTES
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES or None
+    # Enable CORS for all routes to allow requests from React frontend
+    CORS(app)
+    
+    # Extracted texts stay server-side; clients refer to them by document_id
+    document_store = DocumentStore(
+        max_documents=DOCUMENT_STORE_MAX_DOCUMENTS,
+        ttl_seconds=DOCUMENT_STORE_TTL_SECONDS
+    )
+    
+    job_queue = JobQueue(
+        backend=ThreadPoolJobBackend(max_workers=JOB_WORKERS),
+        ttl_seconds=JOB_TTL_SECONDS
+    )
+    
+    app.register_blueprint(api)
+    return app
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    app = create_app()
+    app.run(debug=True, port=5000)
@@ -0,0 +1,459 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+import app as service
+import metrics
+from metrics import HTTP_SECONDS, UPLOAD_REJECTED, log_event
+from uploads import UploadBuffer, open_upload
+
+# How much of a non-native request body the WSGI bridge keeps in memory before spilling to disk
+BRIDGE_SPOOL_BYTES = 1024 * 1024
+
+
+class HTTPError(Exception):
+    """A request the routes refuse before running, answered as {'error': message}"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ClientDisconnected(Exception):
+    """The client went away before sending the whole request body"""
+
+
+class UploadedFile:
+    """A multipart file part: the name the client gave it and the buffer holding its bytes"""
+
+    def __init__(self, filename: str, stream: UploadBuffer):
+        self.filename = filename
+        self.stream = stream
+
+    def close(self):
+        self.stream.close()
+
+
+class EventStream:
+    """Route result sent as server-sent events, one chunk per event as it is produced"""
+
+    def __init__(self, events: AsyncIterator[str]):
+        self.events = events
+
+
+class AsyncRequest:
+    """The parts of an ASGI HTTP request the native routes read"""
+
+    def __init__(self, scope: dict, receive: Callable[[], Awaitable[dict]], max_body: int, spool_threshold: int):
+        self.scope = scope
+        self.receive = receive
+        self.max_body = max_body
+        self.spool_threshold = spool_threshold
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)
+        self.args = {name: values[-1] for name, values in query.items()}
+        self.form: Dict[str, str] = {}
+        self.files: Dict[str, UploadedFile] = {}
+        self._received = 0
+
+    def _too_large(self) -> HTTPError:
+        return HTTPError(413, f'Upload exceeds the {self.max_body} byte limit')
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        """Body chunks as they arrive, refusing the request as soon as it passes the upload limit"""
+        declared = self.headers.get('content-length', '')
+        if self.max_body and declared.isdigit() and int(declared) > self.max_body:
+            raise self._too_large()
+
+        while True:
+            message = await self.receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            body = message.get('body', b'')
+            self._received += len(body)
+            if self.max_body and self._received > self.max_body:
+                raise self._too_large()
+            if body:
+                yield body
+            if not message.get('more_body', False):
+                return
+
+    async def json(self):
+        body = b''.join([chunk async for chunk in self.chunks()])
+        if not body:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise HTTPError(400, 'Request body is not valid JSON')
+
+    async def parse_form(self):
+        """Decode a multipart body while it streams in: file parts go straight into UploadBuffers"""
+        content_type, options = parse_options_header(self.headers.get('content-type', ''))
+        if content_type != 'multipart/form-data' or not options.get('boundary'):
+            return
+
+        decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+        part = None
+        async for chunk in self.chunks():
+            decoder.receive_data(chunk)
+            part = self._drain(decoder, part)
+        decoder.receive_data(None)
+        self._drain(decoder, part)
+
+    def _drain(self, decoder: MultipartDecoder, part):
+        # part is the open file buffer, or a (name, bytearray) pair for a form field
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, (NeedData, Epilogue)):
+                return part
+            if isinstance(event, File):
+                part = UploadBuffer(self.spool_threshold)
+                self.files[event.name] = UploadedFile(event.filename, part)
+            elif isinstance(event, Field):
+                part = (event.name, bytearray())
+            elif isinstance(event, Data) and part is not None:
+                if isinstance(part, UploadBuffer):
+                    part.write(event.data)
+                else:
+                    part[1].extend(event.data)
+                    if not event.more_data:
+                        self.form[part[0]] = part[1].decode('utf-8', 'replace')
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+
+class WSGIBridge:
+    """Serve the Flask app's remaining routes over ASGI, running each request on the executor"""
+
+    def __init__(self, wsgi_app: Callable, max_body: int):
+        self.wsgi_app = wsgi_app
+        self.max_body = max_body
+
+    def _environ(self, scope: dict, body, length: int) -> dict:
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': client[0],
+            'CONTENT_LENGTH': str(length),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = value
+            elif name != 'CONTENT_LENGTH':
+                key = f'HTTP_{name}'
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        with tempfile.SpooledTemporaryFile(max_size=BRIDGE_SPOOL_BYTES) as body:
+            length = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                length += len(message.get('body', b''))
+                more_body = message.get('more_body', False)
+                # Past the limit Flask answers 413 from the length alone; no need to read the rest
+                if self.max_body and length > self.max_body:
+                    break
+            body.seek(0)
+
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'] = int(status.split(' ', 1)[0])
+                started['headers'] = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+            chunks = await asyncio.to_thread(self.wsgi_app, self._environ(scope, body, length), start_response)
+            try:
+                iterator = iter(chunks)
+                # Streaming responses produce their chunks lazily, so each one is pulled on the executor too
+                chunk = await asyncio.to_thread(next, iterator, None)
+                await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+                while chunk is not None:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    chunk = await asyncio.to_thread(next, iterator, None)
+                await send({'type': 'http.response.body', 'body': b''})
+            finally:
+                if hasattr(chunks, 'close'):
+                    await asyncio.to_thread(chunks.close)
+
+
+class AsyncAPI:
+    """ASGI application: the analysis routes run as coroutines, everything else through the Flask app"""
+
+    def __init__(self, flask_app, analyzer, document_store, max_upload_bytes: int = service.MAX_UPLOAD_BYTES,
+                 spool_threshold: int = service.UPLOAD_SPOOL_BYTES, executor_workers: int = service.ASYNC_EXECUTOR_WORKERS):
+        self.analyzer = analyzer
+        self.document_store = document_store
+        self.max_upload_bytes = max_upload_bytes
+        self.spool_threshold = spool_threshold
+        self.executor_workers = executor_workers
+        self.bridge = WSGIBridge(flask_app.wsgi_app, max_upload_bytes)
+        self.routes: Dict[Tuple[str, str], Callable] = {
+            ('POST', '/api/extract-text'): self.extract_text,
+            ('POST', '/api/generate-summary'): self.generate_summary,
+            ('POST', '/api/generate-summary/stream'): self.stream_summary,
+            ('POST', '/api/generate-mindmap'): self.generate_mindmap,
+            ('POST', '/api/find-related-articles'): self.find_related_articles,
+            ('POST', '/api/calculate-novelty'): self.calculate_novelty,
+            ('POST', '/api/analyze'): self.analyze,
+        }
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        route = self.routes.get((scope['method'], scope['path']))
+        if route is None:
+            await self.bridge(scope, receive, send)
+            return
+        await self.serve(route, scope, receive, send)
+
+    async def lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Local stages (PDF decoding, index lookups, bridged routes) share this pool
+                asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.executor_workers))
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.analyzer.gemini.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def serve(self, route: Callable, scope: dict, receive: Callable, send: Callable):
+        started = time.perf_counter()
+        request = AsyncRequest(scope, receive, self.max_upload_bytes, self.spool_threshold)
+        request_id = metrics.new_request_id(request.headers.get('x-request-id'))
+        status = 500
+        try:
+            try:
+                result = await route(request)
+            except HTTPError as e:
+                if e.status == 413:
+                    UPLOAD_REJECTED.inc()
+                result = ({'error': e.message}, e.status)
+            except ClientDisconnected:
+                status = 499
+                return
+            except Exception as e:
+                result = ({'error': str(e)}, 500)
+
+            headers = [(b'x-request-id', request_id.encode('latin-1'))]
+            if 'origin' in request.headers:
+                headers.append((b'access-control-allow-origin', b'*'))
+
+            if isinstance(result, EventStream):
+                status = 200
+                headers += [(b'content-type', b'text/event-stream; charset=utf-8'),
+                            (b'cache-control', b'no-cache'),
+                            # Stop reverse proxies from buffering the stream
+                            (b'x-accel-buffering', b'no')]
+                await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+                async for event in result.events:
+                    await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b''})
+                return
+
+            body, status = result
+            payload = json.dumps(body).encode('utf-8')
+            headers += [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': payload})
+        finally:
+            request.close()
+            seconds = time.perf_counter() - started
+            HTTP_SECONDS.observe(seconds, endpoint=scope['path'], method=scope['method'], status=status)
+            log_event('http_request', method=scope['method'], endpoint=scope['path'], status=status,
+                      seconds=round(seconds, 4))
+
+    async def read_upload(self, request: AsyncRequest):
+        """The uploaded 'file' part, or the error result the Flask routes give when it is missing"""
+        await request.parse_form()
+        if 'file' not in request.files:
+            return None, ({'error': 'No file provided'}, 400)
+        file = request.files['file']
+        if file.filename == '':
+            return None, ({'error': 'No file selected'}, 400)
+        return file, None
+
+    async def extract_text(self, request: AsyncRequest):
+        file, error = await self.read_upload(request)
+        if error:
+            return error
+
+        try:
+            with open_upload(file) as pdf_stream:
+                text = await self.analyzer.extract_pdf_text_async(pdf_stream)
+
+            document_id = self.document_store.add(text)
+            response = {
+                'success': True,
+                'document_id': document_id,
+                'character_count': len(text)
+            }
+            if request.args.get('include_text', 'true').lower() != 'false':
+                response['text'] = text
+            return response, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    async def generate_summary(self, request: AsyncRequest):
+        data = await request.json()
+        text, error = service.lookup_document(self.document_store, data)
+        if error:
+            return error
+
+        try:
+            summary = await self.analyzer.summarize_async(text, data.get('mode'))
+            if data.get('document_id'):
+                self.document_store.update(data['document_id'], summary=summary)
+            await self.analyzer.index_paper_async(text, summary)
+            return {'success': True, 'summary': summary}, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    async def stream_summary(self, request: AsyncRequest):
+        data = await request.json()
+        text, error = service.lookup_document(self.document_store, data)
+        if error:
+            return error
+        document_id = data.get('document_id')
+
+        async def events():
+            try:
+                fragments = []
+                async for fragment in self.analyzer.stream_summary_async(text):
+                    fragments.append(fragment)
+                    yield service.sse_event('summary_delta', {'text': fragment})
+
+                summary = "".join(fragments)
+                if document_id:
+                    self.document_store.update(document_id, summary=summary)
+                await self.analyzer.index_paper_async(text, summary)
+                yield service.sse_event('stage_complete', {'stage': 'summary', 'summary': summary})
+                yield service.sse_event('done', {'success': True})
+            except Exception as e:
+                yield service.sse_event('error', {'error': str(e)})
+
+        return EventStream(events())
+
+    async def generate_mindmap(self, request: AsyncRequest):
+        data = await request.json()
+        text, error = service.lookup_document(self.document_store, data)
+        if error:
+            return error
+
+        try:
+            mindmap = await self.analyzer.generate_mindmap_async(text, data.get('mode'))
+            return {'success': True, 'mindmap': mindmap}, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    async def find_related_articles(self, request: AsyncRequest):
+        data = await request.json()
+        summary, error = service.lookup_document(self.document_store, data, 'summary')
+        if error:
+            return error
+
+        try:
+            articles = await self.analyzer.find_related_articles_async(summary)
+            log_event('related_articles', count=len(articles), articles=[
+                {'title': article.get('title', '')[:80], 'url': article.get('url'), 'source': article.get('source', 'gemini')}
+                for article in articles
+            ])
+            return {'success': True, 'articles': articles}, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    async def calculate_novelty(self, request: AsyncRequest):
+        data = await request.json()
+        text, error = service.lookup_document(self.document_store, data)
+        if error:
+            return error
+        summary, error = service.lookup_document(self.document_store, data, 'summary')
+        if error:
+            return error
+
+        try:
+            novelty_data = await self.analyzer.calculate_novelty_score_async(
+                text, summary, service.parse_flag(data.get('explain')))
+            return {'success': True, 'novelty': novelty_data}, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+    async def analyze(self, request: AsyncRequest):
+        file, error = await self.read_upload(request)
+        if error:
+            return error
+
+        try:
+            with open_upload(file) as pdf_stream:
+                text = await self.analyzer.extract_pdf_text_async(pdf_stream)
+
+            results = await self.analyzer.analyze_paper_async(
+                text, mode=request.form.get('mode'), combined=service.parse_flag(request.form.get('combined')))
+            document_id = self.document_store.add(text, summary=results['summary'])
+            return {
+                'success': True,
+                'document_id': document_id,
+                'text': text,
+                'character_count': len(text),
+                **results
+            }, 200
+        except Exception as e:
+            return {'error': str(e)}, 500
+
+
+def create_asgi_app() -> AsyncAPI:
+    """Validate configuration, initialize the same services as create_app and build the ASGI app"""
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        raise ImportError("The asyncio server needs httpx. Install it with: pip install httpx uvicorn")
+
+    flask_app = service.create_app()
+    return AsyncAPI(flask_app, service.analyzer, service.document_store)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(create_asgi_app(), host=os.getenv("HOST", "127.0.0.1"), port=int(os.getenv("PORT", "5000")))
@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Optional, List, Callable, Iterable
+
+from pdf_extraction import extract_pages
+from result_cache import stream_hash
+
+
+def _extract_file(path: str) -> List[str]:
+    """Process pool worker: extract one PDF's page texts"""
+    return extract_pages(path)
+
+
+def find_pdfs(inputs: List[str]) -> List[str]:
+    """Expand files and directories (searched recursively) into a sorted list of PDF paths"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.extend(os.path.join(root, name) for name in files if name.lower().endswith('.pdf'))
+        else:
+            paths.append(item)
+    return sorted(paths)
+
+
+def expire_batch_outputs(directory: str, ttl_seconds: float, active: Iterable[str] = ()) -> int:
+    """Delete batch result files and upload directories untouched for ttl_seconds, except active batches"""
+    if not os.path.isdir(directory):
+        return 0
+    active = set(active)
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        batch_id = name[:-len('.jsonl')] if name.endswith('.jsonl') else name
+        if batch_id in active:
+            continue
+        try:
+            if os.path.getmtime(path) >= cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            removed += 1
+        except OSError:
+            # Removed concurrently by another request or worker
+            continue
+    return removed
+
+
+class BatchRunner:
+    """Analyzes many PDFs, appending one JSON line per file and skipping files already done"""
+
+    def __init__(self, analyzer, output_path: str, workers: int = 4,
+                 extract_workers: Optional[int] = None, mode: Optional[str] = None):
+        self.analyzer = analyzer
+        self.output_path = output_path
+        self.workers = workers
+        self.extract_workers = extract_workers or os.cpu_count() or 1
+        self.mode = mode
+        self._write_lock = threading.Lock()
+
+    def completed_digests(self) -> set:
+        """Content hashes of files that already have a successful record in the output"""
+        digests = set()
+        if not os.path.exists(self.output_path):
+            return digests
+
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash mid-write leaves a truncated last line; that file is simply redone
+                    continue
+                if record.get('status') == 'ok':
+                    digests.add(record['sha256'])
+        return digests
+
+    def _write(self, out, record: dict):
+        with self._write_lock:
+            out.write(json.dumps(record) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+    def _analyze(self, out, path: str, digest: str, text: str, started: float) -> bool:
+        try:
+            results = self.analyzer.analyze_paper(text, mode=self.mode)
+            self._write(out, {
+                'file': path,
+                'sha256': digest,
+                'status': 'ok',
+                'character_count': len(text),
+                'seconds': round(time.perf_counter() - started, 3),
+                **results
+            })
+            return True
+        except Exception as e:
+            self._write(out, {'file': path, 'sha256': digest, 'status': 'error', 'error': str(e)})
+            return False
+
+    def run(self, pdf_paths: List[str], on_progress: Optional[Callable[[dict], None]] = None) -> dict:
+        """Extract in parallel, analyze under the Gemini client's limits and write results incrementally"""
+        summary = {'total': len(pdf_paths), 'succeeded': 0, 'failed': 0, 'skipped': 0, 'output': self.output_path}
+
+        done = self.completed_digests()
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.output_path, 'a', encoding='utf-8') as out, \
+                ProcessPoolExecutor(max_workers=self.extract_workers) as extract_pool, \
+                ThreadPoolExecutor(max_workers=self.workers) as analysis_pool:
+            pending = []
+            for path in pdf_paths:
+                try:
+                    with open(path, 'rb') as f:
+                        digest = stream_hash(f)
+                except OSError as e:
+                    # A missing file or broken link fails on its own; the rest of the batch goes on
+                    self._write(out, {'file': path, 'sha256': None, 'status': 'error',
+                                      'error': f"Error reading PDF: {str(e)}"})
+                    summary['failed'] += 1
+                    continue
+                if digest in done:
+                    summary['skipped'] += 1
+                else:
+                    # Also dedupes identical files within this batch
+                    done.add(digest)
+                    pending.append((path, digest))
+
+            started = time.perf_counter()
+            analysis_futures = []
+            extract_futures = {}
+            for path, digest in pending:
+                # Files extracted by an earlier run or upload go straight to analysis
+                text = self.analyzer.cached_pdf_text(digest)
+                if text is not None:
+                    analysis_futures.append(analysis_pool.submit(self._analyze, out, path, digest, text, started))
+                else:
+                    extract_futures[extract_pool.submit(_extract_file, path)] = (path, digest)
+
+            # Analysis of a file starts as soon as its own extraction finishes
+            for future in as_completed(extract_futures):
+                path, digest = extract_futures[future]
+                try:
+                    # Cached and fingerprinted here, as an uploaded PDF's text would be
+                    text = self.analyzer.remember_pdf_text(digest, future.result())
+                except Exception as e:
+                    self._write(out, {'file': path, 'sha256': digest, 'status': 'error',
+                                      'error': f"Error extracting PDF text: {str(e)}"})
+                    summary['failed'] += 1
+                    continue
+                analysis_futures.append(analysis_pool.submit(self._analyze, out, path, digest, text, started))
+
+            for future in as_completed(analysis_futures):
+                if future.result():
+                    summary['succeeded'] += 1
+                else:
+                    summary['failed'] += 1
+                if on_progress:
+                    on_progress(dict(summary))
+
+        return summary
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Analyze a batch of research papers into a JSON Lines file")
+    parser.add_argument('inputs', nargs='+', help="PDF files or directories containing PDFs")
+    parser.add_argument('-o', '--output', required=True, help="JSON Lines output; existing results are resumed")
+    parser.add_argument('--workers', type=int, default=4, help="papers analyzed concurrently")
+    parser.add_argument('--extract-workers', type=int, default=None, help="processes used for text extraction")
+    parser.add_argument('--mode', choices=['truncate', 'map_reduce', 'local'], default=None, help="summarization mode")
+    args = parser.parse_args(argv)
+
+    # Imported here so the CLI validates configuration the same way the server does
+    from app import create_analyzer
+    analyzer = create_analyzer()
+
+    pdf_paths = find_pdfs(args.inputs)
+    print(f"Found {len(pdf_paths)} PDF files")
+
+    def report(progress):
+        print(f"  {progress['succeeded']} succeeded, {progress['failed']} failed, {progress['skipped']} skipped "
+              f"of {progress['total']}")
+
+    runner = BatchRunner(analyzer, args.output, workers=args.workers,
+                         extract_workers=args.extract_workers, mode=args.mode)
+    summary = runner.run(pdf_paths, on_progress=report)
+    print(f"Done: {summary['succeeded']} succeeded, {summary['failed']} failed, "
+          f"{summary['skipped']} skipped. Results in {summary['output']}")
+    return 0 if summary['failed'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
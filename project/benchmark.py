@@ -0,0 +1,434 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any
+
+import requests
+
+from batch import find_pdfs
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(PROJECT_DIR, '.cache', 'benchmarks', 'results.jsonl')
+
+# Endpoints the harness can drive: upload endpoints take the PDF itself, the others
+# refer to a document extracted during setup
+UPLOAD_ENDPOINTS = {'extract-text': '/api/extract-text?include_text=false', 'analyze': '/api/analyze'}
+DOCUMENT_ENDPOINTS = {
+    'generate-summary': '/api/generate-summary',
+    'generate-mindmap': '/api/generate-mindmap',
+    'find-related-articles': '/api/find-related-articles',
+    'find-similar-papers': '/api/find-similar-papers',
+    'calculate-novelty': '/api/calculate-novelty',
+}
+ENDPOINTS = list(UPLOAD_ENDPOINTS) + list(DOCUMENT_ENDPOINTS)
+
+SAMPLE_WORDS = (
+    'model network training data learning graph attention transformer retrieval sparse dense kernel '
+    'protein sequence molecule climate forecast sensor robot policy reward agent language vision image '
+    'segmentation benchmark dataset evaluation baseline accuracy latency memory distributed federated '
+    'privacy causal inference bayesian optimization gradient convergence regularization embedding'
+).split()
+SECTION_HEADINGS = ['Abstract', '1 Introduction', '2 Related Work', '3 Methodology', '4 Experiments',
+                    '5 Results', '6 Discussion', '7 Conclusion']
+
+
+def make_sample_pdf(title: str, pages: List[List[str]]) -> bytes:
+    """A minimal valid PDF with one Helvetica text line per list entry, the title on page one"""
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join(f'{4 + 2 * index} 0 R' for index in range(len(pages))), len(pages))).encode(),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    ]
+    for index, lines in enumerate([[title, ''] + pages[0]] + pages[1:]):
+        objects.append((f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                        f'/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * index} 0 R >>').encode())
+        escaped = [line.replace('\\', '').replace('(', '').replace(')', '') for line in lines]
+        content = ('BT /F1 9 Tf 40 760 Td 11 TL ' + ' '.join(f'({line}) Tj T*' for line in escaped) + ' ET').encode()
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+
+    pdf = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f'{number} 0 obj\n'.encode() + body + b'\nendobj\n'
+    xref = len(pdf)
+    pdf += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    pdf += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode()
+    pdf += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    return pdf
+
+
+def generate_corpus(papers: int, pages: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic papers with distinct titles and text, so caches and indexes see a realistic mix"""
+    rng = random.Random(seed)
+    corpus = []
+    for number in range(papers):
+        topic = rng.sample(SAMPLE_WORDS, 4)
+        title = f"{topic[0].title()} {topic[1].title()} for {topic[2].title()} {topic[3].title()} Tasks"
+        page_lines = []
+        for page in range(pages):
+            lines = [SECTION_HEADINGS[page % len(SECTION_HEADINGS)]]
+            for _ in range(55):
+                words = rng.choices(topic * 3 + SAMPLE_WORDS, k=14)
+                lines.append(' '.join(words).capitalize() + '.')
+            page_lines.append(lines)
+        corpus.append({'name': f'sample-{number:03d}.pdf', 'data': make_sample_pdf(title, page_lines)})
+    return corpus
+
+
+def load_corpus(paths: List[str]) -> List[Dict[str, Any]]:
+    corpus = []
+    for path in find_pdfs(paths):
+        with open(path, 'rb') as f:
+            corpus.append({'name': os.path.basename(path), 'data': f.read()})
+    return corpus
+
+
+def percentile(sorted_values: List[float], fraction: float) -> Optional[float]:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def read_rss(pid: Optional[int] = None) -> Optional[int]:
+    """Resident set size in bytes from /proc (Linux); None where that is unavailable"""
+    try:
+        with open(f"/proc/{pid or 'self'}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler:
+    """Samples a process's RSS in the background while a run is in progress"""
+
+    def __init__(self, pid: Optional[int] = None, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        rss = read_rss(self.pid)
+        if rss is not None:
+            self.samples.append(rss)
+
+    def report(self) -> Optional[dict]:
+        if not self.samples:
+            return None
+        return {'rss_start_bytes': self.samples[0], 'rss_end_bytes': self.samples[-1],
+                'rss_peak_bytes': max(self.samples)}
+
+
+class Benchmark:
+    """Drives the API with a corpus of PDFs at a fixed concurrency and measures each request"""
+
+    def __init__(self, base_url: str, corpus: List[Dict[str, Any]], timeout: float = 300):
+        self.base_url = base_url.rstrip('/')
+        self.corpus = corpus
+        self.timeout = timeout
+        self.documents: List[Dict[str, Any]] = []
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def prepare_documents(self):
+        """Extract every paper once so document endpoints can refer to it by document_id"""
+        self.documents = []
+        for paper in self.corpus:
+            response = self._session().post(
+                self.base_url + '/api/extract-text',
+                files={'file': (paper['name'], paper['data'], 'application/pdf')},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            result = response.json()
+            # Document endpoints only need a plausible summary; the opening text stands in for one
+            self.documents.append({'document_id': result['document_id'], 'summary': result['text'][:1500]})
+
+    def _request(self, endpoint: str, index: int) -> requests.Response:
+        if endpoint in UPLOAD_ENDPOINTS:
+            paper = self.corpus[index % len(self.corpus)]
+            return self._session().post(
+                self.base_url + UPLOAD_ENDPOINTS[endpoint],
+                files={'file': (paper['name'], paper['data'], 'application/pdf')},
+                timeout=self.timeout
+            )
+        document = self.documents[index % len(self.documents)]
+        return self._session().post(self.base_url + DOCUMENT_ENDPOINTS[endpoint], json=document,
+                                    timeout=self.timeout)
+
+    def run(self, endpoint: str, concurrency: int, total_requests: int, server_pid: Optional[int] = None) -> dict:
+        """Send total_requests requests to one endpoint from `concurrency` threads"""
+        if endpoint in DOCUMENT_ENDPOINTS and not self.documents:
+            self.prepare_documents()
+
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        lock = threading.Lock()
+        counter = iter(range(total_requests))
+
+        def worker():
+            while True:
+                with lock:
+                    index = next(counter, None)
+                if index is None:
+                    return
+                started = time.perf_counter()
+                try:
+                    response = self._request(endpoint, index)
+                    status = str(response.status_code)
+                except requests.RequestException as e:
+                    status = type(e).__name__
+                elapsed = time.perf_counter() - started
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == '200':
+                        latencies.append(elapsed)
+
+        sampler = MemorySampler(server_pid)
+        with sampler:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for future in [executor.submit(worker) for _ in range(concurrency)]:
+                    future.result()
+            wall_seconds = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'endpoint': endpoint,
+            'concurrency': concurrency,
+            'requests': total_requests,
+            'succeeded': len(latencies),
+            'statuses': statuses,
+            'wall_seconds': round(wall_seconds, 4),
+            'throughput_rps': round(len(latencies) / wall_seconds, 3) if wall_seconds else None,
+            'latency_ms': {
+                name: round(value * 1000, 2) if value is not None else None
+                for name, value in [
+                    ('p50', percentile(latencies, 0.50)),
+                    ('p95', percentile(latencies, 0.95)),
+                    ('p99', percentile(latencies, 0.99)),
+                    ('mean', sum(latencies) / len(latencies) if latencies else None),
+                    ('max', latencies[-1] if latencies else None),
+                ]
+            },
+            'memory': sampler.report()
+        }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True, timeout=10)
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=PROJECT_DIR,
+                               capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() + ('-dirty' if dirty.stdout.strip() else '')
+
+
+def previous_record(output_path: str, config: dict) -> Optional[dict]:
+    """The most recent saved record benchmarked with the same configuration"""
+    if not os.path.exists(output_path):
+        return None
+    match = None
+    with open(output_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('config') == config:
+                match = record
+    return match
+
+
+def compare(previous: dict, runs: List[dict]) -> List[str]:
+    """One line per run whose p95 latency or throughput moved by more than 10% since the previous record"""
+    earlier = {(run['endpoint'], run['concurrency']): run for run in previous.get('runs', [])}
+    lines = []
+    for run in runs:
+        before = earlier.get((run['endpoint'], run['concurrency']))
+        if not before:
+            continue
+        for label, now, then, worse_when_higher in [
+            ('p95', run['latency_ms']['p95'], before['latency_ms']['p95'], True),
+            ('throughput', run['throughput_rps'], before['throughput_rps'], False),
+        ]:
+            if not now or not then:
+                continue
+            change = (now - then) / then
+            if abs(change) > 0.10:
+                verdict = 'slower' if (change > 0) == worse_when_higher else 'faster'
+                lines.append(f"  {run['endpoint']} x{run['concurrency']} {label}: {then} -> {now} "
+                             f"({change:+.0%}, {verdict}) vs {previous.get('git_revision')}")
+    return lines
+
+
+def start_local_stack(fake_config, cache: bool):
+    """Start the fake Gemini server and the app in this process; returns (base_url, fake_server, shutdown)"""
+    from fake_gemini import FakeGeminiServer
+    from werkzeug.serving import make_server
+
+    fake = FakeGeminiServer(fake_config).start()
+    state_dir = tempfile.mkdtemp(prefix='analyzer-benchmark-')
+    # The app reads its configuration at import, so the environment has to be set first
+    os.environ.setdefault('GEMINI_API_KEY', 'benchmark')
+    os.environ['GEMINI_API_URL'] = fake.url
+    os.environ['RESULT_CACHE_ENABLED'] = 'true' if cache else 'false'
+    os.environ['JSON_LOGS'] = 'false'
+    for name, path in [('RESULT_CACHE_PATH', 'results.sqlite3'), ('RELATED_INDEX_PATH', 'related_index.sqlite3'),
+                       ('EMBEDDING_STORE_DIR', 'embeddings'), ('REVISION_TRACKER_PATH', 'revisions.sqlite3'),
+                       ('BATCH_OUTPUT_DIR', 'batches')]:
+        os.environ[name] = os.path.join(state_dir, path)
+
+    import app as app_module
+    # Per-request access logs would dominate the output and the timing
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app_module.create_app(), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def shutdown():
+        server.shutdown()
+        fake.stop()
+
+    return f"http://127.0.0.1:{server.server_port}", fake, shutdown
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Load-test the analyzer API against an offline Gemini stand-in and record the results")
+    parser.add_argument('--corpus', nargs='*', default=None, help="PDF files or directories (default: synthetic papers)")
+    parser.add_argument('--papers', type=int, default=8, help="synthetic papers to generate")
+    parser.add_argument('--pages', type=int, default=6, help="pages per synthetic paper")
+    parser.add_argument('--endpoints', default='extract-text,analyze',
+                        help="comma-separated: " + ', '.join(ENDPOINTS))
+    parser.add_argument('--concurrency', default='1,4,8', help="comma-separated concurrency levels")
+    parser.add_argument('--requests', type=int, default=32, help="requests per endpoint and concurrency level")
+    parser.add_argument('--url', default=None,
+                        help="benchmark an already running server instead of starting one with the fake Gemini")
+    parser.add_argument('--server-pid', type=int, default=None, help="with --url, sample this process's memory")
+    parser.add_argument('--cache', action='store_true', help="keep the result cache enabled in the local server")
+    parser.add_argument('--latency', default='lognormal:0.2:0.5', help="fake Gemini latency distribution")
+    parser.add_argument('--seconds-per-kchar', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default=None, help="free-form tag stored with the results")
+    parser.add_argument('-o', '--output', default=DEFAULT_OUTPUT, help="JSON Lines file the results are appended to")
+    args = parser.parse_args(argv)
+
+    endpoints = [endpoint for endpoint in args.endpoints.split(',') if endpoint]
+    unknown = [endpoint for endpoint in endpoints if endpoint not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',') if level]
+
+    corpus = load_corpus(args.corpus) if args.corpus else generate_corpus(args.papers, args.pages, args.seed)
+    if not corpus:
+        parser.error("no PDFs found in the corpus")
+
+    fake = None
+    shutdown = None
+    config = {
+        'endpoints': endpoints,
+        'concurrency': levels,
+        'requests': args.requests,
+        'corpus': [paper['name'] for paper in corpus] if args.corpus else {'papers': args.papers, 'pages': args.pages,
+                                                                         'seed': args.seed},
+    }
+    if args.url:
+        base_url = args.url
+        config['target'] = 'external'
+    else:
+        from fake_gemini import FakeGeminiConfig
+        fake_config = FakeGeminiConfig(latency=args.latency, seconds_per_kchar=args.seconds_per_kchar,
+                                       error_rate=args.error_rate, malformed_rate=args.malformed_rate,
+                                       seed=args.seed)
+        base_url, fake, shutdown = start_local_stack(fake_config, args.cache)
+        config['target'] = 'local'
+        config['cache'] = args.cache
+        config['fake_gemini'] = fake_config.describe()
+
+    print(f"Benchmarking {base_url} with {len(corpus)} papers")
+    benchmark = Benchmark(base_url, corpus)
+    runs = []
+    try:
+        for endpoint in endpoints:
+            for level in levels:
+                run = benchmark.run(endpoint, level, args.requests, args.server_pid)
+                runs.append(run)
+                latency = run['latency_ms']
+                print(f"  {endpoint:<22} x{level:<3} {run['throughput_rps'] or 0:>8.2f} req/s  "
+                      f"p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+                      f"ok {run['succeeded']}/{run['requests']}")
+    finally:
+        if shutdown:
+            shutdown()
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_revision': git_revision(),
+        'label': args.label,
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'config': config,
+        'runs': runs,
+    }
+    if fake is not None:
+        record['fake_gemini_requests'] = fake.stats()
+
+    previous = previous_record(args.output, config)
+    if previous:
+        changes = compare(previous, runs)
+        print("Changes since the last run with this configuration:" if changes else
+              "No change over 10% since the last run with this configuration")
+        for line in changes:
+            print(line)
+
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    print(f"Results appended to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import List, Dict, Optional
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = {
+    'the', 'and', 'for', 'are', 'was', 'were', 'with', 'this', 'that', 'these', 'those', 'from',
+    'into', 'its', 'their', 'they', 'which', 'while', 'also', 'has', 'have', 'had', 'been', 'being',
+    'not', 'but', 'can', 'could', 'may', 'might', 'will', 'would', 'such', 'than', 'then', 'there',
+    'using', 'used', 'use', 'based', 'paper', 'study', 'research', 'results', 'approach', 'method',
+    'our', 'all', 'any', 'each', 'more', 'most', 'other', 'some', 'both', 'between', 'through'
+}
+
+# Query terms beyond this are dropped, rarest kept, to bound the postings read per query
+MAX_QUERY_TERMS = 64
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and very short tokens removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) > 2 and token not in STOPWORDS]
+
+
+class BM25Index:
+    """Incrementally built BM25 inverted index of analyzed papers, persisted in SQLite"""
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def add(self, doc_id: str, title: str, summary: str, text: str = ''):
+        """Index (or re-index) a paper by its title, summary and optional extra text"""
+        counts = Counter(tokenize(f"{title}\n{summary}\n{text}"))
+
+        with self._lock:
+            self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, title, summary, length, added_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, title, summary, sum(counts.values()), time.time())
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                [(term, doc_id, tf) for term, tf in counts.items()]
+            )
+            self._conn.commit()
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def search(self, query: str, limit: int = 5, exclude: Optional[set] = None) -> List[Dict]:
+        """Return the top documents for the query as dicts with doc_id, title, summary and score"""
+        query_terms = Counter(tokenize(query))
+        if not query_terms:
+            return []
+
+        with self._lock:
+            total_docs, total_length = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM documents"
+            ).fetchone()
+            if total_docs == 0:
+                return []
+
+            placeholders = ','.join('?' * len(query_terms))
+            doc_freqs = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                list(query_terms)
+            ).fetchall())
+            if not doc_freqs:
+                return []
+
+            # Rare terms carry the signal; very common ones mostly cost postings reads
+            terms = sorted(doc_freqs, key=lambda term: doc_freqs[term])[:MAX_QUERY_TERMS]
+            placeholders = ','.join('?' * len(terms))
+            postings = self._conn.execute(
+                f"SELECT p.term, p.doc_id, p.tf, d.length FROM postings p "
+                f"JOIN documents d ON d.doc_id = p.doc_id WHERE p.term IN ({placeholders})",
+                terms
+            ).fetchall()
+
+        average_length = total_length / total_docs
+        idf = {
+            term: math.log(1 + (total_docs - doc_freqs[term] + 0.5) / (doc_freqs[term] + 0.5))
+            for term in terms
+        }
+
+        scores: Dict[str, float] = {}
+        for term, doc_id, tf, length in postings:
+            if exclude and doc_id in exclude:
+                continue
+            norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * norm * query_terms[term]
+
+        top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        if not top:
+            return []
+
+        with self._lock:
+            placeholders = ','.join('?' * len(top))
+            documents = {
+                row[0]: row for row in self._conn.execute(
+                    f"SELECT doc_id, title, summary, added_at FROM documents WHERE doc_id IN ({placeholders})",
+                    [doc_id for doc_id, _ in top]
+                )
+            }
+
+        return [
+            {
+                'doc_id': doc_id,
+                'title': documents[doc_id][1],
+                'summary': documents[doc_id][2],
+                'added_at': documents[doc_id][3],
+                'score': round(score, 4)
+            }
+            for doc_id, score in top if doc_id in documents
+        ]
+
+    def document_frequencies(self, terms: List[str]):
+        """Corpus size and the number of indexed papers containing each term, as (N, {term: df})"""
+        terms = list(set(terms))
+        with self._lock:
+            total_docs = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            doc_freqs = {}
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(terms), 500):
+                batch = terms[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                doc_freqs.update(self._conn.execute(
+                    f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term",
+                    batch
+                ).fetchall())
+        return total_docs, doc_freqs
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            terms = self._conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {'documents': documents, 'terms': terms}
@@ -0,0 +1,115 @@
+import re
+from typing import List, Tuple
+
+# Headings as PyPDF2 usually renders them: "1 Introduction", "2.3 Results",
+# "III. METHODS", or a bare well-known section name on its own line
+SECTION_HEADING_PATTERN = re.compile(
+    r'^\s*(?:(?:\d+(?:\.\d+)*|[IVXLC]+)\.?\s+[A-Z][^\n]{0,80}'
+    r'|(?:abstract|introduction|background|related work|methods?|methodology|materials and methods|'
+    r'experiments?|results|discussion|conclusions?|acknowledg(?:e)?ments?|references|bibliography|appendix)\s*)$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Sections that add tokens without adding content worth summarizing
+SKIPPED_SECTIONS = {'references', 'bibliography', 'acknowledgments', 'acknowledgements'}
+
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split text into (heading, body) pairs; text before the first heading gets an empty heading"""
+    sections = []
+    last_heading = ''
+    last_end = 0
+
+    for match in SECTION_HEADING_PATTERN.finditer(text):
+        body = text[last_end:match.start()]
+        if body.strip() or last_heading:
+            sections.append((last_heading, body))
+        last_heading = match.group(0).strip()
+        last_end = match.end()
+
+    sections.append((last_heading, text[last_end:]))
+    return sections
+
+
+def _section_name(heading: str) -> str:
+    return re.sub(r'^[\dIVXLC.\s]+', '', heading).strip().lower()
+
+
+def _split_long_text(text: str, max_chars: int) -> List[str]:
+    """Break an oversized section on paragraph, then sentence, boundaries"""
+    pieces = []
+    current = ''
+
+    for paragraph in re.split(r'\n\s*\n', text):
+        units = [paragraph] if len(paragraph) <= max_chars else SENTENCE_BOUNDARY_PATTERN.split(paragraph)
+        for unit in units:
+            # A single sentence longer than the limit is hard-split as a last resort
+            while len(unit) > max_chars:
+                pieces.append(unit[:max_chars])
+                unit = unit[max_chars:]
+            if current and len(current) + len(unit) + 1 > max_chars:
+                pieces.append(current)
+                current = ''
+            current = f"{current}\n{unit}" if current else unit
+
+    if current.strip():
+        pieces.append(current)
+    return pieces
+
+
+def filter_pages(pages: List[str]) -> List[str]:
+    """Drop reference lists and other skipped sections page by page, keeping page boundaries"""
+    filtered = []
+    skipping = False
+
+    for page in pages:
+        kept = []
+        for heading, body in split_sections(page):
+            # A page's untitled leading text continues the section from the previous page
+            if heading:
+                skipping = _section_name(heading) in SKIPPED_SECTIONS
+            if not skipping:
+                kept.append(f"{heading}\n{body}" if heading else body)
+        filtered.append(''.join(kept))
+    return filtered
+
+
+def split_page_range(text: str, max_chars: int = 8000) -> List[str]:
+    """Chunks for one group of pages: the text itself, or paragraph/sentence pieces if oversized"""
+    if len(text) <= max_chars:
+        return [text] if text.strip() else []
+    return _split_long_text(text, max_chars)
+
+
+def split_into_chunks(text: str, max_chars: int = 8000) -> List[str]:
+    """Split a paper into section-aware chunks of at most max_chars, skipping reference lists"""
+    chunks = []
+    current = ''
+
+    for heading, body in split_sections(text):
+        section_name = _section_name(heading)
+        if section_name in SKIPPED_SECTIONS:
+            continue
+
+        section = f"{heading}\n{body.strip()}" if heading else body.strip()
+        if not section.strip():
+            continue
+
+        if len(section) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ''
+            chunks.extend(_split_long_text(section, max_chars))
+            continue
+
+        # Pack whole sections together while they fit, so chunk boundaries fall between sections
+        if current and len(current) + len(section) + 2 > max_chars:
+            chunks.append(current)
+            current = ''
+        current = f"{current}\n\n{section}" if current else section
+
+    if current:
+        chunks.append(current)
+    return chunks
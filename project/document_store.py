@@ -0,0 +1,71 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+class DocumentStore:
+    """In-memory store of extracted documents with LRU and TTL eviction"""
+
+    def __init__(self, max_documents: int = 200, ttl_seconds: int = 3600):
+        self.max_documents = max_documents
+        self.ttl_seconds = ttl_seconds
+        self._documents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        # Entries are kept in access order, so expired ones cluster at the front
+        while self._documents:
+            document_id, document = next(iter(self._documents.items()))
+            if now - document['accessed_at'] <= self.ttl_seconds:
+                break
+            del self._documents[document_id]
+
+    def add(self, text: str, **fields) -> str:
+        """Store a document's text (and any extra fields) and return its new ID"""
+        document_id = uuid.uuid4().hex
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+            self._documents[document_id] = {
+                'text': text,
+                'created_at': now,
+                'accessed_at': now,
+                **fields
+            }
+            while len(self._documents) > self.max_documents:
+                self._documents.popitem(last=False)
+
+        return document_id
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored document, or None if it is unknown or has expired"""
+        now = time.time()
+
+        with self._lock:
+            self._evict_expired(now)
+            document = self._documents.get(document_id)
+            if document is None:
+                return None
+            document['accessed_at'] = now
+            self._documents.move_to_end(document_id)
+            return document
+
+    def update(self, document_id: str, **fields) -> bool:
+        """Attach derived results (e.g. the summary) to a stored document"""
+        with self._lock:
+            document = self._documents.get(document_id)
+            if document is None:
+                return False
+            document.update(fields)
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'documents': len(self._documents),
+                'max_documents': self.max_documents,
+                'ttl_seconds': self.ttl_seconds
+            }
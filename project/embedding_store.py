@@ -0,0 +1,240 @@
+import functools
+import hashlib
+import importlib
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional, Iterable
+
+import numpy as np
+
+from bm25_index import tokenize
+
+
+class HashingVectorizer:
+    """Deterministic offline embedder: signed feature hashing of unigrams and bigrams, L2-normalized"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._bucket = functools.lru_cache(maxsize=200_000)(self._hash_feature)
+
+    def _hash_feature(self, feature: str):
+        # blake2b rather than hash(): Python salts str hashes per process
+        digest = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little')
+        return digest % self.dim, 1.0 if (digest >> 63) & 1 else -1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                index, sign = self._bucket(feature)
+                vectors[row, index] += sign
+        # Sublinear term frequency so repeated words do not dominate
+        np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+        return _normalize(vectors)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+def load_embedder(spec: str, dim: int = 384):
+    """'hashing' for the built-in vectorizer, or 'package.module:factory' for a local model.
+
+    The factory is called with no arguments and must return an object with a `dim`
+    attribute and an `embed(texts) -> (n, dim) array` method."""
+    if spec == 'hashing':
+        return HashingVectorizer(dim)
+    module_name, _, factory_name = spec.partition(':')
+    if not factory_name:
+        raise ValueError(f"Embedding model must be 'hashing' or 'module:factory', got {spec!r}")
+    return getattr(importlib.import_module(module_name), factory_name)()
+
+
+class EmbeddingStore:
+    """Append-only matrix of paper embeddings in a memory-mapped file, searched by blocked cosine top-k.
+
+    Vectors are L2-normalized on the way in, so cosine similarity is a plain dot product.
+    With quantize=True rows are stored as int8 with one float32 scale per row, a quarter
+    of the disk and page-cache footprint at a small cost in score precision.
+    Search drops hits scoring at or below min_score, so unrelated papers are never returned as similar."""
+
+    def __init__(self, directory: str, embedder, quantize: bool = False, block_rows: int = 65536,
+                 min_score: float = 0.0):
+        self.embedder = embedder
+        self.min_score = min_score
+        self.dim = embedder.dim
+        self.quantize = quantize
+        self.block_rows = block_rows
+        self.dtype = np.int8 if quantize else np.float32
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, 'vectors.int8' if quantize else 'vectors.f32')
+        self.scales_path = os.path.join(directory, 'scales.f32')
+
+        self._conn = sqlite3.connect(os.path.join(directory, 'papers.sqlite3'), check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS papers (
+                row INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._check_layout()
+
+        # The metadata table is authoritative: a vector appended just before a crash
+        # but never recorded is cut off here
+        self.count = self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        self._truncate(self.vectors_path, self.count * self.dim * np.dtype(self.dtype).itemsize)
+        if quantize:
+            self._truncate(self.scales_path, self.count * 4)
+
+        self._matrix = None
+        self._scales = None
+        self._mapped_rows = 0
+
+    def _check_layout(self):
+        layout = f"{self.dim}:{np.dtype(self.dtype).name}"
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('layout', ?)", (layout,))
+            self._conn.commit()
+        elif row[0] != layout:
+            raise ValueError(f"Embedding store was built with layout {row[0]}, not {layout}; "
+                             f"use a new EMBEDDING_STORE_DIR or rebuild it")
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, 'r+b') as f:
+                f.truncate(size)
+
+    def _encode(self, vectors: np.ndarray):
+        if not self.quantize:
+            return vectors.astype(np.float32), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def __contains__(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM papers WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def add(self, doc_id: str, title: str, summary: str) -> bool:
+        """Embed and append one paper; returns False if it is already stored"""
+        if doc_id in self:
+            return False
+        rows, scales = self._encode(_normalize(self.embedder.embed([f"{title}\n{summary}"])))
+
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM papers WHERE doc_id = ?", (doc_id,)).fetchone():
+                return False
+            with open(self.vectors_path, 'ab') as f:
+                f.write(rows.tobytes())
+            if scales is not None:
+                with open(self.scales_path, 'ab') as f:
+                    f.write(scales.tobytes())
+            self._conn.execute(
+                "INSERT INTO papers (row, doc_id, title, summary, added_at) VALUES (?, ?, ?, ?, ?)",
+                (self.count, doc_id, title, summary, time.time())
+            )
+            self._conn.commit()
+            self.count += 1
+        return True
+
+    def _mapped(self):
+        """Memory maps covering every stored row, re-opened only when rows were appended"""
+        with self._lock:
+            if self._mapped_rows != self.count:
+                if self.count:
+                    self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r',
+                                             shape=(self.count, self.dim))
+                    if self.quantize:
+                        self._scales = np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=(self.count,))
+                self._mapped_rows = self.count
+            return self._matrix, self._scales, self._mapped_rows
+
+    def top_k(self, queries: np.ndarray, k: int = 10) -> List[List[tuple]]:
+        """Cosine top-k for each row of a (m, dim) query matrix, as [(row, score), ...] per query"""
+        matrix, scales, rows = self._mapped()
+        queries = _normalize(np.atleast_2d(queries))
+        if rows == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        k = min(k, rows)
+
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, rows, self.block_rows):
+            block = matrix[start:start + self.block_rows]
+            # One (block, dim) x (dim, m) multiply scores the whole block for every query
+            scores = (block.astype(np.float32) if self.quantize else block) @ queries.T
+            if self.quantize:
+                scores *= scales[start:start + len(block), None]
+            scores = scores.T
+
+            block_k = min(k, scores.shape[1])
+            candidates = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, candidates + start], axis=1)
+
+            # Only the running top-k survive between blocks, so memory stays O(block + k)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        return [
+            [(int(row), float(score)) for row, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(best_rows, best_scores)
+        ]
+
+    def search(self, text: str, limit: int = 5, exclude: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Papers most similar to a text, as dicts with doc_id, title, summary and score"""
+        exclude = set(exclude or ())
+        hits = self.top_k(self.embedder.embed([text]), k=limit + len(exclude))[0]
+        hits = [(row, score) for row, score in hits if score > self.min_score]
+        if not hits:
+            return []
+
+        with self._lock:
+            placeholders = ','.join('?' * len(hits))
+            papers = {
+                row[0]: row for row in self._conn.execute(
+                    f"SELECT row, doc_id, title, summary, added_at FROM papers WHERE row IN ({placeholders})",
+                    [row for row, _ in hits]
+                )
+            }
+
+        results = []
+        for row, score in hits:
+            paper = papers.get(row)
+            if paper is None or paper[1] in exclude:
+                continue
+            results.append({
+                'doc_id': paper[1],
+                'title': paper[2],
+                'summary': paper[3],
+                'added_at': paper[4],
+                'score': round(score, 4)
+            })
+        return results[:limit]
+
+    def stats(self) -> dict:
+        return {
+            'papers': self.count,
+            'dim': self.dim,
+            'dtype': np.dtype(self.dtype).name,
+            'bytes': self.count * self.dim * np.dtype(self.dtype).itemsize
+        }
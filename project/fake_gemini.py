@@ -0,0 +1,388 @@
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
+
+# Prompt phrases that identify which analyzer stage a request comes from, checked in order;
+# the combined prompt also asks for a Mermaid mind map, so it is matched first
+STAGE_MARKERS = [
+    ('combined', 'respond with a single JSON object'),
+    ('mindmap', 'Mermaid mind map'),
+    ('novelty_explanation', 'novelty scores (1-100) were computed'),
+    ('novelty', 'calculate a novelty score'),
+    ('related_articles', 'academic research papers'),
+    ('summary_chunk', 'one part of a longer research paper'),
+    ('summary_reduce', 'summaries of consecutive parts'),
+    ('summary_revision', 'summary of an earlier version'),
+]
+
+CANNED_SUMMARY = (
+    "This paper studies {topic}. The authors propose a method that combines established techniques "
+    "with a new training objective and evaluate it on three public benchmarks. Results show consistent "
+    "improvements over strong baselines, with the largest gains on the smallest datasets. The paper "
+    "closes with a discussion of limitations and directions for future work. ({prompt_words} words in the prompt)"
+)
+
+CANNED_NOVELTY = {
+    'methodological_score': 72,
+    'conceptual_score': 65,
+    'impact_score': 70,
+    'overall_score': 69,
+    'methodological_reason': 'The training objective is a new combination of known components.',
+    'conceptual_reason': 'The framing follows earlier work on {topic}.',
+    'impact_reason': 'The gains on small datasets are practically useful.',
+    'overall_assessment': 'A solid incremental contribution.'
+}
+
+CANNED_MINDMAP = """mindmap
+  root(({topic}))
+    Introduction
+      Motivation
+    Methodology
+      Training objective
+    Results
+      Benchmarks
+    Conclusion"""
+
+# Default response per stage
+CANNED_RESPONSES = {
+    'summary': CANNED_SUMMARY,
+    'summary_chunk': CANNED_SUMMARY,
+    'summary_reduce': CANNED_SUMMARY,
+    'summary_revision': CANNED_SUMMARY,
+    'mindmap': CANNED_MINDMAP,
+    'novelty': json.dumps(CANNED_NOVELTY, indent=2),
+    'novelty_explanation': json.dumps(
+        {field: reason for field, reason in CANNED_NOVELTY.items() if not field.endswith('_score')}, indent=2),
+    'related_articles': json.dumps([
+        {
+            'title': f'Related Work on {{topic}}, Part {index}',
+            'authors': ['A. Author', 'B. Author'],
+            'journal': 'Journal of Benchmarks',
+            'date': '2023',
+            'description': 'A closely related study used as a canned benchmark response.',
+            'citations': 10 * index,
+            'url': f'https://example.org/paper-{index}'
+        }
+        for index in range(1, 6)
+    ], indent=2),
+    'combined': json.dumps({
+        'summary': CANNED_SUMMARY,
+        'novelty': CANNED_NOVELTY,
+        'mindmap': CANNED_MINDMAP
+    }, indent=2),
+}
+
+# Placeholders filled in per request; anything else in braces (JSON) is left alone
+PLACEHOLDER_PATTERN = re.compile(r'\{(topic|prompt_chars|prompt_words)\}')
+
+# Ways a response is damaged when it is chosen to be malformed
+MALFORMED_KINDS = ['wrapped', 'truncated', 'garbage']
+
+
+def detect_stage(prompt: str) -> str:
+    """Which analyzer stage a prompt belongs to, 'summary' when none of the markers match"""
+    for stage, marker in STAGE_MARKERS:
+        if marker in prompt:
+            return stage
+    return 'summary'
+
+
+def parse_latency(spec: str):
+    """Build a sampler from 'fixed:S', 'uniform:LOW:HIGH', 'lognormal:MEDIAN:SIGMA' or 'exponential:MEAN'"""
+    name, _, params = spec.partition(':')
+    try:
+        values = [float(value) for value in params.split(':')] if params else []
+        if name == 'fixed':
+            (seconds,) = values
+            return lambda rng: seconds
+        if name == 'uniform':
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if name == 'lognormal':
+            median, sigma = values
+            return lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        if name == 'exponential':
+            (mean,) = values
+            return lambda rng: rng.expovariate(1 / mean) if mean > 0 else 0.0
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid latency distribution '{spec}'")
+
+
+class FakeGeminiConfig:
+    """Behaviour of the stand-in: latency, injected failures and the responses it returns"""
+
+    def __init__(self, latency: str = 'lognormal:0.8:0.4', seconds_per_kchar: float = 0.0,
+                 error_rate: float = 0.0, error_codes: Optional[List[int]] = None,
+                 retry_after: Optional[int] = None, malformed_rate: float = 0.0,
+                 malformed_kinds: Optional[List[str]] = None, stream_chunks: int = 8,
+                 responses: Optional[Dict[str, Any]] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.sample_latency = parse_latency(latency)
+        # Extra latency per 1,000 prompt characters, so long prompts are slower as with the real API
+        self.seconds_per_kchar = seconds_per_kchar
+        self.error_rate = error_rate
+        self.error_codes = error_codes or [429, 500, 503]
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.malformed_kinds = malformed_kinds or MALFORMED_KINDS
+        self.stream_chunks = stream_chunks
+        # Per stage: a template string or a list of them (one is picked at random)
+        self.responses = dict(CANNED_RESPONSES)
+        self.responses.update(responses or {})
+        self.seed = seed
+
+    def describe(self) -> dict:
+        """The settings that shape benchmark results, for recording alongside them"""
+        return {
+            'latency': self.latency,
+            'seconds_per_kchar': self.seconds_per_kchar,
+            'error_rate': self.error_rate,
+            'error_codes': self.error_codes,
+            'malformed_rate': self.malformed_rate,
+            'malformed_kinds': self.malformed_kinds,
+            'custom_responses': sorted(stage for stage, template in self.responses.items()
+                                       if CANNED_RESPONSES.get(stage) != template)
+        }
+
+
+# Prompt headings the paper text or summary follows
+CONTENT_HEADING_PATTERN = re.compile(r'^\s*(?:Research Paper Text|Research Summary[^:\n]*|Paper excerpt|Part summaries):\s*$',
+                                     re.MULTILINE)
+
+
+def _topic(prompt: str) -> str:
+    """A short topic for templated responses: the first longish line of the paper text or summary"""
+    heading = CONTENT_HEADING_PATTERN.search(prompt)
+    content = prompt[heading.end():] if heading else prompt
+    for line in content.split('\n'):
+        line = line.strip()
+        if 20 <= len(line) <= 120:
+            return line.rstrip('.')
+    return 'the research problem'
+
+
+def _damage(text: str, kind: str) -> str:
+    if kind == 'wrapped':
+        return f"Sure! Here is the result you asked for:\n\n```json\n{text}\n```\n\nLet me know if you need more."
+    if kind == 'truncated':
+        return text[:max(1, len(text) // 2)]
+    return "I'm sorry, I could not produce a structured answer for this paper."
+
+
+class FakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The asyncio server opens hundreds of connections at once; the default backlog of 5 resets them
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients hang up on purpose, e.g. when a hedged duplicate answers first
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+class FakeGeminiServer:
+    """Local HTTP stand-in for the generateContent and streamGenerateContent endpoints.
+
+    Start it, point GEMINI_API_URL at `url`, and the analyzer runs end to end offline with
+    the configured latency, error and malformed-response behaviour."""
+
+    def __init__(self, config: Optional[FakeGeminiConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or FakeGeminiConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if urlparse(self.path).path == '/stats':
+                    server._send_json(self, 200, server.stats())
+                else:
+                    server._send_json(self, 404, {'error': {'code': 404, 'message': 'Not found'}})
+
+            def do_POST(self):
+                server._handle_generate(self)
+
+        self.httpd = FakeHTTPServer((host, port), Handler)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1beta/models/fake:generateContent"
+
+    def start(self) -> 'FakeGeminiServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stats(self) -> dict:
+        """Requests served per stage and outcome"""
+        with self._stats_lock:
+            return {stage: dict(outcomes) for stage, outcomes in self._stats.items()}
+
+    def _count(self, stage: str, outcome: str):
+        with self._stats_lock:
+            outcomes = self._stats.setdefault(stage, {})
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    def _draw(self):
+        """Error draw, malformed draw and latency for one request, from the seeded generator"""
+        with self._rng_lock:
+            return self._rng.random(), self._rng.random(), self.config.sample_latency(self._rng)
+
+    def _choice(self, options: list):
+        with self._rng_lock:
+            return self._rng.choice(options)
+
+    def _send_json(self, handler: BaseHTTPRequestHandler, status: int, body: dict, headers: Optional[dict] = None):
+        payload = json.dumps(body).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _render(self, stage: str, prompt: str) -> str:
+        template = self.config.responses.get(stage, self.config.responses['summary'])
+        if isinstance(template, list):
+            template = self._choice(template)
+        values = {'topic': _topic(prompt), 'prompt_chars': str(len(prompt)), 'prompt_words': str(len(prompt.split()))}
+        return PLACEHOLDER_PATTERN.sub(lambda match: values[match.group(1)], template)
+
+    def _handle_generate(self, handler: BaseHTTPRequestHandler):
+        parsed = urlparse(handler.path)
+        streaming = parsed.path.endswith(':streamGenerateContent')
+        if not (streaming or parsed.path.endswith(':generateContent')):
+            self._send_json(handler, 404, {'error': {'code': 404, 'message': 'Not found'}})
+            return
+
+        length = int(handler.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(handler.rfile.read(length) or b'{}')
+            prompt = request['contents'][0]['parts'][0]['text']
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            self._send_json(handler, 400, {'error': {'code': 400, 'message': 'Invalid request body'}})
+            return
+
+        stage = detect_stage(prompt)
+        error_draw, malformed_draw, latency = self._draw()
+        time.sleep(latency + self.config.seconds_per_kchar * len(prompt) / 1000)
+
+        if error_draw < self.config.error_rate:
+            status = self._choice(self.config.error_codes)
+            self._count(stage, str(status))
+            headers = {'Retry-After': str(self.config.retry_after)} if self.config.retry_after is not None else None
+            self._send_json(handler, status, {'error': {'code': status, 'message': 'Injected failure'}}, headers)
+            return
+
+        text = self._render(stage, prompt)
+        if malformed_draw < self.config.malformed_rate:
+            kind = self._choice(self.config.malformed_kinds)
+            text = _damage(text, kind)
+            self._count(stage, f'malformed_{kind}')
+        else:
+            self._count(stage, '200')
+
+        usage = {
+            'promptTokenCount': len(prompt) // 4,
+            'candidatesTokenCount': len(text) // 4,
+            'totalTokenCount': len(prompt) // 4 + len(text) // 4
+        }
+        if not streaming:
+            self._send_json(handler, 200, {
+                'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}, 'finishReason': 'STOP'}],
+                'usageMetadata': usage
+            })
+            return
+
+        # Server-sent events, the fragments spread over the sampled latency like real token streaming
+        pieces = max(1, self.config.stream_chunks)
+        size = math.ceil(len(text) / pieces) or 1
+        fragments = [text[start:start + size] for start in range(0, len(text), size)] or ['']
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        for index, fragment in enumerate(fragments):
+            chunk = {'candidates': [{'content': {'role': 'model', 'parts': [{'text': fragment}]}}]}
+            if index == len(fragments) - 1:
+                chunk['usageMetadata'] = usage
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+            if index < len(fragments) - 1:
+                time.sleep(latency / len(fragments))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline stand-in for the Gemini generateContent API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', default='lognormal:0.8:0.4',
+                        help="fixed:S, uniform:LOW:HIGH, lognormal:MEDIAN:SIGMA or exponential:MEAN (seconds)")
+    parser.add_argument('--seconds-per-kchar', type=float, default=0.0, help="extra latency per 1,000 prompt characters")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument('--error-codes', default='429,500,503', help="comma-separated status codes to inject")
+    parser.add_argument('--retry-after', type=int, default=None, help="Retry-After seconds sent with injected errors")
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help="fraction of responses that are damaged")
+    parser.add_argument('--malformed-kinds', default=','.join(MALFORMED_KINDS),
+                        help="comma-separated damage kinds: " + ', '.join(MALFORMED_KINDS))
+    parser.add_argument('--responses', default=None,
+                        help="JSON file mapping stage names to a response template or a list of them")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    responses = None
+    if args.responses:
+        with open(args.responses, 'r', encoding='utf-8') as f:
+            responses = json.load(f)
+
+    config = FakeGeminiConfig(
+        latency=args.latency,
+        seconds_per_kchar=args.seconds_per_kchar,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(',') if code],
+        retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate,
+        malformed_kinds=[kind for kind in args.malformed_kinds.split(',') if kind],
+        responses=responses,
+        seed=args.seed
+    )
+    server = FakeGeminiServer(config, args.host, args.port)
+    print(f"Fake Gemini listening; set GEMINI_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,719 @@
+import asyncio
+import time
+import json
+import queue
+import random
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import (GEMINI_SECONDS, GEMINI_BYTES, GEMINI_TOKENS, GEMINI_RETRIES, GEMINI_CALLS, GEMINI_HEDGES,
+                     GEMINI_TIMEOUT_SECONDS, bind, log_event)
+
+# Status codes worth retrying: rate limiting and transient server failures
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Marks the end of a streamed response on its fragment queue
+_STREAM_END = object()
+
+
+class GeminiError(Exception):
+    """Raised when Gemini returns an error or an unusable response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class MalformedResponseError(GeminiError):
+    """Raised when a successful response carries no usable content, such as a truncated JSON body"""
+
+
+class RateLimiter:
+    """Spaces request starts evenly so all threads together stay under a per-minute limit"""
+
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until this caller's slot comes up"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    async def acquire_async(self):
+        """Wait for this caller's slot without blocking the event loop"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class LatencyTracker:
+    """Latencies of each stage's most recent calls with their prompt sizes, for adaptive timeouts and hedging.
+
+    Quantiles are read from a sliding window so they follow Gemini as it speeds up or slows
+    down. A prompt larger than the stage usually sends scales the quantile up in proportion,
+    since the window's samples say little about how long an unusually long prompt takes."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, prompt_bytes: int):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window)
+            samples.append((seconds, prompt_bytes))
+
+    def quantile(self, stage: str, q: float, prompt_bytes: int = 0) -> Optional[float]:
+        """The stage's q-quantile latency for a prompt of this size, or None until enough calls are seen"""
+        with self._lock:
+            samples = list(self._samples.get(stage, ()))
+        if len(samples) < max(self.min_samples, 1):
+            return None
+        latencies = sorted(seconds for seconds, _ in samples)
+        sizes = sorted(size for _, size in samples)
+        value = latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+        typical_size = sizes[len(sizes) // 2]
+        if typical_size and prompt_bytes > typical_size:
+            value *= prompt_bytes / typical_size
+        return value
+
+    def stages(self) -> List[str]:
+        with self._lock:
+            return sorted(self._samples)
+
+
+class _Attempt:
+    """Outcome of one HTTP attempt: the parsed result on success, otherwise the error and whether to retry"""
+
+    def __init__(self, result: Optional[Dict[str, Any]] = None, error: Optional[GeminiError] = None,
+                 retry_reason: Optional[str] = None, response=None):
+        self.result = result
+        self.error = error
+        self.retry_reason = retry_reason
+        self.response = response
+
+    @property
+    def final(self) -> bool:
+        """A success or an error that retrying (or a hedged copy) would not fix"""
+        return self.result is not None or self.retry_reason is None
+
+
+class GeminiClient:
+    """Shared Gemini client with a keep-alive connection pool, retry/backoff and a concurrency limit.
+
+    Per-stage latencies feed adaptive timeouts: once a stage has enough samples its timeout
+    becomes timeout_multiplier x its p99 latency, between min_timeout and the timeout the
+    caller passed. With hedge_quantile set, a call still unanswered after that quantile of
+    its stage's latency sends one duplicate request, if a concurrency slot is free and the
+    duplicates sent so far stay within hedge_budget of all calls, and the first answer wins."""
+
+    def __init__(self, api_key: str, api_url: str, pool_size: int = 10, max_concurrency: int = 4,
+                 max_retries: int = 3, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 default_timeout: float = 60, rate_limiter: Optional[RateLimiter] = None,
+                 adaptive_timeouts: bool = False, timeout_multiplier: float = 3.0, min_timeout: float = 10.0,
+                 hedge_quantile: Optional[float] = None, hedge_budget: float = 0.1,
+                 latency: Optional[LatencyTracker] = None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_timeout = default_timeout
+        self.rate_limiter = rate_limiter
+
+        self.latency = latency or LatencyTracker()
+        self.adaptive_timeouts = adaptive_timeouts
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.hedge_quantile = hedge_quantile
+        self.hedge_budget = hedge_budget
+        # Calls and hedges per stage, for the hedge budget and stats()
+        self._calls: Dict[str, int] = {}
+        self._hedges: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+        # One session reuses TLS connections across calls and threads
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        # Hedged calls run both copies here; each holds a concurrency slot before it is
+        # submitted, so the pool never queues and a hedge starts as soon as it is sent
+        self._hedge_executor = ThreadPoolExecutor(max_workers=2 * max_concurrency) if hedge_quantile else None
+        # Streamed responses are read here into a queue, so a caller that reads slowly or
+        # goes away does not keep a concurrency slot; each reader holds one, so it never queues
+        self._stream_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='gemini-stream')
+
+        # The asyncio mode's HTTP client and concurrency limit belong to one event loop and
+        # are created on first use inside it
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self._async_client = None
+        self._async_semaphore: Optional[asyncio.Semaphore] = None
+        self._async_loop = None
+
+    def _backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Exponential backoff with full jitter, honouring Retry-After when Gemini sends it"""
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after and retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _extract_text(self, result: Dict[str, Any]) -> str:
+        """Unwrap the generated text from a generateContent response"""
+        try:
+            return result['candidates'][0]['content']['parts'][0]['text']
+        except (KeyError, IndexError, TypeError):
+            raise MalformedResponseError("No response generated from processing engine")
+
+    def _record_attempt(self, stage: str, attempt: int, started: float, sent: int, status: str,
+                        received: int = 0, usage: Optional[Dict[str, Any]] = None):
+        """Latency, bytes and token metrics plus a log line for one HTTP attempt"""
+        seconds = time.perf_counter() - started
+        GEMINI_SECONDS.observe(seconds, stage=stage, status=status)
+        GEMINI_BYTES.inc(sent, stage=stage, direction='sent')
+        GEMINI_BYTES.inc(received, stage=stage, direction='received')
+
+        usage = usage or {}
+        prompt_tokens = usage.get('promptTokenCount')
+        response_tokens = usage.get('candidatesTokenCount')
+        if prompt_tokens is not None:
+            GEMINI_TOKENS.observe(prompt_tokens, stage=stage, kind='prompt')
+        if response_tokens is not None:
+            GEMINI_TOKENS.observe(response_tokens, stage=stage, kind='response')
+
+        log_event('gemini_request', stage=stage, attempt=attempt, status=status, seconds=round(seconds, 4),
+                  bytes_sent=sent, bytes_received=received, prompt_tokens=prompt_tokens,
+                  response_tokens=response_tokens)
+
+    def _build_payload(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
+            "contents": [
+                {
+                    "parts": [
+                        {
+                            "text": prompt
+                        }
+                    ]
+                }
+            ]
+        }
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
+
+    def _call_timeout(self, stage: str, timeout: Optional[float], prompt_bytes: int) -> float:
+        """The configured timeout, or a tighter one derived from the stage's recent p99 latency"""
+        timeout = timeout or self.default_timeout
+        if self.adaptive_timeouts:
+            p99 = self.latency.quantile(stage, 0.99, prompt_bytes)
+            if p99 is not None:
+                timeout = min(timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+        GEMINI_CALLS.inc(stage=stage)
+        GEMINI_TIMEOUT_SECONDS.observe(timeout, stage=stage)
+        with self._stats_lock:
+            self._calls[stage] = self._calls.get(stage, 0) + 1
+        return timeout
+
+    def _hedge_delay(self, stage: str, prompt_bytes: int) -> Optional[float]:
+        """Seconds to wait before hedging a call, or None when hedging is off or the stage has too few samples"""
+        if not self.hedge_quantile:
+            return None
+        return self.latency.quantile(stage, self.hedge_quantile, prompt_bytes)
+
+    def _count_hedge(self, stage: str, outcome: str):
+        GEMINI_HEDGES.inc(stage=stage, outcome=outcome)
+        with self._stats_lock:
+            counts = self._hedges.setdefault(stage, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def _hedge_allowed(self, stage: str) -> bool:
+        """Whether one more duplicate request keeps hedges within hedge_budget of all calls"""
+        with self._stats_lock:
+            calls = sum(self._calls.values())
+            hedges = sum(counts.get('sent', 0) for counts in self._hedges.values())
+        if hedges + 1 > self.hedge_budget * calls:
+            self._count_hedge(stage, 'over_budget')
+            return False
+        return True
+
+    def stats(self) -> dict:
+        """Per-stage call counts, hedge rate and outcomes, latency quantiles and the current adaptive timeout"""
+        with self._stats_lock:
+            calls = dict(self._calls)
+            hedges = {stage: dict(counts) for stage, counts in self._hedges.items()}
+        stages = {}
+        for stage in sorted(set(calls) | set(self.latency.stages())):
+            counts = hedges.get(stage, {})
+            quantiles = {f'p{round(q * 100)}': self.latency.quantile(stage, q) for q in (0.5, 0.95, 0.99)}
+            p99 = quantiles['p99']
+            stages[stage] = {
+                'calls': calls.get(stage, 0),
+                'hedges': counts,
+                'hedge_rate': round(counts.get('sent', 0) / calls[stage], 4) if calls.get(stage) else 0.0,
+                'latency_seconds': {name: round(value, 4) if value is not None else None
+                                    for name, value in quantiles.items()},
+                'adaptive_timeout': (round(max(self.min_timeout, p99 * self.timeout_multiplier), 3)
+                                     if self.adaptive_timeouts and p99 is not None else None)
+            }
+        total_calls = sum(calls.values())
+        total_hedges = sum(counts.get('sent', 0) for counts in hedges.values())
+        return {
+            'adaptive_timeouts': self.adaptive_timeouts,
+            'hedging': bool(self.hedge_quantile),
+            'hedge_quantile': self.hedge_quantile,
+            'hedge_budget': self.hedge_budget,
+            'hedge_rate': round(total_hedges / total_calls, 4) if total_calls else 0.0,
+            'stages': stages
+        }
+
+    def _send(self, stage: str, attempt: int, body: bytes, timeout: float, slot_held: bool = False) -> _Attempt:
+        """One generateContent HTTP attempt, taking a concurrency slot unless the caller already holds one"""
+        if not slot_held:
+            self._semaphore.acquire()
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                self.api_url,
+                params={"key": self.api_key},
+                data=body,
+                timeout=timeout
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            self._record_attempt(stage, attempt, started, len(body), 'error')
+            if isinstance(e, requests.Timeout):
+                # A timed-out call took at least this long; leaving it out would pull the
+                # quantiles, and with them the next timeout, further down
+                self.latency.observe(stage, time.perf_counter() - started, len(body))
+            return _Attempt(error=GeminiError(f"Processing engine connection error: {str(e)}"),
+                            retry_reason='connection')
+        finally:
+            self._semaphore.release()
+
+        return self._response_attempt(stage, attempt, started, body, response)
+
+    def _response_attempt(self, stage: str, attempt: int, started: float, body: bytes, response) -> _Attempt:
+        """Record a requests or httpx response and turn it into an attempt outcome"""
+        if response.status_code == 200:
+            try:
+                result = response.json()
+            except ValueError as e:
+                # A body cut off mid-transfer; another attempt usually gets it whole
+                self._record_attempt(stage, attempt, started, len(body), 'malformed', len(response.content))
+                error = MalformedResponseError(f"Processing engine returned malformed JSON: {str(e)}", status_code=200)
+                return _Attempt(error=error, retry_reason='malformed', response=response)
+            self._record_attempt(stage, attempt, started, len(body), '200', len(response.content),
+                                 result.get('usageMetadata'))
+            self.latency.observe(stage, time.perf_counter() - started, len(body))
+            return _Attempt(result=result, response=response)
+
+        self._record_attempt(stage, attempt, started, len(body), str(response.status_code), len(response.content))
+        error = GeminiError(
+            f"Processing engine error: {response.status_code} - {response.text[:200]}",
+            status_code=response.status_code
+        )
+        retry_reason = str(response.status_code) if response.status_code in RETRYABLE_STATUS_CODES else None
+        return _Attempt(error=error, retry_reason=retry_reason, response=response)
+
+    def _send_hedged(self, stage: str, attempt: int, body: bytes, timeout: float, hedge_delay: float) -> _Attempt:
+        """Send one attempt and, if it is still unanswered after hedge_delay, a duplicate; the first final answer wins"""
+        self._semaphore.acquire()
+        primary = self._hedge_executor.submit(bind(self._send), stage, attempt, body, timeout, True)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done or not self._hedge_allowed(stage):
+            return primary.result()
+        if not self._semaphore.acquire(blocking=False):
+            # Every slot is busy; a duplicate would only queue behind other calls
+            self._count_hedge(stage, 'no_slot')
+            return primary.result()
+        if self.rate_limiter:
+            # The duplicate is one more request start against the per-minute limit
+            self.rate_limiter.acquire()
+        self._count_hedge(stage, 'sent')
+        hedge = self._hedge_executor.submit(bind(self._send), stage, attempt, body, timeout, True)
+
+        # The losing copy cannot be aborted mid-request; it finishes in the pool and is
+        # recorded like any other attempt
+        pending = {primary: 'primary', hedge: 'hedge'}
+        outcome = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                copy = pending.pop(future)
+                outcome = future.result()
+                if outcome.final:
+                    self._count_hedge(stage, f'{copy}_won')
+                    return outcome
+        self._count_hedge(stage, 'both_failed')
+        return outcome
+
+    def generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None, stage: str = 'generate') -> str:
+        """Send a single-prompt generateContent request and return the generated text"""
+        # Serialized once here so the request size can be measured
+        body = json.dumps(self._build_payload(prompt, generation_config)).encode('utf-8')
+        timeout = self._call_timeout(stage, timeout, len(body))
+        last_error: Optional[GeminiError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            hedge_delay = self._hedge_delay(stage, len(body))
+            if hedge_delay is not None and hedge_delay < timeout:
+                outcome = self._send_hedged(stage, attempt, body, timeout, hedge_delay)
+            else:
+                outcome = self._send(stage, attempt, body, timeout)
+            if outcome.result is not None:
+                return self._extract_text(outcome.result)
+
+            last_error = outcome.error
+            if outcome.retry_reason is None:
+                raise last_error
+            if attempt < self.max_retries:
+                GEMINI_RETRIES.inc(stage=stage, reason=outcome.retry_reason)
+                time.sleep(self._backoff_delay(attempt, outcome.response))
+
+        raise last_error
+
+    def stream_generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None, stage: str = 'generate') -> Iterator[str]:
+        """Yield text fragments from the streamGenerateContent endpoint as Gemini produces them"""
+        body = json.dumps(self._build_payload(prompt, generation_config)).encode('utf-8')
+        timeout = timeout or self.default_timeout
+        stream_url = self.api_url.replace(":generateContent", ":streamGenerateContent")
+        last_error: Optional[GeminiError] = None
+
+        # Retries only happen before the first fragment; once text has been
+        # handed to the caller the request cannot be transparently replayed
+        for attempt in range(self.max_retries + 1):
+            response = None
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            started = time.perf_counter()
+            self._semaphore.acquire()
+            try:
+                response = self.session.post(
+                    stream_url,
+                    params={"key": self.api_key, "alt": "sse"},
+                    data=body,
+                    timeout=timeout,
+                    stream=True
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._semaphore.release()
+                self._record_attempt(stage, attempt, started, len(body), 'error')
+                last_error = GeminiError(f"Processing engine connection error: {str(e)}")
+                retry_reason = 'connection'
+            else:
+                if response.status_code == 200:
+                    # The reader releases the slot once Gemini has sent everything
+                    fragments: queue.Queue = queue.Queue()
+                    closed = threading.Event()
+                    self._stream_executor.submit(bind(self._read_stream), response, fragments, closed,
+                                                 stage, attempt, started, len(body))
+                    try:
+                        while True:
+                            fragment = fragments.get()
+                            if fragment is _STREAM_END:
+                                return
+                            if isinstance(fragment, GeminiError):
+                                raise fragment
+                            yield fragment
+                    finally:
+                        closed.set()
+
+                with response:
+                    self._semaphore.release()
+                    self._record_attempt(stage, attempt, started, len(body), str(response.status_code),
+                                         len(response.content))
+                    last_error = GeminiError(
+                        f"Processing engine error: {response.status_code} - {response.text[:200]}",
+                        status_code=response.status_code
+                    )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise last_error
+                retry_reason = str(response.status_code)
+
+            if attempt < self.max_retries:
+                GEMINI_RETRIES.inc(stage=stage, reason=retry_reason)
+                time.sleep(self._backoff_delay(attempt, response))
+
+        raise last_error
+
+    def _read_stream(self, response: requests.Response, fragments: queue.Queue, closed: threading.Event,
+                     stage: str, attempt: int, started: float, sent: int):
+        """Stream reader: queue a 200 response's text fragments, then close it and free its concurrency slot"""
+        # Filled in as the stream is read; the final chunk carries the usage
+        stream_stats = {'bytes': 0, 'usage': None}
+        try:
+            with response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if closed.is_set():
+                        # The caller stopped reading; drop the rest of the response
+                        break
+                    for fragment in self._sse_line_text(line, stream_stats):
+                        fragments.put(fragment)
+            fragments.put(_STREAM_END)
+        except Exception as e:
+            fragments.put(GeminiError(f"Processing engine stream error: {str(e)}"))
+        finally:
+            self._semaphore.release()
+            self._record_attempt(stage, attempt, started, sent, '200', stream_stats['bytes'], stream_stats['usage'])
+
+    def _iter_sse_text(self, response: requests.Response, stream_stats: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+        """Parse Gemini's server-sent events, yielding the text of each chunk"""
+        for line in response.iter_lines(decode_unicode=True):
+            yield from self._sse_line_text(line, stream_stats)
+
+    def _sse_line_text(self, line: str, stream_stats: Optional[Dict[str, Any]] = None) -> List[str]:
+        """Text fragments carried by one server-sent event line, recording bytes and usage"""
+        if stream_stats is not None:
+            stream_stats['bytes'] += len(line) + 1
+        if not line or not line.startswith("data:"):
+            return []
+        chunk = json.loads(line[len("data:"):].strip())
+        if stream_stats is not None and chunk.get('usageMetadata'):
+            stream_stats['usage'] = chunk['usageMetadata']
+        return [
+            part['text']
+            for candidate in chunk.get('candidates', [])[:1]
+            for part in candidate.get('content', {}).get('parts', [])
+            if part.get('text')
+        ]
+
+    def _async_session(self):
+        """The httpx client and concurrency limit for the running event loop, created on first use"""
+        # Optional dependency, only needed for the asyncio serving mode
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._close_stale_async_client()
+            self._async_client = httpx.AsyncClient(
+                headers={"Content-Type": "application/json"},
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            )
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._async_loop = loop
+        return self._async_client, self._async_semaphore
+
+    def _close_stale_async_client(self):
+        """Close the client left over from an earlier event loop, on that loop while it is still alive"""
+        client, loop = self._async_client, self._async_loop
+        self._async_client = None
+        self._async_loop = None
+        if client is None or loop is None or loop.is_closed():
+            # A closed loop cannot run aclose(); its connections go with the client object
+            return
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            # An idle loop cannot be driven from inside the running one; close on it from a helper thread
+            closer = threading.Thread(target=loop.run_until_complete, args=(client.aclose(),), daemon=True)
+            closer.start()
+            closer.join()
+
+    async def aclose(self):
+        """Close the asyncio mode's connection pool"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    async def _asend(self, stage: str, attempt: int, body: bytes, timeout: float,
+                     slot_held: bool = False) -> _Attempt:
+        """_send() for the event loop"""
+        import httpx
+
+        client, semaphore = self._async_session()
+        if not slot_held:
+            await semaphore.acquire()
+        started = time.perf_counter()
+        try:
+            response = await client.post(
+                self.api_url,
+                params={"key": self.api_key},
+                content=body,
+                timeout=timeout
+            )
+        except httpx.TransportError as e:
+            self._record_attempt(stage, attempt, started, len(body), 'error')
+            if isinstance(e, httpx.TimeoutException):
+                self.latency.observe(stage, time.perf_counter() - started, len(body))
+            return _Attempt(error=GeminiError(f"Processing engine connection error: {str(e) or type(e).__name__}"),
+                            retry_reason='connection')
+        except asyncio.CancelledError:
+            # The losing copy of a hedged call; it ran at least this long
+            self._record_attempt(stage, attempt, started, len(body), 'cancelled')
+            self.latency.observe(stage, time.perf_counter() - started, len(body))
+            raise
+        finally:
+            semaphore.release()
+
+        return self._response_attempt(stage, attempt, started, body, response)
+
+    async def _asend_hedged(self, stage: str, attempt: int, body: bytes, timeout: float,
+                            hedge_delay: float) -> _Attempt:
+        """_send_hedged() for the event loop; the losing copy is cancelled, closing its connection"""
+        _, semaphore = self._async_session()
+        await semaphore.acquire()
+        primary = asyncio.ensure_future(self._asend(stage, attempt, body, timeout, slot_held=True))
+        pending = {primary: 'primary'}
+        try:
+            done, _ = await asyncio.wait([primary], timeout=hedge_delay)
+            if done or not self._hedge_allowed(stage):
+                return await primary
+            if semaphore.locked():
+                self._count_hedge(stage, 'no_slot')
+                return await primary
+            await semaphore.acquire()
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            self._count_hedge(stage, 'sent')
+            pending[asyncio.ensure_future(self._asend(stage, attempt, body, timeout, slot_held=True))] = 'hedge'
+
+            outcome = None
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    copy = pending.pop(task)
+                    outcome = task.result()
+                    if outcome.final:
+                        self._count_hedge(stage, f'{copy}_won')
+                        return outcome
+            self._count_hedge(stage, 'both_failed')
+            return outcome
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def agenerate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None, stage: str = 'generate') -> str:
+        """generate() for the event loop: waits on Gemini without holding a thread"""
+        body = json.dumps(self._build_payload(prompt, generation_config)).encode('utf-8')
+        timeout = self._call_timeout(stage, timeout, len(body))
+        last_error: Optional[GeminiError] = None
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            hedge_delay = self._hedge_delay(stage, len(body))
+            if hedge_delay is not None and hedge_delay < timeout:
+                outcome = await self._asend_hedged(stage, attempt, body, timeout, hedge_delay)
+            else:
+                outcome = await self._asend(stage, attempt, body, timeout)
+            if outcome.result is not None:
+                return self._extract_text(outcome.result)
+
+            last_error = outcome.error
+            if outcome.retry_reason is None:
+                raise last_error
+            if attempt < self.max_retries:
+                GEMINI_RETRIES.inc(stage=stage, reason=outcome.retry_reason)
+                await asyncio.sleep(self._backoff_delay(attempt, outcome.response))
+
+        raise last_error
+
+    async def astream_generate(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None,
+                               timeout: Optional[float] = None, stage: str = 'generate') -> AsyncIterator[str]:
+        """stream_generate() for the event loop, with the same retry-before-first-fragment rule"""
+        import httpx
+
+        client, semaphore = self._async_session()
+        body = json.dumps(self._build_payload(prompt, generation_config)).encode('utf-8')
+        timeout = timeout or self.default_timeout
+        stream_url = self.api_url.replace(":generateContent", ":streamGenerateContent")
+        last_error: Optional[GeminiError] = None
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            if self.rate_limiter:
+                await self.rate_limiter.acquire_async()
+            started = time.perf_counter()
+            await semaphore.acquire()
+            try:
+                request = client.build_request("POST", stream_url, params={"key": self.api_key, "alt": "sse"},
+                                               content=body, timeout=timeout)
+                response = await client.send(request, stream=True)
+            except httpx.TransportError as e:
+                semaphore.release()
+                self._record_attempt(stage, attempt, started, len(body), 'error')
+                last_error = GeminiError(f"Processing engine connection error: {str(e) or type(e).__name__}")
+                retry_reason = 'connection'
+            except BaseException:
+                semaphore.release()
+                raise
+            else:
+                if response.status_code == 200:
+                    # The reader task releases the slot once Gemini has sent everything
+                    fragments: asyncio.Queue = asyncio.Queue()
+                    reader = asyncio.ensure_future(self._aread_stream(response, fragments, semaphore, stage,
+                                                                      attempt, started, len(body)))
+                    try:
+                        while True:
+                            fragment = await fragments.get()
+                            if fragment is _STREAM_END:
+                                return
+                            if isinstance(fragment, GeminiError):
+                                raise fragment
+                            yield fragment
+                    finally:
+                        reader.cancel()
+
+                try:
+                    await response.aread()
+                finally:
+                    await response.aclose()
+                    semaphore.release()
+                self._record_attempt(stage, attempt, started, len(body), str(response.status_code),
+                                     len(response.content))
+                last_error = GeminiError(
+                    f"Processing engine error: {response.status_code} - {response.text[:200]}",
+                    status_code=response.status_code
+                )
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    raise last_error
+                retry_reason = str(response.status_code)
+
+            if attempt < self.max_retries:
+                GEMINI_RETRIES.inc(stage=stage, reason=retry_reason)
+                await asyncio.sleep(self._backoff_delay(attempt, response))
+
+        raise last_error
+
+    async def _aread_stream(self, response, fragments: asyncio.Queue, semaphore: asyncio.Semaphore,
+                            stage: str, attempt: int, started: float, sent: int):
+        """_read_stream() for the event loop; cancelled when the caller stops reading"""
+        stream_stats = {'bytes': 0, 'usage': None}
+        try:
+            async for line in response.aiter_lines():
+                for fragment in self._sse_line_text(line, stream_stats):
+                    fragments.put_nowait(fragment)
+            fragments.put_nowait(_STREAM_END)
+        except Exception as e:
+            fragments.put_nowait(GeminiError(f"Processing engine stream error: {str(e) or type(e).__name__}"))
+        finally:
+            semaphore.release()
+            self._record_attempt(stage, attempt, started, sent, '200', stream_stats['bytes'], stream_stats['usage'])
+            await response.aclose()
@@ -0,0 +1,118 @@
+import abc
+import time
+import uuid
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, List
+
+from metrics import log_event
+
+# Job and stage lifecycle states
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+
+class Job:
+    """A submitted analysis with per-stage progress and its eventual result"""
+
+    def __init__(self, stages: List[str]):
+        self.id = uuid.uuid4().hex
+        self.status = PENDING
+        self.stages = {stage: PENDING for stage in stages}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stages': dict(self.stages),
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobBackend(abc.ABC):
+    """Execution backend for jobs; subclass to run them somewhere other than this process"""
+
+    @abc.abstractmethod
+    def submit(self, fn: Callable[[], None]):
+        """Start running fn"""
+
+    def shutdown(self):
+        pass
+
+
+class ThreadPoolJobBackend(JobBackend):
+    """Runs jobs on a bounded in-process thread pool"""
+
+    def __init__(self, max_workers: int = 4):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+
+    def submit(self, fn: Callable[[], None]):
+        self.executor.submit(fn)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+class JobQueue:
+    """Tracks submitted jobs and runs them on a pluggable backend"""
+
+    def __init__(self, backend: Optional[JobBackend] = None, ttl_seconds: int = 3600):
+        self.backend = backend or ThreadPoolJobBackend()
+        self.ttl_seconds = ttl_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def _evict_finished(self, now: float):
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, work: Callable[[Callable[[str, str], None]], Dict[str, Any]], stages: List[str]) -> Job:
+        """Queue work(report_stage) on the backend and return its job immediately"""
+        job = Job(stages)
+        with self._lock:
+            self._evict_finished(time.time())
+            self._jobs[job.id] = job
+
+        def report_stage(stage: str, status: str):
+            with self._lock:
+                job.stages[stage] = status
+
+        def run():
+            with self._lock:
+                job.status = RUNNING
+            try:
+                result = work(report_stage)
+                with self._lock:
+                    job.result = result
+                    job.status = COMPLETED
+            except Exception as e:
+                log_event('job_failed', job_id=job.id, error=str(e), traceback=traceback.format_exc())
+                with self._lock:
+                    job.error = str(e)
+                    job.status = FAILED
+                    for stage, status in job.stages.items():
+                        if status in (PENDING, RUNNING):
+                            job.stages[stage] = FAILED
+            finally:
+                with self._lock:
+                    job.finished_at = time.time()
+
+        self.backend.submit(run)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
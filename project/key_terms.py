@@ -0,0 +1,108 @@
+import re
+import functools
+from typing import Iterable, List, Optional, Tuple
+
+# Common research keywords to look for
+DEFAULT_RESEARCH_TERMS = [
+    'machine learning', 'artificial intelligence', 'deep learning', 'neural networks',
+    'data analysis', 'algorithm', 'methodology', 'framework', 'model', 'system',
+    'optimization', 'classification', 'prediction', 'analysis', 'detection',
+    'recognition', 'processing', 'mining', 'extraction', 'clustering',
+    'regression', 'validation', 'evaluation', 'performance', 'accuracy',
+    'healthcare', 'medical', 'clinical', 'diagnosis', 'treatment',
+    'image processing', 'natural language', 'computer vision', 'robotics',
+    'database', 'security', 'network', 'software', 'hardware'
+]
+
+CAPITALIZED_WORD_PATTERN = re.compile(r'\b[A-Z][a-z]+\b')
+
+
+def load_vocabulary(path: Optional[str]) -> List[str]:
+    """Default research terms plus one term per line from an optional user vocabulary file"""
+    terms = list(DEFAULT_RESEARCH_TERMS)
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            terms.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return terms
+
+
+def _trie_pattern(node: dict) -> str:
+    """Render a character trie as a regex; '' marks a term ending at this node"""
+    ends_here = '' in node
+    branches = []
+    single_chars = []
+    for char in sorted(key for key in node if key):
+        child = _trie_pattern(node[char])
+        if child:
+            branches.append(re.escape(char) + child)
+        else:
+            single_chars.append(re.escape(char))
+
+    if single_chars:
+        branches.append(single_chars[0] if len(single_chars) == 1 else '[' + ''.join(single_chars) + ']')
+
+    if not branches:
+        return ''
+    pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if ends_here:
+        # Greedy optional: the longest term wins, shorter prefixes are recovered afterwards
+        pattern = '(?:' + pattern + ')?'
+    return pattern
+
+
+class KeyTermExtractor:
+    """Finds every vocabulary term in a text in one regex pass, however large the vocabulary"""
+
+    def __init__(self, vocabulary: Iterable[str], cache_size: int = 1024):
+        # First occurrence wins so results keep the vocabulary's order
+        self.term_index = {}
+        for term in vocabulary:
+            term = term.lower()
+            if term and term not in self.term_index:
+                self.term_index[term] = len(self.term_index)
+        self.terms = list(self.term_index)
+
+        trie: dict = {}
+        for term in self.terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            node[''] = True
+
+        # The prefix trie keeps the pattern linear in vocabulary size and lets the regex
+        # engine reject most start positions on their first character. The zero-width
+        # lookahead reports matches starting at every position, so overlapping terms
+        # ("data analysis" and "analysis") are all found, as with plain substring tests.
+        self.pattern = re.compile('(?=(' + _trie_pattern(trie) + '))') if self.terms else None
+
+        self.extract = functools.lru_cache(maxsize=cache_size)(self._extract)
+
+    def find_terms(self, text: str) -> List[str]:
+        """Vocabulary terms occurring anywhere in the text, in vocabulary order"""
+        if self.pattern is None:
+            return []
+
+        found = set()
+        for match in self.pattern.finditer(text.lower()):
+            longest = match.group(1)
+            # Every term starting here is a prefix of the longest match at this position
+            for end in range(1, len(longest) + 1):
+                index = self.term_index.get(longest[:end])
+                if index is not None:
+                    found.add(index)
+        return [self.terms[index] for index in sorted(found)]
+
+    def _extract(self, summary: str) -> Tuple[str, ...]:
+        found_terms = [term.title() for term in self.find_terms(summary)]
+
+        # Also extract potential domain-specific terms (nouns that appear frequently)
+        word_freq = {}
+        for word in CAPITALIZED_WORD_PATTERN.findall(summary):
+            if len(word) > 3:  # Skip short words
+                word_freq[word] = word_freq.get(word, 0) + 1
+
+        # Add high-frequency domain terms
+        frequent_terms = [word for word, freq in word_freq.items() if freq >= 2]
+        found_terms.extend(frequent_terms[:3])
+
+        return tuple(found_terms[:8]) if found_terms else ('Research', 'Analysis', 'Study')
@@ -0,0 +1,63 @@
+from typing import Dict, List
+
+from prompt_budget import MIN_SENTENCE_WORDS, SentenceRanker
+
+# Sections whose best sentence is always considered first, in this order, when present
+PRIORITY_SECTIONS = ('abstract', 'introduction', 'method', 'result', 'conclusion')
+
+
+def _section_priority(heading: str) -> int:
+    name = heading.lower()
+    for priority, section in enumerate(PRIORITY_SECTIONS):
+        if section in name:
+            return priority
+    return len(PRIORITY_SECTIONS)
+
+
+class LocalSummarizer:
+    """Section-aware extractive summary built from the ranked sentences, without any network call.
+
+    Every section first contributes its best sentence, the abstract, introduction, methods,
+    results and conclusion ahead of the rest; the remaining words go to the highest-ranked
+    sentences overall. The chosen sentences are returned in document order, one paragraph
+    per section."""
+
+    def __init__(self, ranker: SentenceRanker, max_words: int = 400):
+        self.ranker = ranker
+        self.max_words = max_words
+
+    def summarize(self, text: str) -> str:
+        ranked = self.ranker.rank(text)
+        if ranked is None:
+            # Nothing sentence-like (a scanned or table-only paper): fall back to the leading words
+            return ' '.join(text.split()[:self.max_words])
+
+        best_by_section: Dict[str, int] = {}
+        for index in ranked.by_score():
+            best_by_section.setdefault(ranked.sentences[index].heading, index)
+        leads = sorted(best_by_section.values(),
+                       key=lambda index: (_section_priority(ranked.sentences[index].heading), -ranked.scores[index]))
+
+        chosen: List[int] = []
+        words = 0
+        for index in leads + ranked.by_score():
+            if index in chosen or ranked.redundant(chosen, index):
+                continue
+            length = len(ranked.sentences[index].text.split())
+            if words + length > self.max_words:
+                continue
+            chosen.append(index)
+            words += length
+            if self.max_words - words < MIN_SENTENCE_WORDS:
+                break
+
+        paragraphs = []
+        heading = None
+        for index in sorted(chosen):
+            sentence = ranked.sentences[index]
+            if paragraphs and sentence.heading == heading:
+                paragraphs[-1] += ' ' + sentence.text
+            else:
+                paragraphs.append(sentence.text)
+                heading = sentence.heading
+        return '\n\n'.join(paragraphs)
@@ -0,0 +1,225 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Latency buckets in seconds, from fast local stages up to long Gemini calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+TOKEN_BUCKETS = (64, 256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+request_id_var: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+# Structured logs go to stdout as one JSON object per line; create_app can turn them off
+json_logs_enabled = True
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter with labels, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return '\n'.join(lines)
+
+
+class Gauge:
+    """Labelled value that can go up and down, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return '\n'.join(lines)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, rendered in the Prometheus text format"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [count per bucket..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                count = series[len(self.buckets)]
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return '\n'.join(lines)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'analyzer_stage_seconds', 'Wall time of each analysis stage', ['stage'])
+STAGE_ERRORS = REGISTRY.counter(
+    'analyzer_stage_errors_total', 'Analysis stages that raised', ['stage'])
+PDF_PAGE_SECONDS = REGISTRY.histogram(
+    'pdf_page_extract_seconds', 'Text extraction time per PDF page')
+GEMINI_SECONDS = REGISTRY.histogram(
+    'gemini_request_seconds', 'Latency of each Gemini HTTP attempt', ['stage', 'status'])
+GEMINI_BYTES = REGISTRY.counter(
+    'gemini_bytes_total', 'Request and response body bytes exchanged with Gemini', ['stage', 'direction'])
+GEMINI_TOKENS = REGISTRY.histogram(
+    'gemini_tokens', 'Prompt and response token counts reported by Gemini', ['stage', 'kind'], TOKEN_BUCKETS)
+GEMINI_RETRIES = REGISTRY.counter(
+    'gemini_retries_total', 'Gemini attempts that were retried', ['stage', 'reason'])
+GEMINI_CALLS = REGISTRY.counter(
+    'gemini_calls_total', 'Gemini generate calls, before retries and hedges', ['stage'])
+GEMINI_HEDGES = REGISTRY.counter(
+    'gemini_hedges_total', 'Duplicate Gemini requests sent after the hedge delay, by which copy answered', ['stage', 'outcome'])
+GEMINI_TIMEOUT_SECONDS = REGISTRY.histogram(
+    'gemini_timeout_seconds', 'Timeout applied to each Gemini call, adaptive or configured', ['stage'])
+PARSE_RESULTS = REGISTRY.counter(
+    'analyzer_parse_total', 'Model responses parsed, by the strategy that succeeded', ['stage', 'strategy'])
+FALLBACKS = REGISTRY.counter(
+    'analyzer_fallbacks_total', 'Times a degraded fallback path produced a result', ['kind'])
+HTTP_SECONDS = REGISTRY.histogram(
+    'http_request_seconds', 'API request latency', ['endpoint', 'method', 'status'])
+PROMPT_EXCERPT_TOKENS = REGISTRY.histogram(
+    'prompt_excerpt_tokens', 'Estimated tokens of the text placed in each prompt slot', ['slot'], TOKEN_BUCKETS)
+UPLOAD_BYTES = REGISTRY.counter(
+    'upload_bytes_total', 'Uploaded file bytes buffered, by where the buffer ended up', ['storage'])
+UPLOAD_BUFFERED_BYTES = REGISTRY.gauge(
+    'upload_buffered_bytes', 'Upload bytes currently held in buffers', ['storage'])
+UPLOAD_REJECTED = REGISTRY.counter(
+    'upload_rejected_total', 'Uploads refused for exceeding the size limit')
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """Adopt the caller's X-Request-ID when given, otherwise mint one, for this context"""
+    request_id = incoming or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    return request_id
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap fn to run in a copy of the caller's context, so worker threads keep the request ID"""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # Each call gets its own copy: one Context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def log_event(event: str, **fields):
+    """Write one structured JSON log line tagged with the current request ID"""
+    if not json_logs_enabled:
+        return
+    record = {'ts': round(time.time(), 3), 'event': event, 'request_id': current_request_id()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+
+@contextmanager
+def timed(stage: str, **fields):
+    """Time a block as an analysis stage: histogram observation, error count and a log line"""
+    started = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except Exception:
+        status = 'error'
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=stage)
+        log_event('stage', stage=stage, status=status, seconds=round(seconds, 4), **fields)
@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+from typing import List, Optional
+
+import numpy as np
+
+from bm25_index import tokenize
+
+# Sentences mentioning these describe how the work was done
+METHOD_CUES = re.compile(
+    r'\b(?:method\w*|approach\w*|propos\w+|algorithm\w*|architecture\w*|framework\w*|model\w*|'
+    r'technique\w*|procedure\w*|pipeline\w*|design\w*|train\w*|introduc\w+|develop\w*|novel)\b',
+    re.IGNORECASE
+)
+
+SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def _to_score(value: float) -> int:
+    """Map a 0-1 novelty measure onto the 1-100 scale the frontend shows"""
+    return int(round(1 + 99 * min(1.0, max(0.0, value))))
+
+
+def _ngrams(tokens: List[str], sizes=(2, 3)) -> set:
+    return {' '.join(tokens[i:i + n]) for n in sizes for i in range(len(tokens) - n + 1)}
+
+
+class NoveltyEngine:
+    """Deterministic novelty scores from a paper's distance to the previously analyzed corpus.
+
+    Term rarity uses the BM25 index's document frequencies, phrase rarity compares the
+    paper's n-grams with its nearest neighbours, and conceptual distance is the cosine
+    distance to those neighbours in the embedding store. Nothing here calls the network."""
+
+    def __init__(self, related_index, embeddings, neighbours: int = 10, min_corpus: int = 5):
+        self.related_index = related_index
+        self.embeddings = embeddings
+        self.neighbours = neighbours
+        self.min_corpus = min_corpus
+
+    def _rarity(self, tokens: List[str], total_docs: int, doc_freqs: dict) -> float:
+        """Term-frequency weighted mean IDF, normalized to 0 (every paper has it) .. 1 (no paper has it)"""
+        if not tokens:
+            return 0.0
+        counts = Counter(tokens)
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        df = np.fromiter((doc_freqs.get(term, 0) for term in counts), dtype=np.float64, count=len(counts))
+        idf = np.log((total_docs + 1) / (df + 1)) / math.log(total_docs + 1)
+        return float(np.dot(tf, idf) / tf.sum())
+
+    def score(self, summary: str, exclude_doc_id: Optional[str] = None) -> Optional[dict]:
+        """Novelty scores with the NoveltyScore field names, or None while the corpus is too small"""
+        tokens = tokenize(summary)
+        total_docs, doc_freqs = self.related_index.document_frequencies(tokens)
+        # The paper itself may already be indexed; do not let it count as its own neighbour
+        if exclude_doc_id and exclude_doc_id in self.related_index:
+            total_docs -= 1
+            doc_freqs = {term: max(0, df - 1) for term, df in doc_freqs.items()}
+        if total_docs < self.min_corpus or not tokens:
+            return None
+
+        method_tokens = [
+            token
+            for sentence in SENTENCE_SPLIT.split(summary) if METHOD_CUES.search(sentence)
+            for token in tokenize(sentence)
+        ] or tokens
+        term_rarity = self._rarity(tokens, total_docs, doc_freqs)
+        method_rarity = self._rarity(method_tokens, total_docs, doc_freqs)
+
+        exclude = [exclude_doc_id] if exclude_doc_id else None
+        hits = [
+            hit for hit in self.embeddings.search(summary, limit=self.neighbours, exclude=exclude)
+            if hit['summary'].strip() != summary.strip()
+        ]
+        similarities = np.array([hit['score'] for hit in hits], dtype=np.float64)
+        nearest = hits[0] if hits else None
+        conceptual_distance = 1.0 - float(np.clip(similarities[:3], 0, 1).mean()) if hits else 1.0
+        relatedness = float(np.clip(similarities[0], 0, 1)) if hits else 0.0
+
+        paper_ngrams = _ngrams(tokens)
+        neighbour_ngrams = set()
+        for hit in hits:
+            neighbour_ngrams |= _ngrams(tokenize(hit['summary']))
+        phrase_rarity = len(paper_ngrams - neighbour_ngrams) / len(paper_ngrams) if paper_ngrams else 0.0
+        method_phrase_rarity = phrase_rarity
+        method_ngrams = _ngrams(method_tokens)
+        if method_ngrams:
+            method_phrase_rarity = len(method_ngrams - neighbour_ngrams) / len(method_ngrams)
+
+        methodological = 0.6 * method_rarity + 0.4 * method_phrase_rarity
+        conceptual = 0.5 * conceptual_distance + 0.3 * term_rarity + 0.2 * phrase_rarity
+        # New work that still connects to an active area of the corpus is the most likely to be
+        # built on; the geometric mean is low for both near-duplicates and unrelated outliers
+        impact = math.sqrt(conceptual * relatedness)
+        overall = 0.4 * conceptual + 0.4 * methodological + 0.2 * impact
+
+        closest = (f"closest is \"{nearest['title']}\" (similarity {nearest['score']:.2f})"
+                   if nearest else "no similar paper found")
+        return {
+            'methodological_score': _to_score(methodological),
+            'conceptual_score': _to_score(conceptual),
+            'impact_score': _to_score(impact),
+            'overall_score': _to_score(overall),
+            'methodological_reason': (
+                f"Methodology vocabulary is {method_rarity:.0%} rare and {method_phrase_rarity:.0%} of its "
+                f"phrases are absent from the {len(hits)} most similar analyzed papers."
+            ),
+            'conceptual_reason': (
+                f"Average distance to the nearest papers is {conceptual_distance:.2f}; {closest}."
+            ),
+            'impact_reason': (
+                f"Combines distance from prior work with relatedness {relatedness:.2f} to the nearest "
+                f"paper, favouring new work in an active area over isolated outliers."
+            ),
+            'overall_assessment': (
+                f"Scored against {total_docs} previously analyzed papers: terms are {term_rarity:.0%} rare "
+                f"overall and {phrase_rarity:.0%} of phrases are new relative to the nearest neighbours."
+            ),
+            'method': 'corpus',
+            'corpus_size': total_docs
+        }
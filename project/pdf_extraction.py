@@ -0,0 +1,129 @@
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from metrics import PDF_PAGE_SECONDS, log_event, timed
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def open_pdf_stream(pdf_file):
+    """Yield a binary stream for a path or file-like object, closing it only if we opened it"""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, 'rb') as stream:
+            yield stream
+    else:
+        yield pdf_file
+
+
+def _decode_pages(pdf_reader, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """Decode pages [start, end) of an open reader as (page_number, text, seconds)"""
+    return list(_iter_decoded(pdf_reader, start, end))
+
+
+def _iter_decoded(pdf_reader, start: int, end: int) -> Iterator[Tuple[int, str, float]]:
+    for page_index in range(start, end):
+        started = time.perf_counter()
+        text = pdf_reader.pages[page_index].extract_text() or ""
+        yield page_index + 1, text, time.perf_counter() - started
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[Tuple[int, str, float]]:
+    """Process pool worker: decode pages [start, end) of the PDF at pdf_path"""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as stream:
+        return _decode_pages(PyPDF2.PdfReader(stream), start, end)
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """Lazily create one shared process pool so workers are not re-spawned per upload"""
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def iter_pdf_pages(pdf_file, workers: int = 1, min_pages_for_parallel: int = 32) -> Iterator[Tuple[int, str]]:
+    """Yield (page_number, text) for each page as it is decoded, page numbers starting at 1.
+
+    Documents of min_pages_for_parallel pages or more are decoded across `workers` processes,
+    one page range each; a range's pages are yielded once it and every range before it are done."""
+    started = time.perf_counter()
+    slowest_page, slowest_seconds, page_count = 0, 0.0, 0
+    for page_number, text, seconds in _iter_timed_pages(pdf_file, workers, min_pages_for_parallel):
+        PDF_PAGE_SECONDS.observe(seconds)
+        if seconds >= slowest_seconds:
+            slowest_page, slowest_seconds = page_number, seconds
+        page_count += 1
+        yield page_number, text
+    if page_count:
+        log_event('pdf_extracted', pages=page_count, seconds=round(time.perf_counter() - started, 4),
+                  slowest_page=slowest_page, slowest_seconds=round(slowest_seconds, 4))
+
+
+def extract_pages(pdf_file, workers: int = 1, min_pages_for_parallel: int = 32) -> List[str]:
+    """Every page's text, in page order"""
+    return [text for _, text in iter_pdf_pages(pdf_file, workers, min_pages_for_parallel)]
+
+
+def _iter_timed_pages(pdf_file, workers: int, min_pages_for_parallel: int) -> Iterator[Tuple[int, str, float]]:
+    import PyPDF2
+
+    with open_pdf_stream(pdf_file) as stream:
+        with timed('pdf_open'):
+            pdf_reader = PyPDF2.PdfReader(stream)
+            page_count = len(pdf_reader.pages)
+
+        # Small documents are decoded in-process, from the reader already open, where
+        # handing pages to worker processes would cost more than it saves. PdfReader
+        # resolves objects lazily, so only the page being decoded is held in memory
+        if workers <= 1 or page_count < min_pages_for_parallel:
+            yield from _iter_decoded(pdf_reader, 0, page_count)
+            return
+
+        if isinstance(pdf_file, (str, os.PathLike)):
+            yield from _iter_in_pool(os.fspath(pdf_file), page_count, workers)
+            return
+
+        # Workers open the document by path, so an upload is written to disk once
+        # rather than pickled to every worker
+        stream.seek(0)
+        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as spool:
+            shutil.copyfileobj(stream, spool)
+    try:
+        yield from _iter_in_pool(spool.name, page_count, workers)
+    finally:
+        os.unlink(spool.name)
+
+
+def _iter_in_pool(pdf_path: str, page_count: int, workers: int) -> Iterator[Tuple[int, str, float]]:
+    """Decode the PDF at pdf_path across the process pool, one page range per worker"""
+    range_count = min(page_count, workers)
+    boundaries = [page_count * i // range_count for i in range(range_count + 1)]
+
+    pool = _get_process_pool(workers)
+    futures = [
+        pool.submit(_extract_page_range, pdf_path, boundaries[i], boundaries[i + 1])
+        for i in range(range_count)
+    ]
+    try:
+        # Collect in submission order, which is page order
+        for future in futures:
+            yield from future.result()
+    finally:
+        # A consumer that stops early does not need the remaining ranges
+        for future in futures:
+            future.cancel()
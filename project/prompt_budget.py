@@ -0,0 +1,311 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Set
+
+from chunking import SENTENCE_BOUNDARY_PATTERN, filter_pages, split_sections
+from metrics import PROMPT_EXCERPT_TOKENS, timed
+from result_cache import content_hash
+
+# Gemini averages about four characters per token on English prose; word counts catch
+# text with many short tokens (numbers, symbols, formulas) that the character ratio underestimates
+CHARS_PER_TOKEN = 4
+TOKENS_PER_WORD = 1.3
+
+WORD_PATTERN = re.compile(r'\S+')
+LETTER_PATTERN = re.compile(r'[A-Za-z]')
+
+# Short lines matching these are page furniture rather than content
+BOILERPLATE_PATTERN = re.compile(
+    r'https?://|www\.|\S+@\S+|\bdoi\b|arxiv|copyright|©|all rights reserved|preprint|under review|'
+    r'licen[cs]e|proceedings of|conference on|journal of|\bvol\.|\bpp\.|^\s*page\s+\d+',
+    re.IGNORECASE
+)
+BOILERPLATE_MAX_WORDS = 12
+# A short line repeated this often is a running header or footer
+REPEATED_LINE_MIN_COUNT = 3
+
+MIN_SENTENCE_WORDS = 5
+MIN_LETTER_RATIO = 0.5
+
+# Sentence graph: each sentence links to its most similar neighbours, built in row blocks
+# so memory stays linear in the number of sentences
+HASH_DIM = 1024
+GRAPH_NEIGHBOURS = 20
+GRAPH_BLOCK_ROWS = 1024
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+# Sentences this similar to one already chosen add little and are skipped
+REDUNDANCY_THRESHOLD = 0.8
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate Gemini token count, erring on the high side"""
+    return math.ceil(max(len(text) / CHARS_PER_TOKEN, len(WORD_PATTERN.findall(text)) * TOKENS_PER_WORD))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Leading text that fits max_tokens, cut at a word boundary"""
+    end = max_tokens * CHARS_PER_TOKEN
+    while end > 0 and estimate_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.9)
+    if end < len(text):
+        cut = text.rfind(' ', 0, end)
+        end = cut if cut > 0 else end
+    return text[:end].rstrip()
+
+
+class Sentence:
+    """One candidate sentence: its text, the section heading it falls under and its token cost"""
+
+    def __init__(self, text: str, heading: str, tokens: int):
+        self.text = text
+        self.heading = heading
+        self.tokens = tokens
+
+
+class RankedText:
+    """A text's sentences in document order, with TextRank scores and each sentence's near-duplicates.
+
+    Only the near-duplicate pairs found among each sentence's graph neighbours are kept, not
+    the sentence vectors, so a cached ranking costs little more than the text itself."""
+
+    def __init__(self, sentences: List[Sentence], scores, duplicates: Dict[int, Set[int]]):
+        self.sentences = sentences
+        self.scores = scores
+        self.duplicates = duplicates
+
+    def by_score(self) -> List[int]:
+        """Sentence indexes, highest score first"""
+        return sorted(range(len(self.sentences)), key=lambda index: -self.scores[index])
+
+    def redundant(self, chosen: List[int], index: int) -> bool:
+        """Whether sentence `index` nearly repeats one already chosen"""
+        partners = self.duplicates.get(index)
+        return bool(partners) and not partners.isdisjoint(chosen)
+
+
+def _content_lines(text: str) -> str:
+    """Text with running headers/footers, page numbers and short boilerplate lines removed"""
+    lines = text.split('\n')
+    counts = Counter(line.strip() for line in lines if line.strip())
+    kept = []
+    for line in lines:
+        stripped = line.strip()
+        if not stripped:
+            kept.append('')
+            continue
+        if not LETTER_PATTERN.search(stripped):
+            continue
+        short = len(stripped.split()) <= BOILERPLATE_MAX_WORDS
+        if short and (counts[stripped] >= REPEATED_LINE_MIN_COUNT or BOILERPLATE_PATTERN.search(stripped)):
+            continue
+        kept.append(line)
+    return '\n'.join(kept)
+
+
+def split_sentences(text: str) -> List[Sentence]:
+    """Content sentences under their section headings, skipping reference lists and page furniture"""
+    sentences = []
+    for heading, body in split_sections(filter_pages([_content_lines(text)])[0]):
+        for paragraph in re.split(r'\n\s*\n', body):
+            # PDF extraction breaks lines mid-sentence; rejoin them before splitting on sentence ends
+            paragraph = ' '.join(paragraph.split())
+            for sentence in SENTENCE_BOUNDARY_PATTERN.split(paragraph):
+                words = sentence.split()
+                if len(words) < MIN_SENTENCE_WORDS:
+                    continue
+                if len(LETTER_PATTERN.findall(sentence)) < MIN_LETTER_RATIO * len(sentence.replace(' ', '')):
+                    continue
+                sentences.append(Sentence(sentence, heading, estimate_tokens(sentence)))
+    return sentences
+
+
+def neighbour_graph(vectors, neighbours: int = GRAPH_NEIGHBOURS):
+    """Each unit row vector's most similar rows and their (non-negative) cosine similarities"""
+    import numpy as np
+
+    count = len(vectors)
+    neighbours = max(0, min(neighbours, count - 1))
+    targets = np.empty((count, neighbours), dtype=np.int64)
+    weights = np.empty((count, neighbours), dtype=np.float64)
+    if neighbours == 0:
+        return targets, weights
+    for start in range(0, count, GRAPH_BLOCK_ROWS):
+        block = vectors[start:start + GRAPH_BLOCK_ROWS] @ vectors.T
+        rows = np.arange(block.shape[0])
+        block[rows, rows + start] = -np.inf
+        nearest = np.argpartition(block, -neighbours, axis=1)[:, -neighbours:]
+        targets[start:start + len(block)] = nearest
+        weights[start:start + len(block)] = np.maximum(np.take_along_axis(block, nearest, axis=1), 0.0)
+    return targets, weights
+
+
+def near_duplicates(targets, weights) -> Dict[int, Set[int]]:
+    """Pairs of graph neighbours more similar than REDUNDANCY_THRESHOLD, in both directions"""
+    import numpy as np
+
+    duplicates: Dict[int, Set[int]] = {}
+    for row, column in zip(*np.nonzero(weights > REDUNDANCY_THRESHOLD)):
+        other = int(targets[row, column])
+        duplicates.setdefault(int(row), set()).add(other)
+        duplicates.setdefault(other, set()).add(int(row))
+    return duplicates
+
+
+def textrank(targets, weights):
+    """PageRank over a k-nearest-neighbour similarity graph from neighbour_graph"""
+    import numpy as np
+
+    count = len(targets)
+    if targets.shape[1] == 0:
+        return np.ones(count, dtype=np.float64)
+
+    out_weight = weights.sum(axis=1)
+    dangling = out_weight == 0
+    transition = weights / np.where(dangling, 1.0, out_weight)[:, None]
+
+    scores = np.full(count, 1.0 / count)
+    for _ in range(MAX_ITERATIONS):
+        spread = np.bincount(targets.ravel(), weights=(transition * scores[:, None]).ravel(), minlength=count)
+        # Sentences with no similar neighbour pass their score to every sentence evenly
+        updated = (1 - DAMPING) / count + DAMPING * (spread + scores[dangling].sum() / count)
+        converged = np.abs(updated - scores).sum() < TOLERANCE
+        scores = updated
+        if converged:
+            break
+    return scores
+
+
+class SentenceRanker:
+    """Ranks a text's sentences by TF-IDF weighted TextRank, caching the result per text.
+
+    Concurrent callers asking for the same text, such as the summary and mind-map prompts
+    built side by side, wait for one ranking instead of each computing it."""
+
+    def __init__(self, cache_size: int = 32):
+        self._vectorizer = None
+        self.cache_size = cache_size
+        # The same paper is ranked for several prompts and the local summary; do it once
+        self._cache: 'OrderedDict[str, Optional[RankedText]]' = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def rank(self, text: str) -> Optional[RankedText]:
+        """The text's ranked sentences, or None when it has no sentence-like content"""
+        key = content_hash(text)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            pending = self._in_flight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._in_flight[key] = Future()
+        if not owner:
+            return pending.result()
+
+        try:
+            ranked = self._rank(text)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._cache[key] = ranked
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            del self._in_flight[key]
+        pending.set_result(ranked)
+        return ranked
+
+    def _rank(self, text: str) -> Optional[RankedText]:
+        sentences = split_sentences(text)
+        if not sentences:
+            return None
+
+        with timed('sentence_rank', sentences=len(sentences)):
+            # NumPy and the vectorizer are only loaded once some text actually needs ranking
+            import numpy as np
+            from embedding_store import HashingVectorizer
+
+            if self._vectorizer is None:
+                self._vectorizer = HashingVectorizer(HASH_DIM)
+            vectors = self._vectorizer.embed([sentence.text for sentence in sentences])
+            # Weight features by inverse sentence frequency so words every sentence shares
+            # (the paper's topic, function words the tokenizer keeps) do not dominate similarity
+            sentence_freq = np.count_nonzero(vectors, axis=0)
+            vectors *= (np.log((len(sentences) + 1) / (sentence_freq + 1)) + 1).astype(np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors /= norms
+            targets, weights = neighbour_graph(vectors)
+            return RankedText(sentences, textrank(targets, weights), near_duplicates(targets, weights))
+
+
+class PromptBudget:
+    """Fits paper and summary text into per-slot token budgets for the Gemini prompts.
+
+    Text that fits is passed through unchanged. Longer text keeps its highest-ranked
+    sentences in document order, under their section headings, or in 'truncate' mode
+    just its leading text."""
+
+    def __init__(self, budgets: Dict[str, int], mode: str = 'ranked', ranker: Optional[SentenceRanker] = None):
+        if mode not in ('ranked', 'truncate'):
+            raise ValueError(f"Prompt excerpt mode must be 'ranked' or 'truncate', got {mode!r}")
+        self.budgets = budgets
+        self.mode = mode
+        self.ranker = ranker or SentenceRanker()
+
+    def excerpt(self, text: str, slot: str) -> str:
+        """The text, or the part of it that best fits the slot's token budget"""
+        max_tokens = self.budgets[slot]
+        if estimate_tokens(text) <= max_tokens:
+            excerpt = text
+        elif self.mode == 'truncate':
+            excerpt = truncate_to_tokens(text, max_tokens)
+        else:
+            excerpt = self.select(text, max_tokens) or truncate_to_tokens(text, max_tokens)
+        PROMPT_EXCERPT_TOKENS.observe(estimate_tokens(excerpt), slot=slot)
+        return excerpt
+
+    def select(self, text: str, max_tokens: int) -> str:
+        """Highest-ranked, non-redundant sentences that fit max_tokens, in document order"""
+        ranked = self.ranker.rank(text)
+        if ranked is None:
+            return ''
+
+        chosen: List[int] = []
+        headings = set()
+        remaining = max_tokens
+        for index in ranked.by_score():
+            sentence = ranked.sentences[index]
+            # A section's heading is printed once, before its first chosen sentence
+            cost = sentence.tokens + (estimate_tokens(sentence.heading) if sentence.heading not in headings else 0)
+            if cost > remaining or ranked.redundant(chosen, index):
+                continue
+            chosen.append(index)
+            headings.add(sentence.heading)
+            remaining -= cost
+            if remaining < MIN_SENTENCE_WORDS * TOKENS_PER_WORD:
+                break
+
+        lines = []
+        heading = previous = None
+        for index in sorted(chosen):
+            sentence = ranked.sentences[index]
+            if sentence.heading != heading:
+                heading = sentence.heading
+                if heading:
+                    lines.append(f"\n{heading}" if lines else heading)
+                lines.append(sentence.text)
+            elif previous is not None and index == previous + 1:
+                lines[-1] += ' ' + sentence.text
+            else:
+                lines.append(sentence.text)
+            previous = index
+        return '\n'.join(lines)
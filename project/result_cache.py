@@ -0,0 +1,200 @@
+import asyncio
+import sqlite3
+import json
+import time
+import hashlib
+import os
+import threading
+import functools
+import inspect
+from typing import Optional, Dict, Any
+
+
+def content_hash(*parts) -> str:
+    """Hash bytes/str parts into a stable hex digest used as the cache address"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(part)
+        # Separator so ("ab", "c") and ("a", "bc") do not collide
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def stream_hash(stream, chunk_size: int = 1024 * 1024) -> str:
+    """Hash a binary stream in fixed-size chunks and rewind it, without loading it whole"""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    # Same trailing separator as content_hash so a stream and its bytes hash identically
+    digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Persistent SQLite cache of analysis results with TTL and size-based LRU eviction"""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: int = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stage_stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)")
+        self._conn.commit()
+
+    def _key(self, stage: str, version: int, digest: str) -> str:
+        return f"{stage}:v{version}:{digest}"
+
+    def _record(self, stage: str, hit: bool):
+        stats = self.stage_stats.setdefault(stage, {'hits': 0, 'misses': 0})
+        if hit:
+            self.hits += 1
+            stats['hits'] += 1
+        else:
+            self.misses += 1
+            stats['misses'] += 1
+
+    def get(self, stage: str, version: int, digest: str) -> Optional[Any]:
+        """Return the cached value for this stage/prompt version/content, or None on a miss"""
+        key = self._key(stage, version, digest)
+        now = time.time()
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    self._conn.commit()
+                self._record(stage, hit=False)
+                return None
+
+            self._conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._record(stage, hit=True)
+            return json.loads(row[0])
+
+    def set(self, stage: str, version: int, digest: str, value: Any):
+        """Store a JSON-serializable value and evict expired or least recently used entries"""
+        key = self._key(stage, version, digest)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, stage, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, stage, json.dumps(value), now, now)
+            )
+            self._conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.ttl_seconds,))
+
+            count = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def get_or_compute(self, stage: str, version: int, digest: str, compute):
+        """Return the cached value or compute, store and return it"""
+        cached = self.get(stage, version, digest)
+        if cached is not None:
+            return cached
+
+        value = compute()
+        self.set(stage, version, digest, value)
+        return value
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current occupancy, for sizing the cache"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            size_bytes = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM results").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size_bytes,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl_seconds,
+            'stages': {stage: dict(counts) for stage, counts in self.stage_stats.items()}
+        }
+
+
+class Uncached:
+    """A degraded result, such as a fallback standing in for a failed Gemini call, that
+    cached_stage returns to the caller without storing"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def _unwrap(value: Any) -> Any:
+    return value.value if isinstance(value, Uncached) else value
+
+
+def cached_stage(stage: str, version: int):
+    """Decorator caching a PDFAnalyzer method on the hash of its string arguments.
+
+    Coroutine methods are cached under the same key as their synchronous twin, so the
+    threaded and asyncio serving modes share results. A method returning Uncached(value)
+    hands back value without it being stored."""
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(self, *args):
+                if self.cache is None:
+                    return _unwrap(await method(self, *args))
+                digest = content_hash(*args)
+                # SQLite calls block and share a lock with the worker threads; keep them off the event loop
+                cached = await asyncio.to_thread(self.cache.get, stage, version, digest)
+                if cached is not None:
+                    return cached
+                value = await method(self, *args)
+                if isinstance(value, Uncached):
+                    return value.value
+                await asyncio.to_thread(self.cache.set, stage, version, digest, value)
+                return value
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            if self.cache is None:
+                return _unwrap(method(self, *args))
+            digest = content_hash(*args)
+            cached = self.cache.get(stage, version, digest)
+            if cached is not None:
+                return cached
+            value = method(self, *args)
+            if isinstance(value, Uncached):
+                return value.value
+            self.cache.set(stage, version, digest, value)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,280 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from difflib import SequenceMatcher
+from typing import List, Optional, Dict, Any
+
+from chunking import filter_pages, split_page_range
+from result_cache import content_hash
+
+# Fraction of pages a new upload must share with an earlier one to count as its revision
+# when the titles differ
+MIN_SHARED_PAGES = 0.3
+
+
+def normalize_page(page: str) -> str:
+    """Whitespace-insensitive page text, so re-extraction noise does not look like an edit"""
+    return re.sub(r'\s+', ' ', page).strip().lower()
+
+
+def title_key(pages: List[str]) -> str:
+    """Normalized title: the first line near the top of the first page that looks like one"""
+    first_page = pages[0] if pages else ''
+    for line in first_page.strip().split('\n')[:20]:
+        line = line.strip()
+        if 10 <= len(line) <= 200 and len(line.split()) >= 3 and not line.lower().startswith(('arxiv', 'doi', 'http')):
+            return re.sub(r'[^a-z0-9]+', ' ', line.lower()).strip()
+    return ''
+
+
+def diff_pages(old_hashes: List[str], new_hashes: List[str]) -> dict:
+    """Page numbers (1-based, in the new revision) that changed or were added, and pages removed"""
+    changed, removed = [], 0
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, old_hashes, new_hashes, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        changed.extend(range(j1 + 1, j2 + 1))
+        removed += max(0, (i2 - i1) - (j2 - j1))
+    return {
+        'changed_pages': changed,
+        'removed_pages': removed,
+        'unchanged_pages': len(new_hashes) - len(changed)
+    }
+
+
+def split_pages(text: str, page_lengths: List[int]) -> List[str]:
+    """Cut extracted text back into its pages"""
+    pages = []
+    offset = 0
+    for length in page_lengths:
+        pages.append(text[offset:offset + length])
+        offset += length
+    return pages
+
+
+class RevisionTracker:
+    """Fingerprints extracted papers by title and page hashes and links uploads of the same paper.
+
+    Each document is keyed by the hash of its extracted text and remembers its page boundaries
+    and the page groups its map-reduce chunks were built from. A later revision reuses every
+    group whose pages are unchanged, so those chunks have identical text and their summaries
+    come straight from the result cache."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                family_id TEXT NOT NULL,
+                title_key TEXT NOT NULL,
+                page_lengths TEXT NOT NULL,
+                page_hashes TEXT NOT NULL,
+                chunk_layout TEXT,
+                added_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_title ON documents (title_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_family ON documents (family_id, added_at)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                page_hash TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                PRIMARY KEY (page_hash, doc_id)
+            ) WITHOUT ROWID
+        """)
+        self._conn.commit()
+
+    def _find_family(self, doc_id: str, key: str, hashes: List[str]) -> Optional[str]:
+        """Family of the closest earlier upload with the same title or enough identical pages"""
+        candidates = set()
+        if key:
+            candidates.update(row[0] for row in self._conn.execute(
+                "SELECT doc_id FROM documents WHERE title_key = ?", (key,)))
+        distinct = list(set(hashes))
+        for start in range(0, len(distinct), 500):
+            batch = distinct[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            candidates.update(row[0] for row in self._conn.execute(
+                f"SELECT DISTINCT doc_id FROM pages WHERE page_hash IN ({placeholders})", batch))
+        candidates.discard(doc_id)
+
+        best_family, best_ratio = None, 0.0
+        for candidate in candidates:
+            family_id, candidate_key, candidate_hashes = self._conn.execute(
+                "SELECT family_id, title_key, page_hashes FROM documents WHERE doc_id = ?", (candidate,)
+            ).fetchone()
+            candidate_hashes = json.loads(candidate_hashes)
+            shared = SequenceMatcher(None, candidate_hashes, hashes, autojunk=False).ratio()
+            if (key and candidate_key == key) or shared >= MIN_SHARED_PAGES:
+                if shared >= best_ratio:
+                    best_family, best_ratio = family_id, shared
+        return best_family
+
+    def register(self, text: str, pages: List[str]) -> str:
+        """Record an extracted paper's page boundaries and link it to earlier revisions; returns its doc_id"""
+        doc_id = content_hash(text)
+        hashes = [content_hash(normalize_page(page)) for page in pages]
+        key = title_key(pages)
+
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)).fetchone():
+                return doc_id
+            family_id = self._find_family(doc_id, key, hashes) or doc_id
+            self._conn.execute(
+                "INSERT INTO documents (doc_id, family_id, title_key, page_lengths, page_hashes, added_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                # Extraction joins pages with a newline each, which the lengths include
+                (doc_id, family_id, key, json.dumps([len(page) + 1 for page in pages]), json.dumps(hashes), time.time())
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO pages (page_hash, doc_id) VALUES (?, ?)",
+                [(page_hash, doc_id) for page_hash in set(hashes)]
+            )
+            self._conn.commit()
+        return doc_id
+
+    def _document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT doc_id, family_id, page_lengths, page_hashes, chunk_layout, added_at FROM documents WHERE doc_id = ?",
+            (doc_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'doc_id': row[0],
+            'family_id': row[1],
+            'page_lengths': json.loads(row[2]),
+            'page_hashes': json.loads(row[3]),
+            'chunk_layout': json.loads(row[4]) if row[4] else None,
+            'added_at': row[5]
+        }
+
+    def previous_revision(self, text: str) -> Optional[Dict[str, Any]]:
+        """The most recent earlier revision of this paper, preferring one with a stored chunk layout"""
+        with self._lock:
+            document = self._document(content_hash(text))
+            if document is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT doc_id FROM documents WHERE family_id = ? AND doc_id != ? AND added_at <= ? "
+                "ORDER BY chunk_layout IS NULL, added_at DESC LIMIT 1",
+                (document['family_id'], document['doc_id'], document['added_at'])
+            ).fetchall()
+            return self._document(rows[0][0]) if rows else None
+
+    def is_registered(self, text: str) -> bool:
+        with self._lock:
+            return self._document(content_hash(text)) is not None
+
+    def changed_pages(self, text: str) -> Optional[Dict[str, Any]]:
+        """This revision's pages that differ from the previous revision, keyed by page number.
+
+        Returns None for texts that were never registered or have no earlier revision."""
+        with self._lock:
+            document = self._document(content_hash(text))
+        if document is None:
+            return None
+        previous = self.previous_revision(text)
+        if previous is None:
+            return None
+
+        pages = split_pages(text, document['page_lengths'])
+        diff = diff_pages(previous['page_hashes'], document['page_hashes'])
+        return {
+            'revision_of': previous['doc_id'],
+            'pages': {number: pages[number - 1] for number in diff['changed_pages']},
+            'removed_pages': diff['removed_pages'],
+            'total_pages': len(pages)
+        }
+
+    def plan_chunks(self, text: str, max_chars: int) -> Optional[Dict[str, Any]]:
+        """Page-aligned chunks for a tracked paper, reusing the previous revision's unchanged page groups.
+
+        Returns None for texts that were never registered (their page boundaries are unknown)."""
+        with self._lock:
+            document = self._document(content_hash(text))
+        if document is None:
+            return None
+        previous = self.previous_revision(text)
+
+        pages = split_pages(text, document['page_lengths'])
+        hashes = document['page_hashes']
+        page_texts = filter_pages(pages)
+
+        # Groups from the previous layout, looked up by their first page
+        previous_groups: Dict[str, List[List[str]]] = {}
+        for group in (previous or {}).get('chunk_layout') or []:
+            previous_groups.setdefault(group[0], []).append(group)
+
+        groups: List[List[int]] = []
+        reused = 0
+        pending: List[int] = []
+
+        def flush_pending():
+            # Changed pages are packed into new groups by size, as map-reduce would
+            current, size = [], 0
+            for index in pending:
+                if current and size + len(page_texts[index]) > max_chars:
+                    groups.append(current)
+                    current, size = [], 0
+                current.append(index)
+                size += len(page_texts[index])
+            if current:
+                groups.append(current)
+            pending.clear()
+
+        index = 0
+        while index < len(pages):
+            match = None
+            for group in sorted(previous_groups.get(hashes[index], []), key=len, reverse=True):
+                if hashes[index:index + len(group)] == group:
+                    match = group
+                    break
+            if match:
+                flush_pending()
+                groups.append(list(range(index, index + len(match))))
+                reused += 1
+                index += len(match)
+            else:
+                pending.append(index)
+                index += 1
+        flush_pending()
+
+        chunks = []
+        for group in groups:
+            chunks.extend(split_page_range(''.join(page_texts[i] for i in group), max_chars))
+
+        plan = {
+            'doc_id': document['doc_id'],
+            'chunks': chunks,
+            'layout': [[hashes[i] for i in group] for group in groups],
+            'reused_groups': reused,
+            'total_groups': len(groups)
+        }
+        if previous is not None:
+            plan['revision_of'] = previous['doc_id']
+            plan.update(diff_pages(previous['page_hashes'], hashes))
+        return plan
+
+    def save_layout(self, doc_id: str, layout: List[List[str]]):
+        """Remember the page groups a paper's chunks were built from, for its next revision"""
+        with self._lock:
+            self._conn.execute("UPDATE documents SET chunk_layout = ? WHERE doc_id = ?", (json.dumps(layout), doc_id))
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            documents, families = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT family_id) FROM documents"
+            ).fetchone()
+        return {'documents': documents, 'families': families}
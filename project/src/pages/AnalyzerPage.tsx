@@ -33,53 +33,29 @@ const AnalyzerPage: React.FC = () => {
     setError('');
     
     try {
-      // Step 1: Extract text
-      setProcessingStep('Extracting text from PDF...');
+      // Text extraction and every analysis stage run server-side in one request;
+      // the backend overlaps the mind map with the summary and fans out the rest.
+      setProcessingStep('Analyzing research paper...');
       const formData = new FormData();
       formData.append('file', file);
       
-      const textResponse = await axios.post(`${API_URL}/extract-text`, formData, {
+      const analysisResponse = await axios.post(`${API_URL}/analyze`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data'
         }
       });
       
-      const extractedText = textResponse.data.text;
+      const extractedText = analysisResponse.data.text;
       setExtractedText(extractedText);
       
-      // Step 2: Generate summary
-      setProcessingStep('Generating research summary...');
-      const summaryResponse = await axios.post(`${API_URL}/generate-summary`, {
-        text: extractedText
-      });
-      
-      // Step 3: Generate mind map
-      setProcessingStep('Creating mind map visualization...');
-      const mindmapResponse = await axios.post(`${API_URL}/generate-mindmap`, {
-        text: extractedText
-      });
-      
-      // Step 4: Find related articles
-      setProcessingStep('Finding related research articles...');
-      const articlesResponse = await axios.post(`${API_URL}/find-related-articles`, {
-        summary: summaryResponse.data.summary
-      });
-      
-      // Step 5: Calculate novelty score
-      setProcessingStep('Calculating research novelty score...');
-      const noveltyResponse = await axios.post(`${API_URL}/calculate-novelty`, {
-        text: extractedText,
-        summary: summaryResponse.data.summary
-      });
-      
       // Store all results in context
       setAnalysisData({
         fileName: file.name,
         extractedText: extractedText,
-        summary: summaryResponse.data.summary,
-        mindmap: mindmapResponse.data.mindmap,
-        articles: articlesResponse.data.articles,
-        novelty: noveltyResponse.data.novelty
+        summary: analysisResponse.data.summary,
+        mindmap: analysisResponse.data.mindmap,
+        articles: analysisResponse.data.articles,
+        novelty: analysisResponse.data.novelty
       });
       
       // Navigate to results page
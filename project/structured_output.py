@@ -0,0 +1,253 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, List, Optional, Tuple
+
+from metrics import PARSE_RESULTS, log_event
+
+NOVELTY_SCORE_FIELDS = ['methodological_score', 'conceptual_score', 'impact_score', 'overall_score']
+NOVELTY_REASON_FIELDS = ['methodological_reason', 'conceptual_reason', 'impact_reason', 'overall_assessment']
+
+# Ways a response can be parsed, in the order they are tried
+DIRECT = 'direct'        # the whole response is the value
+FENCED = 'fenced'        # the value sits in a ``` code fence
+EMBEDDED = 'embedded'    # the value is surrounded by prose
+FALLBACK = 'fallback'    # an endpoint-specific lenient parser produced it
+
+# Only these characters change the scanner's state; everything else is skipped by the regex engine
+SIGNIFICANT = re.compile(r'```|[{}\[\]"]')
+# A JSON string body; the alternatives are disjoint so matching is linear
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+CLOSERS = {'}': '{', ']': '['}
+
+_strategy_counts: Counter = Counter()
+_strategy_lock = threading.Lock()
+
+
+class StructuredOutputError(ValueError):
+    """Raised when no strategy yields a value that passes the endpoint's schema"""
+
+
+class ParseResult:
+    """A parsed and validated response value and the strategy that produced it"""
+
+    def __init__(self, value: Any, strategy: str):
+        self.value = value
+        self.strategy = strategy
+
+
+class Fence:
+    """A ``` code block: its language tag and the offsets of its content"""
+
+    def __init__(self, lang: str, start: int, end: int):
+        self.lang = lang
+        self.start = start
+        self.end = end
+
+
+def scan(text: str) -> Tuple[List[Fence], List[Tuple[int, int]]]:
+    """One left-to-right pass finding code fences and top-level balanced {...}/[...] spans.
+
+    Brackets and fences inside JSON strings are ignored, and every character is visited
+    a bounded number of times, so the cost is linear in the response length however
+    malformed it is. Balanced spans nested in an opener that never closes, such as a
+    stray '[' in prose, count as top-level."""
+    fences: List[Fence] = []
+    spans: List[Tuple[int, int]] = []
+    # Open brackets and their offsets
+    stack: List[Tuple[str, int]] = []
+    # Balanced spans closed while an outer bracket was still open, as (depth, start, end);
+    # kept in text order and disjoint, and promoted to spans if that bracket is abandoned
+    nested: List[Tuple[int, int, int]] = []
+    fence_lang, fence_start = None, 0
+
+    def abandon():
+        spans.extend((start, end) for _, start, end in nested)
+        nested.clear()
+        stack.clear()
+
+    pos = 0
+    while True:
+        match = SIGNIFICANT.search(text, pos)
+        if match is None:
+            break
+        token, index = match.group(), match.start()
+
+        if token == '```':
+            # Not valid inside JSON, so any open bracket was prose
+            abandon()
+            if fence_lang is None:
+                line_end = text.find('\n', index)
+                line_end = len(text) if line_end == -1 else line_end
+                fence_lang = text[index + 3:line_end].strip().lower()
+                fence_start = pos = min(line_end + 1, len(text))
+            else:
+                fences.append(Fence(fence_lang, fence_start, index))
+                fence_lang = None
+                pos = index + 3
+        elif token == '"':
+            if stack:
+                string = STRING.match(text, index)
+                if string is None:
+                    # Unterminated string: nothing after this can close the span
+                    break
+                pos = string.end()
+            else:
+                pos = index + 1
+        elif token in '{[':
+            stack.append((token, index))
+            pos = index + 1
+        else:
+            if stack and stack[-1][0] == CLOSERS[token]:
+                _, start = stack.pop()
+                depth = len(stack)
+                # Spans inside this one are superseded by it
+                while nested and nested[-1][0] > depth:
+                    nested.pop()
+                if depth:
+                    nested.append((depth, start, index + 1))
+                else:
+                    spans.append((start, index + 1))
+            else:
+                # Mismatched bracket: abandon this span and start looking afresh
+                abandon()
+            pos = index + 1
+
+    abandon()
+    if fence_lang is not None:
+        # An unclosed fence runs to the end of the response
+        fences.append(Fence(fence_lang, fence_start, len(text)))
+    return fences, spans
+
+
+def _record(stage: str, strategy: str):
+    with _strategy_lock:
+        _strategy_counts[(stage, strategy)] += 1
+    PARSE_RESULTS.inc(stage=stage, strategy=strategy)
+    log_event('parse', stage=stage, strategy=strategy)
+
+
+def strategy_stats() -> dict:
+    """How often each strategy produced the value, per stage"""
+    stats: dict = {}
+    with _strategy_lock:
+        for (stage, strategy), count in _strategy_counts.items():
+            stats.setdefault(stage, {})[strategy] = count
+    return stats
+
+
+def parse_json_response(text: str, stage: str, validate: Optional[Callable[[Any], Any]] = None,
+                        fallback: Optional[Callable[[str], Any]] = None) -> ParseResult:
+    """Parse the first JSON value in a model response that passes `validate`.
+
+    Tries the whole response, then each balanced span in order (reported as fenced when it
+    lies inside a code fence), then the endpoint's lenient `fallback` parser if it has one."""
+    validate = validate or (lambda value: value)
+    errors = []
+
+    def attempt(candidate: str) -> Tuple[bool, Any]:
+        try:
+            return True, validate(json.loads(candidate))
+        except (json.JSONDecodeError, ValueError, TypeError, KeyError) as e:
+            errors.append(str(e))
+            return False, None
+
+    stripped = text.strip()
+    if stripped[:1] in ('{', '['):
+        ok, value = attempt(stripped)
+        if ok:
+            _record(stage, DIRECT)
+            return ParseResult(value, DIRECT)
+
+    fences, spans = scan(text)
+    for start, end in spans:
+        ok, value = attempt(text[start:end])
+        if ok:
+            inside_fence = any(fence.start <= start and end <= fence.end for fence in fences)
+            strategy = FENCED if inside_fence else EMBEDDED
+            _record(stage, strategy)
+            return ParseResult(value, strategy)
+
+    if fallback is not None:
+        value = fallback(text)
+        if value:
+            _record(stage, FALLBACK)
+            return ParseResult(value, FALLBACK)
+
+    raise StructuredOutputError(
+        f"No valid {stage} JSON in response" + (f": {errors[-1]}" if errors else "")
+    )
+
+
+def parse_mermaid_response(text: str, stage: str = 'mindmap') -> ParseResult:
+    """Extract Mermaid mind map code from a fenced block, the bare response, or surrounding prose"""
+    stripped = text.strip()
+    if stripped.startswith('mindmap'):
+        # A stray closing fence after the code is not part of it
+        end = stripped.find('```')
+        _record(stage, DIRECT)
+        return ParseResult(stripped[:end].strip() if end != -1 else stripped, DIRECT)
+
+    fences, _ = scan(text)
+    for fence in fences:
+        content = text[fence.start:fence.end].strip()
+        if fence.lang in ('mermaid', '') and content.startswith('mindmap'):
+            _record(stage, FENCED)
+            return ParseResult(content, FENCED)
+
+    # Prose before the code: take everything from the 'mindmap' line up to the next fence
+    match = re.search(r'^[ \t]*mindmap\b', text, re.MULTILINE)
+    if match:
+        end = text.find('```', match.end())
+        code = text[match.start():end if end != -1 else len(text)].strip()
+        _record(stage, EMBEDDED)
+        return ParseResult(code, EMBEDDED)
+
+    _record(stage, FALLBACK)
+    return ParseResult(text.replace('```', '').replace('mermaid', '').strip(), FALLBACK)
+
+
+def validate_articles(data: Any) -> list:
+    """Related-article schema: a non-empty list of objects with a title and a description"""
+    if isinstance(data, dict) and isinstance(data.get('articles'), list):
+        data = data['articles']
+    if not isinstance(data, list):
+        raise ValueError("Related articles are not a JSON array")
+
+    articles = [
+        article for article in data
+        if isinstance(article, dict)
+        and isinstance(article.get('title'), str) and article['title'].strip()
+        and isinstance(article.get('description'), str) and article['description'].strip()
+    ]
+    if not articles:
+        raise ValueError("No related article has both a title and a description")
+    return articles
+
+
+def validate_novelty(data: Any) -> dict:
+    """Novelty schema: four 1-100 scores plus reason strings, with scores coerced to integers"""
+    if not isinstance(data, dict):
+        raise ValueError("Novelty is not a JSON object")
+
+    normalized = {}
+    for field in NOVELTY_SCORE_FIELDS:
+        try:
+            score = int(round(float(data[field])))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Novelty field '{field}' is missing or not a number")
+        normalized[field] = max(1, min(100, score))
+    for field in NOVELTY_REASON_FIELDS:
+        normalized[field] = str(data.get(field, '')).strip()
+    return normalized
+
+
+def validate_novelty_reasons(data: Any) -> dict:
+    """Novelty explanation schema: at least one of the reason fields as text"""
+    if not isinstance(data, dict):
+        raise ValueError("Novelty explanation is not a JSON object")
+    reasons = {field: str(data[field]).strip() for field in NOVELTY_REASON_FIELDS if data.get(field)}
+    if not reasons:
+        raise ValueError("Novelty explanation has no reason fields")
+    return reasons
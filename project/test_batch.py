@@ -0,0 +1,72 @@
+import json
+import os
+
+import app
+from batch import BatchRunner
+from benchmark import make_sample_pdf
+from result_cache import ResultCache
+from revisions import RevisionTracker
+
+
+class SummaryOnlyAnalyzer(app.PDFAnalyzer):
+    """PDFAnalyzer whose analysis is a stand-in summary, counting the papers it is given"""
+
+    def __init__(self, **kwargs):
+        super().__init__(gemini=object(), **kwargs)
+        self.analyzed = []
+
+    def analyze_paper(self, text, report_stage=None, mode=None, combined=None):
+        self.analyzed.append(text)
+        return {'summary': f"Summary of {len(text)} characters."}
+
+
+def write_pdf(directory, name, title):
+    path = directory / name
+    path.write_bytes(make_sample_pdf(title, [[f"{title} page one."], [f"{title} page two."]]))
+    return str(path)
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_unreadable_file_is_recorded_and_batch_continues(tmp_path):
+    good = write_pdf(tmp_path, 'good.pdf', "A Readable Paper About Batches")
+    broken = str(tmp_path / 'broken.pdf')
+    os.symlink(str(tmp_path / 'deleted.pdf'), broken)
+    output = str(tmp_path / 'results.jsonl')
+
+    analyzer = SummaryOnlyAnalyzer()
+    summary = BatchRunner(analyzer, output, workers=1, extract_workers=1).run([broken, good])
+
+    assert summary['succeeded'] == 1
+    assert summary['failed'] == 1
+    records = {record['file']: record for record in read_records(output)}
+    assert records[broken]['status'] == 'error'
+    assert records[broken]['error'].startswith("Error reading PDF")
+    assert records[good]['status'] == 'ok'
+    assert len(analyzer.analyzed) == 1
+
+
+def test_batch_extraction_is_cached_and_fingerprinted(tmp_path):
+    paths = [write_pdf(tmp_path, f'paper-{number}.pdf', f"Batch Paper Number {number} On Caching")
+             for number in range(3)]
+    cache = ResultCache(str(tmp_path / 'results.sqlite3'))
+    revisions = RevisionTracker(str(tmp_path / 'revisions.sqlite3'))
+
+    analyzer = SummaryOnlyAnalyzer(cache=cache, revisions=revisions)
+    first = BatchRunner(analyzer, str(tmp_path / 'first.jsonl'), workers=1, extract_workers=1).run(paths)
+
+    assert first['succeeded'] == 3
+    assert all(revisions.is_registered(text) for text in analyzer.analyzed)
+    assert cache.stats()['stages']['extract_text'] == {'hits': 0, 'misses': 3}
+
+    # A second batch over the same files, and an upload of one of them, reuse the extracted text
+    second = BatchRunner(analyzer, str(tmp_path / 'second.jsonl'), workers=1, extract_workers=1).run(paths)
+    with open(paths[0], 'rb') as f:
+        uploaded = analyzer.extract_pdf_text(f)
+
+    assert second['succeeded'] == 3
+    assert uploaded in analyzer.analyzed
+    assert cache.stats()['stages']['extract_text'] == {'hits': 4, 'misses': 3}
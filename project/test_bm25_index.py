@@ -0,0 +1,81 @@
+import math
+from collections import Counter
+
+import pytest
+
+from bm25_index import BM25Index, tokenize
+
+CORPUS = {
+    'transformers': ("Attention Is All You Need",
+                     "Transformer networks replace recurrence with self attention for translation."),
+    'resnet': ("Deep Residual Learning",
+               "Residual connections let very deep convolutional networks train for image recognition."),
+    'bert': ("BERT",
+             "Bidirectional transformer pretraining with masked language modeling improves language understanding."),
+    'protein': ("Protein Folding",
+                "Predicting protein structure from amino acid sequences with attention over residues."),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BM25Index(str(tmp_path / 'related.sqlite3'))
+    for doc_id, (title, summary) in CORPUS.items():
+        index.add(doc_id, title, summary)
+    return index
+
+
+def reference_scores(query, k1=1.5, b=0.75):
+    """Textbook BM25 over the same corpus, computed in memory"""
+    documents = {doc_id: Counter(tokenize(f"{title}\n{summary}\n")) for doc_id, (title, summary) in CORPUS.items()}
+    average_length = sum(sum(counts.values()) for counts in documents.values()) / len(documents)
+    scores = {}
+    for term, query_tf in Counter(tokenize(query)).items():
+        df = sum(1 for counts in documents.values() if term in counts)
+        if df == 0:
+            continue
+        idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+        for doc_id, counts in documents.items():
+            tf = counts[term]
+            if tf:
+                length = sum(counts.values())
+                norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm * query_tf
+    return scores
+
+
+def test_ranks_small_corpus_like_reference_bm25(index):
+    query = "transformer attention for language understanding"
+    expected = sorted(reference_scores(query).items(), key=lambda item: item[1], reverse=True)
+
+    hits = index.search(query, limit=10)
+
+    assert [hit['doc_id'] for hit in hits] == [doc_id for doc_id, _ in expected]
+    assert [hit['score'] for hit in hits] == pytest.approx([score for _, score in expected], abs=1e-4)
+    assert hits[0]['doc_id'] == 'bert'
+
+
+def test_rare_term_outweighs_common_one(index):
+    # "networks" is in two papers, "residual" only in one
+    hits = index.search("residual networks", limit=2)
+
+    assert [hit['doc_id'] for hit in hits] == ['resnet', 'transformers']
+
+
+def test_exclude_and_limit(index):
+    hits = index.search("transformer attention", limit=2, exclude={'bert'})
+
+    assert len(hits) == 2
+    assert 'bert' not in [hit['doc_id'] for hit in hits]
+
+
+def test_reindexing_replaces_old_postings(index):
+    index.add('protein', "Protein Folding", "Graph neural networks over molecules.")
+
+    assert 'protein' not in [hit['doc_id'] for hit in index.search("amino acid sequences")]
+    assert index.search("molecules")[0]['doc_id'] == 'protein'
+
+
+def test_stopword_only_and_unknown_queries_return_nothing(index):
+    assert index.search("the and with") == []
+    assert index.search("quantum chromodynamics") == []
@@ -0,0 +1,72 @@
+import types
+
+import pytest
+
+import document_store
+from document_store import DocumentStore
+
+
+class Clock:
+    """Stands in for time.time so TTLs and access order need no sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(document_store, 'time', types.SimpleNamespace(time=clock))
+    return clock
+
+
+def test_least_recently_used_document_is_evicted_first(clock):
+    store = DocumentStore(max_documents=2)
+    first = store.add("first paper")
+    second = store.add("second paper")
+    # Reading the first makes the second the least recently used
+    assert store.get(first)['text'] == "first paper"
+
+    third = store.add("third paper")
+
+    assert store.get(second) is None
+    assert store.get(first)['text'] == "first paper"
+    assert store.get(third)['text'] == "third paper"
+    assert store.stats()['documents'] == 2
+
+
+def test_document_expires_after_ttl_without_access(clock):
+    store = DocumentStore(ttl_seconds=60)
+    document_id = store.add("paper", title="A Paper")
+
+    clock.now += 60
+    assert store.get(document_id)['title'] == "A Paper"
+
+    clock.now += 61
+    assert store.get(document_id) is None
+    assert store.stats()['documents'] == 0
+
+
+def test_reading_a_document_extends_its_ttl(clock):
+    store = DocumentStore(ttl_seconds=60)
+    kept = store.add("kept paper")
+    dropped = store.add("dropped paper")
+
+    clock.now += 45
+    store.get(kept)
+    clock.now += 45
+
+    assert store.get(dropped) is None
+    assert store.get(kept)['text'] == "kept paper"
+
+
+def test_update_attaches_fields_to_known_documents_only(clock):
+    store = DocumentStore()
+    document_id = store.add("paper")
+
+    assert store.update(document_id, summary="short")
+    assert store.get(document_id)['summary'] == "short"
+    assert not store.update("missing", summary="short")
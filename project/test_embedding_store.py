@@ -0,0 +1,48 @@
+import numpy as np
+
+from embedding_store import EmbeddingStore
+
+VECTORS = {
+    'query': [1.0, 0.0],
+    'same topic': [0.8, 0.6],
+    'loosely related': [0.3, 0.954],
+    'unrelated': [0.0, 1.0],
+    'opposite': [-1.0, 0.0],
+}
+
+
+class StubEmbedder:
+    """Looks up a fixed vector by the last line of the text (the summary for stored papers)"""
+    dim = 2
+
+    def embed(self, texts):
+        return np.array([VECTORS[text.splitlines()[-1]] for text in texts], dtype=np.float32)
+
+
+def make_store(tmp_path, **kwargs):
+    store = EmbeddingStore(str(tmp_path), StubEmbedder(), **kwargs)
+    for summary in VECTORS:
+        if summary != 'query':
+            store.add(summary, summary.title(), summary)
+    return store
+
+
+def test_search_drops_zero_and_negative_scores(tmp_path):
+    store = make_store(tmp_path)
+
+    hits = store.search('query', limit=10)
+
+    assert [hit['doc_id'] for hit in hits] == ['same topic', 'loosely related']
+    assert all(hit['score'] > 0 for hit in hits)
+
+
+def test_search_applies_minimum_score(tmp_path):
+    store = make_store(tmp_path, min_score=0.5)
+
+    assert [hit['doc_id'] for hit in store.search('query', limit=10)] == ['same topic']
+
+
+def test_search_returns_nothing_when_no_paper_is_similar(tmp_path):
+    store = make_store(tmp_path, min_score=0.9)
+
+    assert store.search('query', limit=10) == []
@@ -0,0 +1,47 @@
+import inspect
+
+import pytest
+
+import app
+from fake_gemini import detect_stage
+
+PAPER = "Protein structure prediction with attention. " * 200
+
+# The stage each of PDFAnalyzer's prompt builders must be recognised as
+PROMPT_STAGES = {
+    '_build_summary_prompt': 'summary',
+    '_build_chunk_prompt': 'summary_chunk',
+    '_build_reduce_prompt': 'summary_reduce',
+    '_build_revision_summary_prompt': 'summary_revision',
+    '_build_mindmap_prompt': 'mindmap',
+    '_build_related_articles_prompt': 'related_articles',
+    '_build_related_articles_retry_prompt': 'related_articles',
+    '_build_novelty_prompt': 'novelty',
+    '_build_novelty_explanation_prompt': 'novelty_explanation',
+    '_build_combined_prompt': 'combined',
+}
+
+ARGUMENTS = {
+    'text': PAPER,
+    'chunk': PAPER,
+    'summary': "The paper predicts protein structure with attention.",
+    'condensed': "Part 1: the method. Part 2: the results.",
+    'scores_json': '{"overall_score": 70}',
+    'previous_summary': "The paper predicts protein structure with attention.",
+    'changes': {'pages': {3: "Page three now reports a larger benchmark."}, 'removed_pages': 0, 'total_pages': 12},
+}
+
+
+def test_every_prompt_builder_has_an_expected_stage():
+    builders = {name for name, _ in inspect.getmembers(app.PDFAnalyzer, inspect.isfunction)
+                if name.startswith('_build_') and name.endswith('_prompt')}
+    assert builders == set(PROMPT_STAGES)
+
+
+@pytest.mark.parametrize('builder, stage', sorted(PROMPT_STAGES.items()))
+def test_detect_stage_recognises_prompt(builder, stage):
+    analyzer = app.PDFAnalyzer(cache=None, gemini=None, revisions=None)
+    method = getattr(analyzer, builder)
+    prompt = method(*[ARGUMENTS[name] for name in inspect.signature(method).parameters])
+
+    assert detect_stage(prompt) == stage
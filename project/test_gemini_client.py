@@ -0,0 +1,235 @@
+import asyncio
+import itertools
+import json
+import time
+
+import pytest
+
+from fake_gemini import FakeGeminiConfig, FakeGeminiServer
+from gemini_client import GeminiClient, GeminiError, MalformedResponseError
+
+STAGE = 'summary'
+HEDGE_DELAY = 0.05
+
+
+class StubResponse:
+    """A generateContent 200 response whose text names the copy that sent it"""
+
+    def __init__(self, copy):
+        self.status_code = 200
+        self.headers = {}
+        self._result = {'candidates': [{'content': {'parts': [{'text': f'copy {copy}'}]}}]}
+        self.content = json.dumps(self._result).encode('utf-8')
+        self.text = self.content.decode('utf-8')
+
+    def json(self):
+        return self._result
+
+
+class TruncatedResponse(StubResponse):
+    """A 200 response whose body was cut off mid-transfer"""
+
+    def __init__(self, copy):
+        super().__init__(copy)
+        self.content = self.content[:20]
+        self.text = self.content.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class SequenceSession:
+    """Answers each request with the next response class in line"""
+
+    def __init__(self, responses):
+        self.responses = iter(responses)
+        self._copies = itertools.count()
+
+    def post(self, url, params=None, data=None, timeout=None):
+        return next(self.responses)(next(self._copies))
+
+
+class StubSession:
+    """Answers the n-th request after delays[n] seconds"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self._copies = itertools.count()
+
+    def post(self, url, params=None, data=None, timeout=None):
+        copy = next(self._copies)
+        time.sleep(self.delays[copy])
+        return StubResponse(copy)
+
+
+class StubAsyncClient:
+    """StubSession for the event loop, remembering which requests were cancelled"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.cancelled = []
+        self._copies = itertools.count()
+
+    async def post(self, url, params=None, content=None, timeout=None):
+        copy = next(self._copies)
+        try:
+            await asyncio.sleep(self.delays[copy])
+        except asyncio.CancelledError:
+            self.cancelled.append(copy)
+            raise
+        return StubResponse(copy)
+
+
+def make_client(hedge_budget=1.0):
+    client = GeminiClient('key', 'http://gemini.invalid', max_retries=0, hedge_quantile=0.95,
+                          hedge_budget=hedge_budget)
+    for _ in range(client.latency.min_samples):
+        client.latency.observe(STAGE, HEDGE_DELAY, 0)
+    return client
+
+
+def hedges(client):
+    return client.stats()['stages'][STAGE]['hedges']
+
+
+def test_hedge_wins_when_primary_is_slow():
+    client = make_client()
+    client.session = StubSession([1.0, 0.0])
+
+    assert client.generate('prompt', stage=STAGE) == 'copy 1'
+    assert hedges(client) == {'sent': 1, 'hedge_won': 1}
+
+
+def test_primary_wins_when_it_answers_first():
+    client = make_client()
+    client.session = StubSession([0.2, 1.0])
+
+    assert client.generate('prompt', stage=STAGE) == 'copy 0'
+    assert hedges(client) == {'sent': 1, 'primary_won': 1}
+
+
+def test_fast_primary_is_not_hedged():
+    client = make_client()
+    client.session = StubSession([0.0])
+
+    assert client.generate('prompt', stage=STAGE) == 'copy 0'
+    assert hedges(client) == {}
+
+
+def test_hedge_budget_caps_duplicates():
+    client = make_client(hedge_budget=0.1)
+    client.session = StubSession([0.2])
+
+    assert client.generate('prompt', stage=STAGE) == 'copy 0'
+    assert hedges(client) == {'over_budget': 1}
+
+
+def test_async_hedge_cancels_losing_copy():
+    client = make_client()
+    stub = StubAsyncClient([1.0, 0.0])
+
+    async def run():
+        semaphore = asyncio.Semaphore(client.max_concurrency)
+        client._async_session = lambda: (stub, semaphore)
+        text = await client.agenerate('prompt', stage=STAGE)
+        # Let the cancelled primary unwind
+        await asyncio.sleep(0)
+        return text, semaphore
+
+    started = time.perf_counter()
+    text, semaphore = asyncio.run(run())
+
+    assert text == 'copy 1'
+    assert stub.cancelled == [0]
+    assert time.perf_counter() - started < 0.5
+    assert hedges(client) == {'sent': 1, 'hedge_won': 1}
+    # Both copies gave their concurrency slots back
+    assert semaphore._value == client.max_concurrency
+
+
+def test_truncated_json_body_is_retried():
+    client = GeminiClient('key', 'http://gemini.invalid', max_retries=1, backoff_base=0)
+    client.session = SequenceSession([TruncatedResponse, StubResponse])
+
+    assert client.generate('prompt', stage=STAGE) == 'copy 1'
+
+
+def test_truncated_json_body_raises_gemini_error_once_retries_run_out():
+    client = GeminiClient('key', 'http://gemini.invalid', max_retries=1, backoff_base=0)
+    client.session = SequenceSession([TruncatedResponse, TruncatedResponse])
+
+    with pytest.raises(MalformedResponseError) as raised:
+        client.generate('prompt', stage=STAGE)
+    assert isinstance(raised.value, GeminiError)
+    assert raised.value.status_code == 200
+
+
+def wait_until(condition, seconds=5.0):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.01)
+
+
+def slot_free(client):
+    if not client._semaphore.acquire(blocking=False):
+        return False
+    client._semaphore.release()
+    return True
+
+
+def test_stream_frees_slot_while_caller_is_still_reading():
+    server = FakeGeminiServer(FakeGeminiConfig(latency='fixed:0.1', stream_chunks=5)).start()
+    try:
+        client = GeminiClient('key', server.url, max_concurrency=1, max_retries=0)
+        stream = client.stream_generate('Summarize this paper.', stage=STAGE)
+
+        fragments = [next(stream)]
+        # The caller has not asked for more, yet the whole response is in and the slot is back
+        wait_until(lambda: slot_free(client))
+        fragments.extend(stream)
+
+        assert len(fragments) == 5
+        assert "This paper studies" in "".join(fragments)
+    finally:
+        server.stop()
+
+
+def test_closed_stream_frees_slot():
+    server = FakeGeminiServer(FakeGeminiConfig(latency='fixed:1.0', stream_chunks=20)).start()
+    try:
+        client = GeminiClient('key', server.url, max_concurrency=1, max_retries=0)
+        stream = client.stream_generate('Summarize this paper.', stage=STAGE)
+
+        next(stream)
+        stream.close()
+
+        wait_until(lambda: slot_free(client), seconds=1.0)
+    finally:
+        server.stop()
+
+
+def test_async_stream_frees_slot_while_caller_is_still_reading():
+    server = FakeGeminiServer(FakeGeminiConfig(latency='fixed:0.1', stream_chunks=5)).start()
+    client = GeminiClient('key', server.url, max_concurrency=1, max_retries=0)
+
+    async def run():
+        stream = client.astream_generate('Summarize this paper.', stage=STAGE)
+        fragments = [await stream.__anext__()]
+        _, semaphore = client._async_session()
+        for _ in range(500):
+            if not semaphore.locked():
+                break
+            await asyncio.sleep(0.01)
+        released = not semaphore.locked()
+        fragments.extend([fragment async for fragment in stream])
+        await client.aclose()
+        return released, fragments
+
+    try:
+        released, fragments = asyncio.run(run())
+    finally:
+        server.stop()
+
+    assert released
+    assert len(fragments) == 5
@@ -0,0 +1,81 @@
+import pytest
+
+import job_queue
+from job_queue import COMPLETED, FAILED, PENDING, RUNNING, JobBackend, JobQueue
+
+
+class ManualBackend(JobBackend):
+    """Holds submitted jobs until the test runs them"""
+
+    def __init__(self):
+        self.queued = []
+
+    def submit(self, fn):
+        self.queued.append(fn)
+
+    def run_all(self):
+        while self.queued:
+            self.queued.pop(0)()
+
+
+def test_backend_must_implement_submit():
+    with pytest.raises(TypeError):
+        JobBackend()
+
+
+def test_job_moves_from_pending_through_running_to_completed():
+    backend = ManualBackend()
+    queue = JobQueue(backend=backend)
+    seen = {}
+
+    def work(report_stage):
+        seen['status'] = queue.get(job.id).status
+        report_stage('summary', RUNNING)
+        seen['stages'] = dict(queue.get(job.id).stages)
+        report_stage('summary', COMPLETED)
+        return {'summary': "short"}
+
+    job = queue.submit(work, ['summary', 'mindmap'])
+    assert job.status == PENDING
+    assert job.stages == {'summary': PENDING, 'mindmap': PENDING}
+
+    backend.run_all()
+
+    assert seen == {'status': RUNNING, 'stages': {'summary': RUNNING, 'mindmap': PENDING}}
+    assert job.status == COMPLETED
+    assert job.result == {'summary': "short"}
+    assert job.finished_at is not None
+
+
+def test_failed_job_marks_unfinished_stages_failed():
+    backend = ManualBackend()
+    queue = JobQueue(backend=backend)
+
+    def work(report_stage):
+        report_stage('summary', COMPLETED)
+        report_stage('mindmap', RUNNING)
+        raise Exception("Error generating mindmap: quota exceeded")
+
+    job = queue.submit(work, ['summary', 'mindmap', 'novelty'])
+    backend.run_all()
+
+    assert job.status == FAILED
+    assert job.error == "Error generating mindmap: quota exceeded"
+    assert job.stages == {'summary': COMPLETED, 'mindmap': FAILED, 'novelty': FAILED}
+    assert job.to_dict()['status'] == FAILED
+
+
+def test_finished_jobs_are_evicted_after_ttl(monkeypatch):
+    backend = ManualBackend()
+    queue = JobQueue(backend=backend, ttl_seconds=60)
+    finished = queue.submit(lambda report_stage: {}, ['summary'])
+    backend.run_all()
+    waiting = queue.submit(lambda report_stage: {}, ['summary'])
+
+    now = finished.finished_at + 61
+    monkeypatch.setattr(job_queue.time, 'time', lambda: now)
+    queue.submit(lambda report_stage: {}, ['summary'])
+
+    assert queue.get(finished.id) is None
+    # Jobs that have not finished are never evicted, however old
+    assert queue.get(waiting.id) is waiting
@@ -0,0 +1,39 @@
+import random
+
+from key_terms import DEFAULT_RESEARCH_TERMS, KeyTermExtractor
+
+
+def naive_terms(vocabulary, text):
+    """The substring scan the trie regex replaced"""
+    terms = list(dict.fromkeys(term.lower() for term in vocabulary if term))
+    return [term for term in terms if term in text.lower()]
+
+
+def test_matches_naive_scan_on_default_vocabulary():
+    text = ("We apply deep learning and machine learning models to medical image processing, "
+            "with data analysis, clustering and evaluation of accuracy on a Network of Systems.")
+
+    assert KeyTermExtractor(DEFAULT_RESEARCH_TERMS).find_terms(text) == naive_terms(DEFAULT_RESEARCH_TERMS, text)
+
+
+def test_matches_naive_scan_on_random_overlapping_terms():
+    rng = random.Random(7)
+    # A tiny alphabet makes shared prefixes and overlapping matches the norm; the
+    # metacharacters check that terms are escaped
+    alphabet = 'ab .+'
+    for _ in range(300):
+        vocabulary = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5)))
+                      for _ in range(rng.randint(1, 12))]
+        text = ''.join(rng.choice(alphabet + 'AB') for _ in range(rng.randint(0, 40)))
+
+        assert KeyTermExtractor(vocabulary).find_terms(text) == naive_terms(vocabulary, text), (vocabulary, text)
+
+
+def test_prefix_and_overlapping_terms_are_all_found():
+    extractor = KeyTermExtractor(['analysis', 'data analysis', 'data', 'c++'])
+
+    assert extractor.find_terms("Data analysis in C++") == ['analysis', 'data analysis', 'data', 'c++']
+
+
+def test_empty_vocabulary_finds_nothing():
+    assert KeyTermExtractor([]).find_terms("machine learning") == []
@@ -0,0 +1,47 @@
+import io
+
+import PyPDF2
+
+from benchmark import make_sample_pdf
+from pdf_extraction import extract_pages, iter_pdf_pages
+
+PAGE_COUNT = 6
+
+
+def sample_pdf():
+    pages = [[f"Page {number} reports result {number * 7}."] for number in range(1, PAGE_COUNT + 1)]
+    return make_sample_pdf("Lazy Extraction", pages)
+
+
+def test_pages_are_yielded_as_they_are_decoded(monkeypatch):
+    decoded = []
+    extract_text = PyPDF2.PageObject.extract_text
+
+    def counting_extract_text(page, *args, **kwargs):
+        decoded.append(page)
+        return extract_text(page, *args, **kwargs)
+
+    monkeypatch.setattr(PyPDF2.PageObject, 'extract_text', counting_extract_text)
+    pages = iter_pdf_pages(io.BytesIO(sample_pdf()))
+
+    assert decoded == []
+    page_number, text = next(pages)
+    assert page_number == 1
+    assert "Page 1 reports result 7." in text
+    assert len(decoded) == 1
+
+    rest = list(pages)
+    assert [number for number, _ in rest] == list(range(2, PAGE_COUNT + 1))
+    assert len(decoded) == PAGE_COUNT
+
+
+def test_worker_processes_keep_page_order(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(sample_pdf())
+
+    serial = extract_pages(str(path))
+    parallel = list(iter_pdf_pages(io.BytesIO(sample_pdf()), workers=2, min_pages_for_parallel=2))
+
+    assert [number for number, _ in parallel] == list(range(1, PAGE_COUNT + 1))
+    assert [text for _, text in parallel] == serial
+    assert "Page 4 reports result 28." in serial[3]
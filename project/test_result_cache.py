@@ -0,0 +1,116 @@
+import asyncio
+import types
+
+import pytest
+
+import result_cache
+from result_cache import ResultCache, Uncached, cached_stage, content_hash, stream_hash
+
+
+class Clock:
+    """Stands in for time.time so TTLs and access order need no sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache, 'time', types.SimpleNamespace(time=clock))
+    return clock
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), ttl_seconds=60)
+    cache.set('summary', 1, 'doc', 'text')
+
+    clock.now += 59
+    assert cache.get('summary', 1, 'doc') == 'text'
+
+    clock.now += 2
+    assert cache.get('summary', 1, 'doc') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_entry_is_evicted_first(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'), max_entries=2)
+    cache.set('summary', 1, 'a', 'A')
+    clock.now += 1
+    cache.set('summary', 1, 'b', 'B')
+    clock.now += 1
+    # Reading a makes b the least recently used
+    assert cache.get('summary', 1, 'a') == 'A'
+    clock.now += 1
+    cache.set('summary', 1, 'c', 'C')
+
+    assert cache.get('summary', 1, 'b') is None
+    assert cache.get('summary', 1, 'a') == 'A'
+    assert cache.get('summary', 1, 'c') == 'C'
+
+
+def test_prompt_version_is_part_of_the_key(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('summary', 1, 'doc', 'old prompt')
+
+    assert cache.get('summary', 2, 'doc') is None
+    assert cache.stats()['stages']['summary'] == {'hits': 0, 'misses': 1}
+
+
+def test_stream_hash_matches_content_hash(tmp_path):
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(b'%PDF-1.4 ' * 1000)
+
+    with open(path, 'rb') as f:
+        assert stream_hash(f, chunk_size=64) == content_hash(path.read_bytes())
+
+
+class Analyzer:
+    """Minimal owner of a cache for cached_stage, counting real computations"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.calls = 0
+
+    @cached_stage('summary', 1)
+    def summarize(self, text):
+        self.calls += 1
+        return f"summary of {text}"
+
+    @cached_stage('summary', 1)
+    async def asummarize(self, text):
+        self.calls += 1
+        return f"summary of {text}"
+
+    @cached_stage('fallback', 1)
+    def fallback(self, text):
+        self.calls += 1
+        return Uncached("unavailable")
+
+
+def test_cached_stage_computes_once(tmp_path):
+    analyzer = Analyzer(ResultCache(str(tmp_path / 'cache.sqlite3')))
+
+    assert analyzer.summarize('paper') == "summary of paper"
+    assert analyzer.summarize('paper') == "summary of paper"
+    assert analyzer.calls == 1
+
+
+def test_async_stage_shares_the_sync_cache_entry(tmp_path):
+    analyzer = Analyzer(ResultCache(str(tmp_path / 'cache.sqlite3')))
+    analyzer.summarize('paper')
+
+    assert asyncio.run(analyzer.asummarize('paper')) == "summary of paper"
+    assert analyzer.calls == 1
+
+
+def test_uncached_result_is_returned_but_not_stored(tmp_path):
+    analyzer = Analyzer(ResultCache(str(tmp_path / 'cache.sqlite3')))
+
+    assert analyzer.fallback('paper') == "unavailable"
+    assert analyzer.fallback('paper') == "unavailable"
+    assert analyzer.calls == 2
+    assert analyzer.cache.stats()['entries'] == 0
@@ -0,0 +1,128 @@
+import collections
+import io
+
+import app
+from benchmark import make_sample_pdf
+from result_cache import ResultCache
+from revisions import RevisionTracker
+
+
+class StubGemini:
+    """Answers every prompt instantly and counts calls per stage"""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.prompts = {}
+
+    def generate(self, prompt, generation_config=None, timeout=None, stage='generate'):
+        self.calls[stage] += 1
+        self.prompts[stage] = prompt
+        return f"Summary of a {stage} prompt."
+
+
+def make_pages(count=20, edited=None):
+    edited = edited if isinstance(edited, (list, range)) else [edited]
+    pages = []
+    for number in range(1, count + 1):
+        sentences = [
+            f"Page {number} sentence {index} reports measurement {number * 100 + index} of the method."
+            for index in range(20)
+        ]
+        if number in edited:
+            sentences[0] = "This sentence was rewritten in the second revision of the paper."
+        pages.append(' '.join(sentences))
+    return pages
+
+
+def register(tracker, pages):
+    text = ''.join(page + '\n' for page in pages)
+    tracker.register(text, pages)
+    return text
+
+
+def make_analyzer(tmp_path):
+    gemini = StubGemini()
+    analyzer = app.PDFAnalyzer(
+        cache=ResultCache(str(tmp_path / 'results.sqlite3')),
+        gemini=gemini,
+        revisions=RevisionTracker(str(tmp_path / 'revisions.sqlite3'))
+    )
+    return analyzer, gemini
+
+
+def test_revision_resummarizes_only_changed_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'SUMMARY_MODE', 'truncate')
+    analyzer, gemini = make_analyzer(tmp_path)
+
+    first = register(analyzer.revisions, make_pages())
+    analyzer.summarize(first, mode='map_reduce')
+    first_chunks = gemini.calls['summary_chunk']
+    assert first_chunks > 2
+
+    second = register(analyzer.revisions, make_pages(edited=8))
+    analyzer.summarize(second)
+
+    assert gemini.calls['summary_chunk'] - first_chunks == 1
+    report = analyzer.revision_report(second)
+    assert report['changed_pages'] == [8]
+    assert report['reused_chunk_groups'] == report['total_chunk_groups'] - 1
+
+
+def test_minor_revision_of_truncated_summary_updates_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'SUMMARY_MODE', 'truncate')
+    analyzer, gemini = make_analyzer(tmp_path)
+
+    first = analyzer.summarize(register(analyzer.revisions, make_pages()))
+    second_text = register(analyzer.revisions, make_pages(edited=8))
+    second = analyzer.summarize(second_text)
+
+    assert gemini.calls == {'summary': 1, 'summary_revision': 1}
+    prompt = gemini.prompts['summary_revision']
+    assert first in prompt
+    assert "rewritten in the second revision" in prompt
+    assert "Page 3 sentence" not in prompt
+    assert len(prompt) < len(gemini.prompts['summary']) / 2
+
+    # The updated summary is cached for the new revision like any other
+    assert analyzer.summarize(second_text) == second
+    assert gemini.calls == {'summary': 1, 'summary_revision': 1}
+
+
+def test_major_revision_of_truncated_summary_starts_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'SUMMARY_MODE', 'truncate')
+    analyzer, gemini = make_analyzer(tmp_path)
+
+    analyzer.summarize(register(analyzer.revisions, make_pages()))
+    analyzer.summarize(register(analyzer.revisions, make_pages(edited=range(1, 11))))
+
+    assert gemini.calls == {'summary': 2}
+
+
+def test_cached_extraction_is_still_fingerprinted(tmp_path):
+    pdf = make_sample_pdf("Revision Tracking of Cached Papers", [[f"Page {number} text."] for number in range(1, 4)])
+    cache = ResultCache(str(tmp_path / 'results.sqlite3'))
+    text = app.PDFAnalyzer(cache=cache, gemini=StubGemini()).extract_pdf_text(io.BytesIO(pdf))
+
+    revisions = RevisionTracker(str(tmp_path / 'revisions.sqlite3'))
+    analyzer = app.PDFAnalyzer(cache=cache, gemini=StubGemini(), revisions=revisions)
+
+    assert analyzer.extract_pdf_text(io.BytesIO(pdf)) == text
+    assert revisions.is_registered(text)
+    assert len(revisions.plan_chunks(text, 8000)['layout']) == 1
+
+
+def test_plan_chunks_reuses_unchanged_groups_after_single_page_edit(tmp_path):
+    tracker = RevisionTracker(str(tmp_path / 'revisions.sqlite3'))
+
+    first = tracker.plan_chunks(register(tracker, make_pages()), max_chars=4000)
+    tracker.save_layout(first['doc_id'], first['layout'])
+    second = tracker.plan_chunks(register(tracker, make_pages(edited=8)), max_chars=4000)
+
+    assert first['total_groups'] > 2
+    assert second['revision_of'] == first['doc_id']
+    assert second['changed_pages'] == [8]
+    assert second['total_groups'] == first['total_groups']
+    assert second['reused_groups'] == second['total_groups'] - 1
+    changed = [index for index, (old, new) in enumerate(zip(first['chunks'], second['chunks'])) if old != new]
+    assert len(changed) == 1
+    assert "rewritten in the second revision" in second['chunks'][changed[0]]
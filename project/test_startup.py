@@ -0,0 +1,54 @@
+import os
+import re
+import subprocess
+import sys
+
+# Cumulative import time budget for `import app`, in microseconds
+IMPORT_TIME_BUDGET_US = 500_000
+
+# Modules that must not be imported until they are actually needed
+LAZY_MODULES = ['streamlit', 'flask_cors', 'PyPDF2', 'numpy', 'httpx']
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import():
+    """Import app in a fresh interpreter with -X importtime and return {module: cumulative_us}"""
+    env = dict(os.environ)
+    # Importing must work without configuration; the key is only checked by create_app
+    env.pop('GEMINI_API_KEY', None)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=PROJECT_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    assert result.returncode == 0, f"import app failed:\n{result.stderr}"
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)', line)
+        if match:
+            timings[match.group(2)] = int(match.group(1))
+    return timings
+
+
+def test_import_time():
+    timings = measure_import()
+    total = timings['app']
+    print(f"import app: {total / 1000:.1f} ms (budget {IMPORT_TIME_BUDGET_US / 1000:.0f} ms)")
+
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[1:6]
+    for module, cumulative in slowest:
+        print(f"   {module}: {cumulative / 1000:.1f} ms")
+
+    assert total <= IMPORT_TIME_BUDGET_US, f"import app took {total} us, over the {IMPORT_TIME_BUDGET_US} us budget"
+
+    eagerly_imported = [module for module in LAZY_MODULES if module in timings]
+    assert not eagerly_imported, f"imported at startup but should be lazy: {eagerly_imported}"
+
+
+if __name__ == "__main__":
+    test_import_time()
+    print("Startup budget test passed!")
@@ -0,0 +1,47 @@
+from structured_output import (EMBEDDED, FENCED, parse_json_response, parse_mermaid_response, scan,
+                               validate_articles)
+
+ARTICLES = '[{"title": "Attention Is All You Need", "description": "Introduces the transformer."}]'
+
+
+def test_scan_finds_array_after_stray_bracket_in_prose():
+    text = f"Scores lie in [0, 100) as before. Related work:\n{ARTICLES}"
+
+    _, spans = scan(text)
+
+    assert [text[start:end] for start, end in spans] == [ARTICLES]
+
+
+def test_scan_keeps_nested_spans_as_one():
+    text = 'Result: {"a": [1, {"b": 2}]} and [3]'
+
+    _, spans = scan(text)
+
+    assert [text[start:end] for start, end in spans] == ['{"a": [1, {"b": 2}]}', '[3]']
+
+
+def test_stray_bracket_before_fenced_json():
+    text = f"See the [draft notes for context.\n```json\n{ARTICLES}\n```"
+
+    result = parse_json_response(text, 'test_related', validate=validate_articles)
+
+    assert result.strategy == FENCED
+    assert result.value[0]['title'] == "Attention Is All You Need"
+
+
+def test_stray_bracket_before_embedded_json():
+    text = f"The range [1, 100) is used. {ARTICLES} Hope this helps."
+
+    result = parse_json_response(text, 'test_related', validate=validate_articles)
+
+    assert result.strategy == EMBEDDED
+    assert len(result.value) == 1
+
+
+def test_stray_bracket_before_mermaid_fence():
+    text = "Here is the map [see below:\n```mermaid\nmindmap\n  root((Paper))\n```"
+
+    result = parse_mermaid_response(text, 'test_mindmap')
+
+    assert result.strategy == FENCED
+    assert result.value.startswith('mindmap')
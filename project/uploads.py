@@ -0,0 +1,94 @@
+import io
+import mmap
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, BinaryIO
+
+from flask import Request
+
+from metrics import UPLOAD_BYTES, UPLOAD_BUFFERED_BYTES
+
+
+class UploadBuffer(tempfile.SpooledTemporaryFile):
+    """Upload body held in memory up to `max_size` bytes, then in an anonymous temporary file.
+
+    The spill file is unlinked as soon as it is created, so nothing is left on disk whether
+    the buffer is closed explicitly, by the request teardown or by the process exiting."""
+
+    def __init__(self, max_size: int):
+        super().__init__(max_size=max_size, mode='w+b')
+        self._size = 0
+        self._storage = 'memory'
+        self._finished = False
+
+    def write(self, data) -> int:
+        written = super().write(data)
+        size = max(self._size, self.tell())
+        UPLOAD_BUFFERED_BYTES.inc(size - self._size, storage=self._storage)
+        self._size = size
+        return written
+
+    def rollover(self):
+        if not self._rolled:
+            UPLOAD_BUFFERED_BYTES.dec(self._size, storage='memory')
+            UPLOAD_BUFFERED_BYTES.inc(self._size, storage='disk')
+            self._storage = 'disk'
+        super().rollover()
+
+    def close(self):
+        if not self._finished:
+            self._finished = True
+            UPLOAD_BUFFERED_BYTES.dec(self._size, storage=self._storage)
+            UPLOAD_BYTES.inc(self._size, storage=self._storage)
+        super().close()
+
+    @contextmanager
+    def reader(self) -> Iterator[BinaryIO]:
+        """A seekable view of the whole upload: the in-memory buffer, or a memory map of the spill file"""
+        self.seek(0)
+        if not self._rolled or self._size == 0:
+            yield self
+            return
+        self.flush()
+        # PDF parsing seeks and reads in small pieces; a map serves those from the page cache
+        # without a system call each
+        with mmap.mmap(self.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+
+class SpooledUploadRequest(Request):
+    """Request whose multipart file parts are parsed straight into UploadBuffers"""
+
+    # Uploads larger than this spill from memory to an anonymous temporary file
+    spool_threshold = 1024 * 1024
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadBuffer(self.spool_threshold)
+
+
+@contextmanager
+def open_stream(stream) -> Iterator[BinaryIO]:
+    """Readable, seekable view of an upload stream, closed when the block exits"""
+    try:
+        if isinstance(stream, UploadBuffer):
+            with stream.reader() as reader:
+                yield reader
+        else:
+            stream.seek(0)
+            yield stream
+    finally:
+        stream.close()
+
+
+def open_upload(file_storage):
+    """Readable, seekable stream over an uploaded file, released when the block exits"""
+    return open_stream(file_storage.stream)
+
+
+def detach_upload(file_storage) -> BinaryIO:
+    """Take an uploaded file's buffer out of its request so work running after the response can
+    read it; the caller releases it with open_stream"""
+    stream = file_storage.stream
+    # Request teardown closes every uploaded file; leave it an empty stream to close instead
+    file_storage.stream = io.BytesIO()
+    return stream